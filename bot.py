@@ -8,6 +8,7 @@ from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, No
 import yt_dlp
 from gtts import gTTS
 import json
+import html
 import urllib.parse
 from datetime import datetime
 from googleapiclient.discovery import build
@@ -15,64 +16,138 @@ import time
 import asyncio
 import telegram
 import xml.etree.ElementTree as ET
+import threading
+import sqlite3
+import hashlib
+import random
+import io
+import shutil
+import subprocess
+import tempfile
+import socket
+import uuid
+import math
+import atexit
+import weakref
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Config ---
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 LM_API_URL = os.getenv("LM_API_URL")
 
+# Serveurs compatibles OpenAI utilisés (séparés par des virgules), LM_API_URL par défaut
+LM_BACKENDS = [url.strip() for url in (os.getenv("LM_BACKENDS") or LM_API_URL or "").split(",") if url.strip()]
+# Nombre maximum de requêtes simultanées vers chaque serveur LM Studio
+LM_MAX_CONCURRENCY = max(1, int(os.getenv("LM_MAX_CONCURRENCY", "2")))
+# Santé des serveurs : vérification périodique et disjoncteur après plusieurs échecs consécutifs
+LM_HEALTH_INTERVAL = int(os.getenv("LM_HEALTH_INTERVAL", "30"))
+LM_HEALTH_TIMEOUT = int(os.getenv("LM_HEALTH_TIMEOUT", "5"))
+LM_CIRCUIT_FAILURES = int(os.getenv("LM_CIRCUIT_FAILURES", "3"))
+LM_CIRCUIT_COOLDOWN = int(os.getenv("LM_CIRCUIT_COOLDOWN", "60"))
+# Requêtes doublées : une requête sans premier token après le 95e centile observé sur son serveur
+# est aussi envoyée à un autre serveur. Au plus LM_HEDGE_BUDGET requête doublée par requête (0 = désactivé).
+LM_HEDGE_BUDGET = float(os.getenv("LM_HEDGE_BUDGET", "0.05"))
+LM_HEDGE_BURST = 3  # Requêtes doublées possibles d'affilée quand le budget s'est accumulé
+LM_HEDGE_MIN_SAMPLES = int(os.getenv("LM_HEDGE_MIN_SAMPLES", "20"))  # Mesures nécessaires avant de doubler
+LM_HEDGE_MIN_DELAY = float(os.getenv("LM_HEDGE_MIN_DELAY", "2"))  # Délai minimal avant de doubler (secondes)
+LM_LATENCY_WINDOW = 200  # Temps de premier token conservés par serveur
+# Débits par requête (tokens/s) utilisés pour estimer le coût d'un résumé tant qu'aucune mesure n'est disponible
+LM_PROMPT_TOKENS_PER_SECOND = float(os.getenv("LM_PROMPT_TOKENS_PER_SECOND", "500"))
+LM_GENERATION_TOKENS_PER_SECOND = float(os.getenv("LM_GENERATION_TOKENS_PER_SECOND", "20"))
+
+# Paramètres de génération par étape (surchargeables dans .env)
+# max_tokens à 0 = pas de limite propre à l'étape (on utilise la limite détectée du modèle)
+def _load_generation_settings(stage, max_tokens, temperature):
+    env_prefix = f"LM_{stage.upper()}"
+    stop = os.getenv(f"{env_prefix}_STOP", "")
+    return {
+        "max_tokens": int(os.getenv(f"{env_prefix}_MAX_TOKENS", str(max_tokens))),
+        "temperature": float(os.getenv(f"{env_prefix}_TEMPERATURE", str(temperature))),
+        # Plusieurs séquences d'arrêt peuvent être séparées par "||"
+        "stop": [seq.replace("\\n", "\n") for seq in stop.split("||") if seq] or None,
+    }
+
+GENERATION_SETTINGS = {
+    "map": _load_generation_settings("map", 400, 0.3),              # Résumé d'un chunk
+    "reduce": _load_generation_settings("reduce", 500, 0.3),        # Fusion intermédiaire
+    "final": _load_generation_settings("final", 1200, 0.5),         # Résumé final
+    "translate": _load_generation_settings("translate", 4000, 0.2), # Traduction (plafond, ajusté à la taille du texte)
+    "qa": _load_generation_settings("qa", 800, 0.4),                # Question sur une vidéo
+    "chat": _load_generation_settings("chat", 0, float(os.getenv("LM_TEMPERATURE", "0.7"))),  # Mode conversation
+}
+
+# Modèles à utiliser pour chaque étape (LM_<ETAPE>_MODEL, plusieurs modèles séparés par des virgules
+# par ordre de préférence). Seuls les modèles chargés dans LM Studio sont choisis ; sans modèle
+# configuré ou chargé, l'étape utilise le premier modèle chargé du serveur.
+LM_TASK_MODELS = {
+    stage: [model.strip() for model in os.getenv(f"LM_{stage.upper()}_MODEL", "").split(",") if model.strip()]
+    for stage in GENERATION_SETTINGS
+}
+
 # Variables globales pour stocker la configuration détectée automatiquement
 DETECTED_MODEL = None
 DETECTED_CONTEXT_LENGTH = None
 DETECTED_MAX_TOKENS = None
 
 # Fonction pour détecter automatiquement le modèle et sa configuration
-def detect_available_model():
-    """Détecte automatiquement le modèle disponible dans LM Studio"""
-    global DETECTED_MODEL
-    
-    if not LM_API_URL:
+def get_loaded_models(api_url, timeout=10):
+    """
+    Liste les modèles de langage chargés dans LM Studio (API REST /api/v0/models, qui indique leur état).
+    Si cette API n'existe pas (autre serveur compatible OpenAI) ou si aucun modèle n'est chargé,
+    retourne les modèles de /v1/models. Lève requests.RequestException si le serveur ne répond pas.
+    """
+    api_url = api_url.rstrip('/')
+    response = requests.get(f"{api_url}/api/v0/models", timeout=timeout)
+    if response.status_code == 200:
+        try:
+            loaded = [
+                model['id'] for model in response.json().get('data', [])
+                if model.get('state') == 'loaded' and model.get('type', 'llm') in ('llm', 'vlm')
+            ]
+        except ValueError:
+            loaded = []
+        if loaded:
+            return loaded
+    
+    response = requests.get(f"{api_url}/v1/models", timeout=timeout)
+    response.raise_for_status()
+    return [model['id'] for model in response.json().get('data', [])]
+
+def detect_loaded_models(api_url=None):
+    """Détecte les modèles chargés dans LM Studio (api_url : LM_API_URL par défaut), le premier servant par défaut"""
+    api_url = (api_url or LM_API_URL or "").rstrip('/')
+    if not api_url:
         print("❌ Erreur: LM_API_URL non défini")
-        return None
-    
-    api_url = LM_API_URL.rstrip('/')
-    models_endpoint = f"{api_url}/v1/models"
+        return []
     
     try:
-        print(f"🔍 Recherche des modèles disponibles sur {models_endpoint}")
-        response = requests.get(models_endpoint, timeout=10)
-        
-        if response.status_code == 200:
-            models_data = response.json()
-            
-            if 'data' in models_data and len(models_data['data']) > 0:
-                # Prendre le premier modèle disponible
-                model_id = models_data['data'][0]['id']
-                DETECTED_MODEL = model_id
-                print(f"✅ Modèle détecté automatiquement: {model_id}")
-                
-                # Détecter la configuration du modèle
-                detect_model_configuration(model_id)
-                return model_id
-            else:
-                print("❌ Aucun modèle trouvé dans la réponse")
-                return None
+        print(f"🔍 Recherche des modèles chargés sur {api_url}")
+        models = get_loaded_models(api_url)
+        if models:
+            print(f"✅ Modèle(s) détecté(s) automatiquement: {', '.join(models)}")
         else:
-            print(f"❌ Erreur lors de la récupération des modèles: {response.status_code}")
-            return None
-            
+            print("❌ Aucun modèle trouvé dans la réponse")
+        return models
     except requests.exceptions.ConnectionError:
-        print("❌ Erreur de connexion: Impossible de se connecter à LM Studio")
-        return None
+        print(f"❌ Erreur de connexion: Impossible de se connecter à LM Studio ({api_url})")
+        return []
+    except requests.exceptions.HTTPError as e:
+        print(f"❌ Erreur lors de la récupération des modèles: {e.response.status_code}")
+        return []
     except Exception as e:
         print(f"❌ Erreur lors de la détection du modèle: {str(e)}")
-        return None
+        return []
 
-def detect_model_configuration(model_id):
-    """Détecte automatiquement la configuration du modèle (contexte, max tokens)"""
-    global DETECTED_CONTEXT_LENGTH, DETECTED_MAX_TOKENS
+def detect_model_configuration(model_id, api_url=None):
+    """
+    Détecte automatiquement la configuration du modèle (contexte, max tokens).
     
-    api_url = LM_API_URL.rstrip('/')
+    Returns:
+        tuple: (longueur de contexte utilisable, max tokens de réponse)
+    """
+    api_url = (api_url or LM_API_URL).rstrip('/')
     chat_endpoint = f"{api_url}/v1/chat/completions"
     
     try:
@@ -131,57 +206,357 @@ def detect_model_configuration(model_id):
         
         # Définir la configuration basée sur la taille maximale qui fonctionne
         if max_working_size >= 75000:
-            DETECTED_CONTEXT_LENGTH = 90000  # Pour les modèles astronomiques (100k+)
-            DETECTED_MAX_TOKENS = 8000
+            context_length = 90000  # Pour les modèles astronomiques (100k+)
+            max_tokens = 8000
             print(f"✅ Modèle astronomique détecté:")
         elif max_working_size >= 50000:
-            DETECTED_CONTEXT_LENGTH = 60000  # Pour les modèles titanesques (75k+)
-            DETECTED_MAX_TOKENS = 6000
+            context_length = 60000  # Pour les modèles titanesques (75k+)
+            max_tokens = 6000
             print(f"✅ Modèle titanesque détecté:")
         elif max_working_size >= 32000:
-            DETECTED_CONTEXT_LENGTH = 40000  # Pour les modèles colossaux (50k+)
-            DETECTED_MAX_TOKENS = 4000
+            context_length = 40000  # Pour les modèles colossaux (50k+)
+            max_tokens = 4000
             print(f"✅ Modèle colossal détecté:")
         elif max_working_size >= 20000:
-            DETECTED_CONTEXT_LENGTH = 16000  # Pour les modèles massifs (conservative)
-            DETECTED_MAX_TOKENS = 2000
+            context_length = 16000  # Pour les modèles massifs (conservative)
+            max_tokens = 2000
             print(f"✅ Modèle massif détecté:")
         elif max_working_size >= 16000:
-            DETECTED_CONTEXT_LENGTH = 12000  # Pour les modèles géants (conservative)
-            DETECTED_MAX_TOKENS = 1500
+            context_length = 12000  # Pour les modèles géants (conservative)
+            max_tokens = 1500
             print(f"✅ Modèle géant détecté:")
         elif max_working_size >= 12000:
-            DETECTED_CONTEXT_LENGTH = 15000  # Pour les très gros modèles (16k+)
-            DETECTED_MAX_TOKENS = 2000
+            context_length = 15000  # Pour les très gros modèles (16k+)
+            max_tokens = 2000
             print(f"✅ Modèle haute capacité détecté:")
         elif max_working_size >= 8000:
-            DETECTED_CONTEXT_LENGTH = 10000  # Pour les gros modèles (12k+)
-            DETECTED_MAX_TOKENS = 1500
+            context_length = 10000  # Pour les gros modèles (12k+)
+            max_tokens = 1500
             print(f"✅ Modèle grande capacité détecté:")
         elif max_working_size >= 4000:
-            DETECTED_CONTEXT_LENGTH = 6000   # Pour les modèles moyens-hauts (8k+)
-            DETECTED_MAX_TOKENS = 1000
+            context_length = 6000   # Pour les modèles moyens-hauts (8k+)
+            max_tokens = 1000
             print(f"✅ Modèle moyenne-haute capacité détecté:")
         elif max_working_size >= 2000:
-            DETECTED_CONTEXT_LENGTH = 3000   # Pour les modèles moyens (4k+)
-            DETECTED_MAX_TOKENS = 800
+            context_length = 3000   # Pour les modèles moyens (4k+)
+            max_tokens = 800
             print(f"✅ Modèle moyenne capacité détecté:")
         else:
-            DETECTED_CONTEXT_LENGTH = 1500   # Pour les petits modèles
-            DETECTED_MAX_TOKENS = 400
+            context_length = 1500   # Pour les petits modèles
+            max_tokens = 400
             print(f"✅ Modèle petite capacité détecté:")
             
-        print(f"   📏 Contexte utilisé: {DETECTED_CONTEXT_LENGTH} tokens (testé jusqu'à {max_working_size})")
-        print(f"   📝 Max tokens: {DETECTED_MAX_TOKENS}")
+        print(f"   📏 Contexte utilisé: {context_length} tokens (testé jusqu'à {max_working_size})")
+        print(f"   📝 Max tokens: {max_tokens}")
             
     except Exception as e:
         # Valeurs par défaut très conservatrices en cas d'erreur
-        DETECTED_CONTEXT_LENGTH = 8000
-        DETECTED_MAX_TOKENS = 1000
+        context_length = 8000
+        max_tokens = 1000
         print(f"❌ Erreur lors de la détection de configuration: {str(e)}")
         print(f"⚠️ Utilisation des valeurs par défaut:")
-        print(f"   📏 Contexte: {DETECTED_CONTEXT_LENGTH} tokens")
-        print(f"   📝 Max tokens: {DETECTED_MAX_TOKENS}")
+        print(f"   📏 Contexte: {context_length} tokens")
+        print(f"   📝 Max tokens: {max_tokens}")
+    
+    return context_length, max_tokens
+
+class LLMBackend:
+    """Un serveur LM Studio (ou API compatible OpenAI) : ses modèles chargés, leurs profils, sa charge et sa santé"""
+    
+    def __init__(self, url, capacity=None):
+        self.base_url = url.rstrip('/')
+        if self.base_url.endswith('/v1/chat/completions'):
+            self.base_url = self.base_url[:-len('/v1/chat/completions')]
+        self.chat_url = f"{self.base_url}/v1/chat/completions"
+        self.capacity = capacity or LM_MAX_CONCURRENCY
+        # Limite les requêtes simultanées envoyées à ce serveur
+        self.slots = threading.BoundedSemaphore(self.capacity)
+        self.model = None  # Modèle par défaut (premier modèle chargé)
+        self.models = []  # Modèles chargés
+        self.profiles = {}  # Format: {modèle: (longueur de contexte, max tokens)}
+        self.in_flight = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.circuit_open_until = 0  # 0 : circuit fermé (serveur utilisable)
+        self.probing = False  # Une requête de test est en cours après l'ouverture du circuit
+        self.first_token_times = deque(maxlen=LM_LATENCY_WINDOW)  # Secondes jusqu'au premier token
+        self.prompt_rate = None  # Tokens/s de lecture du prompt (moyenne mobile)
+        self.generation_rate = None  # Tokens/s de génération (moyenne mobile)
+        self.stats_lock = threading.Lock()
+    
+    def __repr__(self):
+        return self.base_url
+    
+    def detect(self, models=None):
+        """
+        Détecte les modèles chargés sur ce serveur (ou utilise la liste models déjà obtenue) et le profil
+        (contexte, max tokens) du modèle par défaut et de ceux configurés pour une étape (LM_TASK_MODELS).
+        """
+        if models is None:
+            models = detect_loaded_models(self.base_url)
+        if not models:
+            self.models = []
+            return None
+        
+        wanted = {models[0]} | {model for preferred in LM_TASK_MODELS.values() for model in preferred}
+        for model in models:
+            if model in wanted and model not in self.profiles:
+                self.profiles[model] = detect_model_configuration(model, self.base_url)
+        self.models = models
+        self.model = models[0]
+        return self.model
+    
+    def profile(self, model):
+        """Profil (contexte, max tokens) d'un modèle, ou celui du modèle par défaut s'il n'a pas été mesuré"""
+        return self.profiles.get(model) or self.profiles.get(self.model)
+    
+    def record_first_token(self, seconds):
+        with self.stats_lock:
+            self.first_token_times.append(seconds)
+    
+    def record_throughput(self, prompt_tokens, prompt_seconds, completion_tokens, generation_seconds):
+        """Met à jour les débits mesurés (moyenne mobile exponentielle) après une requête terminée"""
+        with self.stats_lock:
+            if prompt_tokens and prompt_seconds > 0:
+                rate = prompt_tokens / prompt_seconds
+                self.prompt_rate = rate if self.prompt_rate is None else 0.8 * self.prompt_rate + 0.2 * rate
+            if completion_tokens > 1 and generation_seconds > 0:
+                rate = completion_tokens / generation_seconds
+                self.generation_rate = rate if self.generation_rate is None else 0.8 * self.generation_rate + 0.2 * rate
+    
+    def hedge_delay(self):
+        """Délai avant de doubler une requête : 95e centile des temps de premier token (None si trop peu de mesures)"""
+        with self.stats_lock:
+            if len(self.first_token_times) < max(1, LM_HEDGE_MIN_SAMPLES):
+                return None
+            times = sorted(self.first_token_times)
+        return max(LM_HEDGE_MIN_DELAY, times[min(len(times) - 1, int(len(times) * 0.95))])
+    
+    def is_available(self, now):
+        """Serveur sain et circuit fermé, ou circuit semi-ouvert sans requête de test en cours"""
+        if not self.healthy:
+            return False
+        if not self.circuit_open_until:
+            return True
+        return now >= self.circuit_open_until and not self.probing
+
+class LLMRouter:
+    """
+    Répartit les requêtes entre les serveurs LM_BACKENDS : chaque requête va au serveur sain le moins chargé
+    (requêtes en cours / capacité). Après LM_CIRCUIT_FAILURES échecs consécutifs (connexion, timeout, 5xx),
+    le circuit d'un serveur s'ouvre pendant LM_CIRCUIT_COOLDOWN secondes, puis une seule requête de test
+    décide de sa remise en service. Un thread vérifie aussi régulièrement la santé de chaque serveur.
+    """
+    
+    def __init__(self, urls):
+        self.backends = [LLMBackend(url) for url in urls]
+        self.lock = threading.Lock()
+        self.health_thread = None
+        self.hedge_tokens = 0.0  # Budget de requêtes doublées (LM_HEDGE_BUDGET par requête)
+        # Re-détections des profils après un changement de modèles, hors du thread de santé
+        self.detect_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-detect")
+        self.detecting = set()  # Serveurs dont la re-détection est planifiée ou en cours
+    
+    def capacity(self):
+        """Nombre total de requêtes simultanées possibles (taille des pools de threads du bot)"""
+        return max(1, sum(backend.capacity for backend in self.backends))
+    
+    def available(self):
+        """Nombre de serveurs pouvant recevoir une requête (sains et circuit fermé)"""
+        with self.lock:
+            now = time.monotonic()
+            return sum(1 for backend in self.backends if backend.is_available(now))
+    
+    def acquire(self, task="chat", exclude=()):
+        """
+        Choisit un serveur et un modèle pour une étape et compte une requête en cours sur ce serveur.
+        Les modèles de LM_TASK_MODELS sont essayés par ordre de préférence, sur le serveur le moins chargé
+        qui les a chargés ; à défaut, le serveur le moins chargé avec son modèle par défaut.
+        Retourne (serveur, modèle, test) - test indique la requête de test d'un circuit ouvert,
+        à transmettre à release() - ou (None, None, False) si aucun serveur n'est disponible.
+        """
+        with self.lock:
+            now = time.monotonic()
+            candidates = [backend for backend in self.backends if backend not in exclude and backend.is_available(now)]
+            if not candidates:
+                return None, None, False
+            
+            def load(candidate):
+                return (candidate.in_flight / candidate.capacity, candidate.in_flight)
+            
+            backend = model = None
+            for preferred in LM_TASK_MODELS.get(task, []):
+                serving = [candidate for candidate in candidates if preferred in candidate.models]
+                if serving:
+                    backend, model = min(serving, key=load), preferred
+                    break
+            if backend is None:
+                backend = min(candidates, key=load)
+                model = backend.model
+            
+            backend.in_flight += 1
+            probe = bool(backend.circuit_open_until)
+            if probe:
+                backend.probing = True
+            return backend, model, probe
+    
+    def add_hedge_budget(self):
+        """Chaque requête ajoute LM_HEDGE_BUDGET au budget de requêtes doublées (plafonné à LM_HEDGE_BURST)"""
+        with self.lock:
+            self.hedge_tokens = min(LM_HEDGE_BURST, self.hedge_tokens + LM_HEDGE_BUDGET)
+    
+    def acquire_hedge(self, model, exclude=()):
+        """
+        Choisit le serveur disponible le moins chargé ayant chargé model pour doubler une requête,
+        si le budget le permet. Retourne (serveur, test) comme acquire(), ou (None, False).
+        """
+        with self.lock:
+            if self.hedge_tokens < 1:
+                return None, False
+            now = time.monotonic()
+            candidates = [
+                backend for backend in self.backends
+                if backend not in exclude and backend.is_available(now) and model in backend.models
+            ]
+            if not candidates:
+                return None, False
+            backend = min(candidates, key=lambda candidate: (candidate.in_flight / candidate.capacity, candidate.in_flight))
+            self.hedge_tokens -= 1
+            backend.in_flight += 1
+            probe = bool(backend.circuit_open_until)
+            if probe:
+                backend.probing = True
+            return backend, probe
+    
+    def throughput(self):
+        """
+        Débits par requête (tokens/s) : (lecture du prompt, génération), moyennés sur les serveurs mesurés,
+        ou LM_PROMPT_TOKENS_PER_SECOND / LM_GENERATION_TOKENS_PER_SECOND sans mesure.
+        """
+        prompt_rates = [backend.prompt_rate for backend in self.backends if backend.prompt_rate]
+        generation_rates = [backend.generation_rate for backend in self.backends if backend.generation_rate]
+        return (
+            sum(prompt_rates) / len(prompt_rates) if prompt_rates else LM_PROMPT_TOKENS_PER_SECOND,
+            sum(generation_rates) / len(generation_rates) if generation_rates else LM_GENERATION_TOKENS_PER_SECOND,
+        )
+    
+    def task_model(self, task):
+        """Modèle qui sera utilisé pour une étape (premier modèle préféré chargé sur un serveur, sinon DETECTED_MODEL)"""
+        for preferred in LM_TASK_MODELS.get(task, []):
+            if any(preferred in backend.models for backend in self.backends):
+                return preferred
+        return DETECTED_MODEL
+    
+    def release(self, backend, success, probe=False):
+        """
+        Termine une requête et met à jour le disjoncteur du serveur (success à None : requête annulée).
+        Seule la requête de test (probe) libère la place de test : une autre requête qui se termine
+        sur ce serveur ne doit pas permettre un second test pendant que le premier est en cours.
+        """
+        with self.lock:
+            backend.in_flight -= 1
+            if probe:
+                backend.probing = False
+            if success is None:
+                return
+            if success:
+                if backend.circuit_open_until:
+                    print(f"✅ Serveur LLM {backend} remis en service")
+                backend.consecutive_failures = 0
+                backend.circuit_open_until = 0
+                return
+            backend.consecutive_failures += 1
+            if backend.circuit_open_until or backend.consecutive_failures >= LM_CIRCUIT_FAILURES:
+                backend.circuit_open_until = time.monotonic() + LM_CIRCUIT_COOLDOWN
+                print(f"⛔ Serveur LLM {backend} retiré pendant {LM_CIRCUIT_COOLDOWN}s "
+                      f"({backend.consecutive_failures} échec(s) consécutif(s))")
+    
+    def detect_all(self):
+        """Détecte en parallèle le modèle et le profil de chaque serveur ; renvoie True si au moins un répond"""
+        if not self.backends:
+            return False
+        with ThreadPoolExecutor(max_workers=len(self.backends)) as executor:
+            models = list(executor.map(lambda backend: backend.detect(), self.backends))
+        self.update_profile()
+        return any(models)
+    
+    def update_profile(self):
+        """
+        Met à jour le profil global (DETECTED_*) : le découpage des textes doit convenir à n'importe quel
+        serveur, on retient donc le plus petit contexte et le plus petit budget de réponse détectés.
+        """
+        global DETECTED_MODEL, DETECTED_CONTEXT_LENGTH, DETECTED_MAX_TOKENS
+        detected = [backend for backend in self.backends if backend.model]
+        profiles = [backend.profile(model) for backend in detected for model in backend.models if backend.profile(model)]
+        if not profiles:
+            return
+        DETECTED_MODEL = detected[0].model
+        DETECTED_CONTEXT_LENGTH = min(context_length for context_length, _ in profiles)
+        DETECTED_MAX_TOKENS = min(max_tokens for _, max_tokens in profiles)
+    
+    def check_health(self):
+        """
+        Vérifie que chaque serveur répond (simple appel /models) ; un serveur rétabli peut recevoir une requête
+        de test. Un modèle chargé ou déchargé dans LM Studio est pris en compte sans redémarrage : la détection
+        de son profil, plus lente, est planifiée à part (schedule_detect).
+        """
+        for backend in self.backends:
+            try:
+                models = get_loaded_models(backend.base_url, timeout=LM_HEALTH_TIMEOUT)
+                healthy = True
+            except (requests.exceptions.RequestException, ValueError):
+                models = None
+                healthy = False
+            
+            with self.lock:
+                if healthy != backend.healthy:
+                    print(f"{'✅' if healthy else '⚠️'} Serveur LLM {backend} {'disponible' if healthy else 'injoignable'}")
+                backend.healthy = healthy
+                if healthy and backend.circuit_open_until:
+                    # Inutile d'attendre la fin du délai : la prochaine requête servira de test
+                    backend.circuit_open_until = min(backend.circuit_open_until, time.monotonic())
+            
+            if healthy and models != backend.models:
+                self.schedule_detect(backend, models)
+    
+    def schedule_detect(self, backend, models):
+        """Planifie la re-détection du profil d'un serveur (une seule à la fois par serveur)"""
+        with self.lock:
+            if backend in self.detecting:
+                return
+            self.detecting.add(backend)
+        if backend.models:
+            print(f"🔄 Modèles chargés sur {backend}: {', '.join(models) or 'aucun'}")
+        
+        def redetect():
+            try:
+                backend.detect(models)
+                self.update_profile()
+            except Exception as e:
+                print(f"Erreur lors de la détection des modèles de {backend}: {e}")
+            finally:
+                with self.lock:
+                    self.detecting.discard(backend)
+        
+        self.detect_executor.submit(redetect)
+    
+    def start_health_checks(self):
+        """Lance la vérification périodique (toutes les LM_HEALTH_INTERVAL secondes) dans un thread"""
+        if self.health_thread or LM_HEALTH_INTERVAL <= 0:
+            return
+        
+        def health_loop():
+            while True:
+                time.sleep(LM_HEALTH_INTERVAL)
+                try:
+                    self.check_health()
+                except Exception as e:
+                    print(f"Erreur lors de la vérification des serveurs LLM: {e}")
+        
+        self.health_thread = threading.Thread(target=health_loop, name="llm-health", daemon=True)
+        self.health_thread.start()
+
+LLM_ROUTER = LLMRouter(LM_BACKENDS)
 
 def get_adaptive_chunk_size():
     """Retourne la taille de chunk adaptée à la configuration détectée"""
@@ -233,45 +608,49 @@ def get_adaptive_chunk_size():
         return 12000
 
 def test_lm_studio_connection():
-    """Teste la connexion avec LM Studio et détecte le modèle disponible"""
-    if not LM_API_URL:
+    """Teste la connexion avec les serveurs LM Studio et détecte leurs modèles"""
+    if not LLM_ROUTER.backends:
         return False
     
-    # D'abord détecter le modèle disponible
-    model = detect_available_model()
-    if not model:
+    # D'abord détecter le modèle de chaque serveur
+    if not LLM_ROUTER.detect_all():
         return False
     
-    # Ensuite tester une requête simple
-    api_url = LM_API_URL.rstrip('/')
-    chat_endpoint = f"{api_url}/v1/chat/completions"
-    
-    try:
-        # Requête simple pour tester l'API
-        payload = {
-            "model": model,
-            "messages": [{"role": "user", "content": "Test"}],
-            "max_tokens": 5,
-            "temperature": 0.1
-        }
-        
-        response = requests.post(chat_endpoint, json=payload, timeout=10)
-        return response.status_code == 200
-    except:
-        return False
+    # Ensuite tester une requête simple sur chaque serveur détecté
+    available = False
+    for backend in LLM_ROUTER.backends:
+        if not backend.model:
+            continue
+        try:
+            # Requête simple pour tester l'API
+            payload = {
+                "model": backend.model,
+                "messages": [{"role": "user", "content": "Test"}],
+                "max_tokens": 5,
+                "temperature": 0.1
+            }
+            
+            response = requests.post(backend.chat_url, json=payload, timeout=10)
+            if response.status_code == 200:
+                available = True
+        except requests.exceptions.RequestException:
+            pass
+    return available
 
 # Fonction pour vérifier la disponibilité de LM Studio
 def check_lmstudio_availability():
-    """Vérifie si LM Studio est accessible et configuré correctement"""
-    if not LM_API_URL:
-        print("❌ Erreur: LM_API_URL non défini dans le fichier .env")
+    """Vérifie si au moins un serveur LM Studio est accessible et configuré correctement"""
+    if not LLM_ROUTER.backends:
+        print("❌ Erreur: LM_API_URL (ou LM_BACKENDS) non défini dans le fichier .env")
         return False
     
-    # Tester la connexion et détecter automatiquement le modèle
+    # Tester la connexion et détecter automatiquement les modèles
     if test_lm_studio_connection():
-        print(f"✅ Connexion à LM Studio réussie sur {LM_API_URL}!")
-        if DETECTED_MODEL:
-            print(f"✅ Modèle détecté et prêt: {DETECTED_MODEL}")
+        for backend in LLM_ROUTER.backends:
+            if backend.model:
+                print(f"✅ Connexion à LM Studio réussie sur {backend} - modèle prêt: {backend.model}")
+            else:
+                print(f"⚠️ LM Studio injoignable sur {backend}")
         return True
     else:
         print("❌ Erreur: Impossible de se connecter à LM Studio. Vérifiez que le serveur est bien lancé.")
@@ -280,9 +659,42 @@ def check_lmstudio_availability():
 print("=== Configuration chargée ===")
 print(f"TELEGRAM_TOKEN: {TELEGRAM_TOKEN[:10]}..." if TELEGRAM_TOKEN else "TELEGRAM_TOKEN non défini")
 print(f"LM_API_URL: {LM_API_URL}" if LM_API_URL else "LM_API_URL non défini")
+if len(LM_BACKENDS) > 1:
+    print(f"LM_BACKENDS: {', '.join(LM_BACKENDS)}")
 print("============================")
 
 # --- Variables globales ---
+# Synthèse vocale : moteur (gtts, espeak, piper), voix et cache des fichiers audio
+# Le texte est découpé en segments d'au plus TTS_SEGMENT_CHARS caractères synthétisés en parallèle
+TTS_SEGMENT_CHARS = int(os.getenv("TTS_SEGMENT_CHARS", "600"))
+TTS_ENGINE = os.getenv("TTS_ENGINE", "gtts").lower()
+TTS_LANGUAGE = os.getenv("TTS_LANGUAGE", "fr")
+TTS_VOICE = os.getenv("TTS_VOICE", "")
+PIPER_MODEL = os.getenv("PIPER_MODEL", "")
+PIPER_SAMPLE_RATE = int(os.getenv("PIPER_SAMPLE_RATE", "22050"))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", "500"))  # Taille maximale du cache audio (0 = illimitée)
+TTS_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("TTS_MAX_WORKERS", "2")))
+TTS_BACKEND = None  # Instancié au premier usage par get_tts_backend()
+
+# Résumés déjà générés et file_id Telegram de leur audio (LRU en mémoire)
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "200"))
+VIDEO_SUMMARY_CACHE = OrderedDict()  # Format: {video_id: résumé}
+AUDIO_FILE_IDS = OrderedDict()  # Format: {sha256(video_id + résumé): file_id}
+AUDIO_UPLOAD_LOCKS = weakref.WeakValueDictionary()  # Verrous d'envoi par résumé, tant qu'un envoi les utilise (voir send_summary_voice)
+
+# Nombre maximum de livraisons simultanées lors de la diffusion aux abonnés
+DELIVERY_CONCURRENCY = int(os.getenv("DELIVERY_CONCURRENCY", "20"))
+
+# Traduction fusionnée : les vidéos en anglais sont résumées directement en français
+# au lieu d'être entièrement traduites avant le résumé
+FUSED_TRANSLATION = os.getenv("FUSED_TRANSLATION", "true").lower() in ("1", "true", "yes", "oui")
+
+# Cache des traductions (LRU en mémoire) - Format: {sha256(modèle + texte): traduction}
+TRANSLATION_CACHE = OrderedDict()
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "500"))
+TRANSLATION_CACHE_LOCK = threading.Lock()
+
 CONVERSATION_HISTORY = {}  # Stocke l'historique des conversations par utilisateur
 CHAT_ACTIVE = {}  # Indique si le mode chat est actif pour chaque utilisateur
 CHAT_MODES = {
@@ -292,17 +704,239 @@ CHAT_MODES = {
 USER_CHAT_MODES = {}  # Mode de chat par utilisateur
 
 # Structures pour les abonnements aux chaînes
-CHANNEL_SUBSCRIPTIONS = {}  # Format: {user_id: {channel_id: channel_name}}
-LATEST_VIDEOS = {}  # Format: {channel_id: [video_ids]}
+SUBSCRIPTION_BACKEND = os.getenv("SUBSCRIPTION_BACKEND", "sqlite").lower()  # "sqlite" ou "json"
 SUBSCRIPTION_FILE = "subscriptions.json"
+DATABASE_FILE = os.getenv("DATABASE_FILE", "bot.db")
+SUBSCRIPTIONS = None  # Stockage des abonnements, ouvert par load_subscriptions()
+SEEN_VIDEOS_LIMIT = 50  # Vidéos vues conservées par chaîne
+# Délai (secondes) de regroupement des réécritures de subscriptions.json (stockage json)
+STATE_FLUSH_DELAY = float(os.getenv("STATE_FLUSH_DELAY", "5"))
 CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", "1800"))  # 30 minutes par défaut
 
-# File d'attente pour les liens YouTube à traiter
-# Format: {"chat_id": {"queue": [urls], "processing": False, "thread_id": None}}
-YOUTUBE_QUEUE = {}
+# Les chaînes sont réparties en POLL_SHARDS tranches vérifiées à tour de rôle pendant CHECK_INTERVAL
+POLL_SHARDS = max(1, int(os.getenv("POLL_SHARDS", "6")))
+POLL_CONCURRENCY = int(os.getenv("POLL_CONCURRENCY", "8"))  # Chaînes vérifiées simultanément
+POLL_STATE = {"tick": 0}
+# Réveille les workers d'abonnements quand de nouvelles vidéos sont placées dans la file durable (JOBS)
+# (créé par start_subscription_workers dans la boucle d'événements du bot)
+SUBSCRIPTION_WAKEUP = None
+SUBSCRIPTION_WORKERS = int(os.getenv("SUBSCRIPTION_WORKERS", "1"))
+
+# Flux Atom des chaînes (interrogés sans quota d'API, avec requêtes conditionnelles)
+YOUTUBE_FEED_URL = os.getenv("YOUTUBE_FEED_URL", "https://www.youtube.com/feeds/videos.xml")
+FEED_TIMEOUT = int(os.getenv("FEED_TIMEOUT", "15"))
+FEED_STATE = {}  # Format: {channel_id: {"etag": ..., "last_modified": ..., "videos": [...]}}
+ATOM_NAMESPACES = {
+    "atom": "http://www.w3.org/2005/Atom",
+    "yt": "http://www.youtube.com/xml/schemas/2015",
+}
+# Session HTTP partagée : les connexions vers YouTube sont réutilisées d'un flux à l'autre
+FEED_SESSION = requests.Session()
+FEED_SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32))
+FEED_SESSION.mount("http://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
+# API YouTube Data (secours des flux) : un seul client par clé, appels regroupés par lots
+YOUTUBE_API_BATCH_SIZE = 50  # Nombre maximal d'IDs par appel channels.list / videos.list
+YOUTUBE_CLIENTS = {}  # Format: {api_key: client}
+# Le transport HTTP du client (httplib2) n'est pas thread-safe : les appels sont sérialisés
+YOUTUBE_API_LOCK = threading.Lock()
+UPLOADS_PLAYLISTS = {}  # Format: {channel_id: uploads_playlist_id}
+
+# Résolution des @handles et URLs /c/ /user/ en IDs de chaîne canoniques
+CHANNEL_ID_PATTERN = re.compile(r"UC[\w-]{22}")
+CHANNEL_PAGE_ID_PATTERNS = [
+    re.compile(r'<meta itemprop="(?:channelId|identifier)" content="(UC[\w-]{22})"'),
+    re.compile(r'<link rel="canonical" href="https://www\.youtube\.com/channel/(UC[\w-]{22})"'),
+    re.compile(r'"externalId":"(UC[\w-]{22})"'),
+]
+CHANNEL_PAGE_TITLE_PATTERN = re.compile(r'<meta property="og:title" content="([^"]*)"')
+ISO8601_DURATION_PATTERN = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?")
+
+# File d'attente durable des liens YouTube à traiter (JobStore, ouverte par open_job_store())
+JOBS = None
+ACTIVE_QUEUE_CHATS = set()  # Chats dont la file est en cours de traitement par ce processus
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "900"))  # Durée du bail d'une tâche en cours
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))  # Reprises maximales d'une tâche interrompue
+JOB_RECOVERY_INTERVAL = int(os.getenv("JOB_RECOVERY_INTERVAL", "60"))  # Recherche des tâches abandonnées
+JOB_RETENTION_SECONDS = 7 * 24 * 3600  # Conservation des tâches terminées
+# Durée maximale d'une tâche (sous-titres, résumé, audio et livraison), en secondes (0 = sans limite)
+JOB_DEADLINE = int(os.getenv("JOB_DEADLINE", "1800"))
+SUBTITLE_TIMEOUT = 30  # Timeout des téléchargements de sous-titres (secondes)
+JOB_TOKENS = {}  # Jetons d'annulation des tâches en cours dans ce processus - Format: {job_id: CancelToken}
+JOB_HEARTBEATS = {}  # Renouvellement périodique du bail des tâches détenues - Format: {job_id: asyncio.Task}
+# Budgets de calcul LLM estimé sur 24 h glissantes, en minutes (0 = illimité)
+USER_DAILY_BUDGET = float(os.getenv("USER_DAILY_BUDGET", "0"))  # Par utilisateur
+CHAT_DAILY_BUDGET = float(os.getenv("CHAT_DAILY_BUDGET", "0"))  # Par chat
+# Tâches dont le coût estimé dépasse LOW_PRIORITY_COST secondes de calcul LLM : file basse priorité,
+# traitées après les autres et avec au plus LOW_PRIORITY_CONCURRENCY requêtes LLM simultanées
+LOW_PRIORITY_COST = float(os.getenv("LOW_PRIORITY_COST", "900"))
+LOW_PRIORITY_CONCURRENCY = int(os.getenv("LOW_PRIORITY_CONCURRENCY", "1"))
+SPEECH_CHARS_PER_SECOND = 15  # Débit de parole moyen, pour estimer la longueur d'une transcription
+VIDEO_DURATIONS = OrderedDict()  # Durées des vidéos déjà estimées - Format: {video_id: secondes ou None}
+VIDEO_DURATIONS_MAX_ENTRIES = 1000
+# Mode dégradé : si aucun serveur LM Studio n'est disponible, ou si la file compte au moins DEGRADED_QUEUE_DEPTH
+# liens (0 = jamais), un résumé extractif provisoire (sans LLM) est envoyé tout de suite, puis remplacé
+# par le résumé LM Studio dès qu'il est prêt
+DEGRADED_QUEUE_DEPTH = int(os.getenv("DEGRADED_QUEUE_DEPTH", "10"))
+DEGRADED_RETRY_INTERVAL = 15  # Secondes entre deux vérifications des serveurs pendant une panne
+EXTRACTIVE_SENTENCES = int(os.getenv("EXTRACTIVE_SENTENCES", "8"))  # Phrases d'un résumé provisoire
+UPGRADE_TASKS = set()  # Résumés complets en cours de génération pour remplacer un résumé provisoire
+# Résumés complets générés simultanément en mode dégradé (les autres attendent leur tour)
+UPGRADE_CONCURRENCY = int(os.getenv("UPGRADE_CONCURRENCY", "1"))
+UPGRADE_SLOTS = asyncio.Semaphore(UPGRADE_CONCURRENCY)
+# Identité du processus dans la file : WORKER_NAME est stable d'un redémarrage à l'autre
+# et doit être unique par worker (plusieurs workers peuvent tourner sur la même machine)
+WORKER_NAME = os.getenv("WORKER_NAME") or socket.gethostname()
+WORKER_ID = f"{WORKER_NAME}:{uuid.uuid4().hex[:8]}"
+# Rôle du processus : all (tout en un), front (reçoit les messages et remplit la file)
+# ou worker (traite la file partagée, plusieurs workers possibles sur la même base)
+BOT_ROLE = os.getenv("BOT_ROLE", "all").lower()
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))  # Chats traités simultanément par un worker
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))  # Secondes entre deux lectures de la file
 
 # --- Utilitaires ---
 
+def atomic_write(path, data, durable=True):
+    """
+    Écrit un fichier de façon atomique (fichier temporaire puis renommage) :
+    un arrêt brutal laisse soit l'ancienne version, soit la nouvelle, jamais un fichier tronqué.
+    Avec durable=True, les données et le renommage sont forcés sur disque (fsync).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    
+    if durable and hasattr(os, "O_DIRECTORY"):
+        # Rend le renommage lui-même durable (POSIX)
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+class JobCancelled(BaseException):
+    """
+    Tâche annulée (/cancel) ou arrivée à échéance (JOB_DEADLINE).
+    Dérive de BaseException, comme asyncio.CancelledError, pour ne pas être absorbée
+    par les « except Exception » qui transforment les erreurs en messages ou en résumés de secours.
+    """
+    
+    def __init__(self, reason, expired=False):
+        super().__init__(reason)
+        self.reason = reason
+        self.expired = expired
+
+class CancelToken:
+    """
+    Annulation et échéance d'une tâche, transmises à toutes ses étapes (sous-titres, appels LLM,
+    synthèse vocale, livraison). Les étapes appellent check() entre deux opérations et bornent
+    leurs timeouts avec timeout() ; on_cancel() permet d'interrompre immédiatement une requête en cours.
+    """
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.callbacks = []
+        self.reason = None
+        self.expired = False
+        self.deadline = None  # time.monotonic() à l'échéance
+        self.timer = None
+    
+    def start(self, timeout):
+        """Arme l'échéance : la tâche est annulée automatiquement après timeout secondes (0 = sans limite)"""
+        if not timeout or self.timer:
+            return
+        self.deadline = time.monotonic() + timeout
+        self.timer = threading.Timer(timeout, self.cancel, args=(f"délai de {format_duration(timeout)} dépassé",), kwargs={"expired": True})
+        self.timer.daemon = True
+        self.timer.start()
+    
+    def close(self):
+        """Désarme l'échéance (tâche terminée, ou en attente d'un résumé complet) ; start() peut la réarmer"""
+        if self.timer:
+            self.timer.cancel()
+        self.timer = None
+        self.deadline = None
+    
+    def cancel(self, reason="annulée", expired=False):
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.reason = reason
+            self.expired = expired
+            self.event.set()
+            callbacks = list(self.callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Erreur lors de l'annulation: {e}")
+    
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+    
+    def check(self):
+        """Lève JobCancelled si la tâche a été annulée ou a dépassé son échéance"""
+        if self.event.is_set():
+            raise JobCancelled(self.reason, self.expired)
+    
+    def timeout(self, default):
+        """Timeout à utiliser pour une opération : default, réduit au temps restant avant l'échéance"""
+        if self.deadline is None:
+            return default
+        return max(0.1, min(default, self.deadline - time.monotonic()))
+    
+    def on_cancel(self, callback):
+        """Appelle callback à l'annulation (immédiatement si déjà annulée) ; retourne callback pour remove_callback"""
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return callback
+        callback()
+        return callback
+    
+    def remove_callback(self, callback):
+        with self.lock:
+            if callback in self.callbacks:
+                self.callbacks.remove(callback)
+
+def check_cancelled(cancel_token):
+    """token.check() pour les fonctions dont le jeton d'annulation est optionnel"""
+    if cancel_token is not None:
+        cancel_token.check()
+
+def cancel_timeout(cancel_token, default):
+    """token.timeout(default) pour les fonctions dont le jeton d'annulation est optionnel"""
+    return cancel_token.timeout(default) if cancel_token is not None else default
+
+async def run_cancellable(awaitable, cancel_token=None):
+    """Attend awaitable ; l'annulation du jeton (optionnel) l'interrompt immédiatement en levant JobCancelled"""
+    if cancel_token is None:
+        return await awaitable
+    cancel_token.check()
+    task = asyncio.ensure_future(awaitable)
+    loop = asyncio.get_running_loop()
+    # L'annulation peut venir d'un autre thread (échéance JOB_DEADLINE)
+    callback = cancel_token.on_cancel(lambda: loop.call_soon_threadsafe(task.cancel))
+    try:
+        return await task
+    except asyncio.CancelledError:
+        cancel_token.check()
+        raise
+    finally:
+        cancel_token.remove_callback(callback)
+
 def extract_video_id(url):
     # Nettoyer l'URL d'abord
     clean_url = url.split('$')[0].strip()
@@ -508,7 +1142,66 @@ def clean_subtitle_text(subtitle_content):
         print(f"⚠️ Erreur lors du nettoyage des sous-titres: {e}")
         return subtitle_content
 
-def get_subtitles_with_ytdlp(video_url):
+# Mots-outils les plus fréquents par langue, pour l'identification de la langue des sous-titres
+LANGUAGE_STOP_WORDS = {
+    "fr": "le la les des une est et en que qui dans pour pas sur au avec ce il elle nous vous je tu mais ou donc du ces cette sont être avoir fait plus très aussi comme tout bien alors parce",
+    "en": "the and that this with for are was but not you all can had her his one our out get has him how its may now see who did she they have what which would there their from been were will just about because",
+    "es": "el los las una es y en que por para con no se lo como pero sus muy está son también porque cuando todo esto hay ser tiene",
+    "de": "der die das und ist nicht ein eine mit auf für den dem sich auch ich sie wir aber wie noch nur oder wenn dass sind hat bei",
+    "it": "il lo gli della che è e per non una sono con come anche più questo quello ma del perché molto essere hanno",
+    "pt": "o os as uma é e em que para com não se por mais como mas dos das muito também ele ela isso são foi está você",
+}
+
+def build_stop_word_index():
+    """Construit l'index inversé mot -> langues utilisé par detect_language"""
+    index = {}
+    for language, words in LANGUAGE_STOP_WORDS.items():
+        for word in words.split():
+            index.setdefault(word, []).append(language)
+    return index
+
+STOP_WORD_LANGUAGES = build_stop_word_index()
+
+LANG_DETECT_SAMPLE_CHARS = int(os.getenv("LANG_DETECT_SAMPLE_CHARS", "6000"))
+WORD_PATTERN = re.compile(r"[a-zà-ÿ]+")
+
+def detect_language(text, sample_chars=LANG_DETECT_SAMPLE_CHARS):
+    """
+    Identifie la langue d'un texte par fréquence des mots-outils.
+    Seul un échantillon borné est analysé (début, milieu et fin du texte), en un seul passage,
+    ce qui garde un coût constant même sur des transcriptions de plusieurs heures.
+    
+    Returns:
+        str: Code de langue ("fr", "en", ...) ou None si la langue n'est pas identifiable
+    """
+    if not text:
+        return None
+    
+    # Échantillon réparti sur le texte pour éviter un générique ou une intro non représentatifs
+    if len(text) > sample_chars:
+        window = sample_chars // 3
+        middle = len(text) // 2
+        sample = " ".join([text[:window], text[middle - window // 2:middle + window // 2], text[-window:]])
+    else:
+        sample = text
+    
+    scores = dict.fromkeys(LANGUAGE_STOP_WORDS, 0)
+    word_count = 0
+    for word in WORD_PATTERN.findall(sample.lower()):
+        word_count += 1
+        for language in STOP_WORD_LANGUAGES.get(word, ()):
+            scores[language] += 1
+    
+    best_language = max(scores, key=scores.get)
+    best_score = scores[best_language]
+    second_score = max(score for language, score in scores.items() if language != best_language)
+    
+    # Exiger assez d'indices et une avance nette sur la deuxième langue
+    if word_count < 20 or best_score < max(5, word_count * 0.05) or best_score < second_score * 1.5:
+        return None
+    return best_language
+
+def get_subtitles_with_ytdlp(video_url, cancel_token=None):
     """Méthode alternative pour récupérer les sous-titres avec yt-dlp"""
     try:
         print("🔄 Tentative de récupération des sous-titres avec yt-dlp...")
@@ -520,6 +1213,7 @@ def get_subtitles_with_ytdlp(video_url):
             'skip_download': True,
             'quiet': True,
             'no_warnings': True,
+            'socket_timeout': cancel_timeout(cancel_token, SUBTITLE_TIMEOUT),
         }
         
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
@@ -530,13 +1224,15 @@ def get_subtitles_with_ytdlp(video_url):
                 if 'fr' in info['subtitles']:
                     print("🇫🇷 Sous-titres français trouvés avec yt-dlp")
                     subtitle_url = info['subtitles']['fr'][0]['url']
-                    response = requests.get(subtitle_url)
+                    check_cancelled(cancel_token)
+                    response = requests.get(subtitle_url, timeout=cancel_timeout(cancel_token, SUBTITLE_TIMEOUT))
                     cleaned_text = clean_subtitle_text(response.text)
                     return cleaned_text, None
                 elif 'en' in info['subtitles']:
                     print("🇬🇧 Sous-titres anglais trouvés avec yt-dlp")
                     subtitle_url = info['subtitles']['en'][0]['url']
-                    response = requests.get(subtitle_url)
+                    check_cancelled(cancel_token)
+                    response = requests.get(subtitle_url, timeout=cancel_timeout(cancel_token, SUBTITLE_TIMEOUT))
                     cleaned_text = clean_subtitle_text(response.text)
                     return cleaned_text, None
             
@@ -545,25 +1241,17 @@ def get_subtitles_with_ytdlp(video_url):
                 if 'fr' in info['automatic_captions']:
                     print("🤖 Sous-titres automatiques français trouvés avec yt-dlp")
                     subtitle_url = info['automatic_captions']['fr'][0]['url']
-                    response = requests.get(subtitle_url)
+                    check_cancelled(cancel_token)
+                    response = requests.get(subtitle_url, timeout=cancel_timeout(cancel_token, SUBTITLE_TIMEOUT))
                     cleaned_text = clean_subtitle_text(response.text)
                     
-                    # Vérifier si le texte est vraiment en français ou si c'est de l'anglais étiqueté comme français
-                    if cleaned_text and len(cleaned_text) > 100:
-                        # Test simple : si beaucoup de mots anglais courants, c'est probablement de l'anglais
-                        english_words = ['the', 'and', 'that', 'this', 'with', 'for', 'are', 'was', 'but', 'not', 'you', 'all', 'can', 'had', 'her', 'his', 'one', 'our', 'out', 'day', 'get', 'has', 'him', 'how', 'its', 'may', 'new', 'now', 'old', 'see', 'two', 'way', 'who', 'boy', 'did', 'she', 'use', 'her', 'how', 'oil', 'sit', 'set']
-                        text_lower = cleaned_text.lower()
-                        english_count = sum(1 for word in english_words if f' {word} ' in text_lower)
-                        
-                        if english_count > 20:  # Si beaucoup de mots anglais détectés
-                            print("🔍 Contenu détecté comme anglais malgré l'étiquette française - Traduction requise")
-                            return cleaned_text, "translate_needed"
-                    
+                    # La langue réelle est vérifiée par detect_language dans fetch_subtitles
                     return cleaned_text, None
                 elif 'en' in info['automatic_captions']:
                     print("🤖 Sous-titres automatiques anglais trouvés avec yt-dlp")
                     subtitle_url = info['automatic_captions']['en'][0]['url']
-                    response = requests.get(subtitle_url)
+                    check_cancelled(cancel_token)
+                    response = requests.get(subtitle_url, timeout=cancel_timeout(cancel_token, SUBTITLE_TIMEOUT))
                     cleaned_text = clean_subtitle_text(response.text)
                     return cleaned_text, "translate_needed"
         
@@ -573,8 +1261,50 @@ def get_subtitles_with_ytdlp(video_url):
         print(f"❌ Erreur avec yt-dlp: {str(e)}")
         return None, f"[Erreur yt-dlp] {str(e)}"
 
-def translate_to_french(english_text):
-    """Traduit un texte anglais vers le français en utilisant LM Studio"""
+def translation_cache_key(text):
+    """Clé de cache d'une traduction : hash du texte source et du modèle utilisé"""
+    return hashlib.sha256(f"{LLM_ROUTER.task_model('translate')}\n{text}".encode('utf-8')).hexdigest()
+
+def get_cached_translation(text):
+    """Retourne la traduction en cache d'un texte, ou None"""
+    key = translation_cache_key(text)
+    with TRANSLATION_CACHE_LOCK:
+        if key in TRANSLATION_CACHE:
+            TRANSLATION_CACHE.move_to_end(key)
+            return TRANSLATION_CACHE[key]
+    return None
+
+def store_cached_translation(text, translation):
+    """Ajoute une traduction au cache en évinçant les entrées les plus anciennes"""
+    key = translation_cache_key(text)
+    with TRANSLATION_CACHE_LOCK:
+        TRANSLATION_CACHE[key] = translation
+        TRANSLATION_CACHE.move_to_end(key)
+        while len(TRANSLATION_CACHE) > TRANSLATION_CACHE_SIZE:
+            TRANSLATION_CACHE.popitem(last=False)
+
+def translate_chunk(index, chunk, total_chunks, cancel_token=None):
+    """Traduit un chunk de texte vers le français, ou retourne l'original en cas d'erreur"""
+    print(f"   Traduction partie {index+1}/{total_chunks}...")
+    messages = [
+        {"role": "system", "content": "Traduis fidèlement ce texte anglais vers le français en gardant le sens original."},
+        {"role": "user", "content": chunk}
+    ]
+    
+    translated_chunk = chat_with_lmstudio(messages, cancel_token=cancel_token, **generation_params("translate", chunk))
+    if translated_chunk.startswith("[Erreur"):
+        print(f"⚠️ Erreur de traduction pour la partie {index+1}, conservation de l'original")
+        return chunk
+    
+    store_cached_translation(chunk, translated_chunk)
+    return translated_chunk
+
+def translate_to_french(english_text, cancel_token=None):
+    """
+    Traduit un texte anglais vers le français en utilisant LM Studio.
+    Les très longs textes sont découpés en parties : les parties déjà traduites sont
+    reprises du cache, les autres sont traduites en parallèle (dans la limite des serveurs LLM_ROUTER).
+    """
     try:
         print(f"🔄 Traduction du texte anglais vers le français ({len(english_text)} caractères)...")
         
@@ -582,49 +1312,63 @@ def translate_to_french(english_text):
         if len(english_text) > 15000:
             print("📄 Texte très long - traduction par parties...")
             chunks = split_text(english_text, 15000)
-            translated_chunks = []
-            
-            for i, chunk in enumerate(chunks):
-                print(f"   Traduction partie {i+1}/{len(chunks)}...")
-                messages = [
-                    {"role": "system", "content": "Traduis fidèlement ce texte anglais vers le français en gardant le sens original."},
-                    {"role": "user", "content": chunk}
-                ]
-                
-                translated_chunk = chat_with_lmstudio(messages)
-                if not translated_chunk.startswith("[Erreur"):
-                    translated_chunks.append(translated_chunk)
-                else:
-                    print(f"⚠️ Erreur de traduction pour la partie {i+1}, conservation de l'original")
-                    translated_chunks.append(chunk)
-            
-            result = " ".join(translated_chunks)
-            print(f"✅ Traduction complète effectuée: {len(result)} caractères")
-            return result
         else:
-            # Traduction directe pour les textes courts
-            messages = [
-                {"role": "system", "content": "Traduis fidèlement ce texte anglais vers le français en gardant le sens original."},
-                {"role": "user", "content": english_text}
-            ]
-            
-            translated_text = chat_with_lmstudio(messages)
-            if not translated_text.startswith("[Erreur"):
-                print(f"✅ Traduction effectuée: {len(translated_text)} caractères")
-                return translated_text
-            else:
-                print(f"⚠️ Erreur de traduction, conservation du texte original")
-                return english_text
+            chunks = [english_text]
+        
+        translated_chunks = [get_cached_translation(chunk) for chunk in chunks]
+        missing = [i for i, translated in enumerate(translated_chunks) if translated is None]
+        
+        if len(missing) < len(chunks):
+            print(f"♻️ {len(chunks) - len(missing)}/{len(chunks)} partie(s) déjà traduite(s) en cache")
+        
+        if len(missing) == 1:
+            i = missing[0]
+            translated_chunks[i] = translate_chunk(i, chunks[i], len(chunks), cancel_token)
+        elif missing:
+            with ThreadPoolExecutor(max_workers=min(LLM_ROUTER.capacity(), len(missing))) as executor:
+                results = executor.map(lambda i: translate_chunk(i, chunks[i], len(chunks), cancel_token), missing)
+                for i, translated in zip(missing, results):
+                    translated_chunks[i] = translated
+        
+        result = " ".join(translated_chunks)
+        print(f"✅ Traduction effectuée: {len(result)} caractères")
+        return result
                 
     except Exception as e:
         print(f"❌ Erreur lors de la traduction: {str(e)}")
         return english_text
 
-def get_subtitles(video_url):
+def fetch_subtitles(video_url, cancel_token=None):
+    """
+    Récupère les sous-titres d'une vidéo sans les traduire.
+    La langue annoncée par la source est vérifiée sur le texte lui-même (detect_language),
+    car les sous-titres automatiques sont souvent mal étiquetés.
+    
+    Returns:
+        tuple: (texte, erreur, langue) où langue est le code de langue du texte
+               ("fr" si le texte est déjà en français)
+    """
+    subtitles, error, declared_language = fetch_subtitles_from_sources(video_url, cancel_token)
+    if not subtitles:
+        return subtitles, error, declared_language
+    
+    detected_language = detect_language(subtitles)
+    if detected_language and detected_language != declared_language:
+        print(f"🔍 Langue détectée: {detected_language} (annoncée: {declared_language})")
+        return subtitles, error, detected_language
+    return subtitles, error, declared_language
+
+def fetch_subtitles_from_sources(video_url, cancel_token=None):
+    """
+    Essaie les différentes sources de sous-titres (YouTubeTranscriptApi puis yt-dlp).
+    
+    Returns:
+        tuple: (texte, erreur, langue annoncée par la source)
+    """
     try:
         video_id = extract_video_id(video_url)
         if not video_id:
-            return None, "[Erreur] Lien invalide ou ID introuvable."
+            return None, "[Erreur] Lien invalide ou ID introuvable.", None
 
         print(f"🔍 Récupération des sous-titres pour la vidéo ID: {video_id}")
         
@@ -633,6 +1377,7 @@ def get_subtitles(video_url):
         print(f"🧹 ID vidéo nettoyé: {clean_video_id}")
         
         try:
+            check_cancelled(cancel_token)
             transcript_list = YouTubeTranscriptApi.list_transcripts(clean_video_id)
             print(f"📋 Transcriptions disponibles: {[t.language_code for t in transcript_list]}")
 
@@ -641,7 +1386,7 @@ def get_subtitles(video_url):
                 if transcript.language_code == "fr":
                     print("🇫🇷 Utilisation des sous-titres français")
                     entries = transcript.fetch()
-                    return " ".join([entry['text'] for entry in entries]), None
+                    return " ".join([entry['text'] for entry in entries]), None, "fr"
 
             # Ensuite essayer les sous-titres traduisibles
             for transcript in transcript_list:
@@ -649,57 +1394,67 @@ def get_subtitles(video_url):
                     print(f"🔄 Traduction depuis {transcript.language_code} vers le français")
                     translated = transcript.translate('fr')
                     entries = translated.fetch()
-                    return " ".join([entry['text'] for entry in entries]), None
+                    return " ".join([entry['text'] for entry in entries]), None, "fr"
 
             # Si aucun sous-titre français ou traduisible, prendre le premier disponible
             if transcript_list:
                 first_transcript = list(transcript_list)[0]
                 print(f"⚠️ Utilisation des sous-titres en {first_transcript.language_code} (non traduits)")
                 entries = first_transcript.fetch()
-                return " ".join([entry['text'] for entry in entries]), None
+                return " ".join([entry['text'] for entry in entries]), None, first_transcript.language_code.split('-')[0]
 
         except Exception as transcript_error:
             print(f"❌ Erreur avec YouTubeTranscriptApi: {str(transcript_error)}")
             print("🔄 Tentative avec méthode alternative (yt-dlp)...")
-            
-            # Essayer la méthode alternative avec yt-dlp
-            subtitles, error = get_subtitles_with_ytdlp(video_url)
-            
-            # Si une traduction est nécessaire
-            if error == "translate_needed" and subtitles:
-                print("🌐 Traduction automatique du contenu anglais vers le français...")
-                translated_subtitles = translate_to_french(subtitles)
-                return translated_subtitles, None
-            
-            return subtitles, error
+            return fetch_subtitles_with_ytdlp(video_url, cancel_token)
 
-        return None, "[Erreur] Aucun sous-titre utilisable ou traduisible trouvé."
+        return None, "[Erreur] Aucun sous-titre utilisable ou traduisible trouvé.", None
 
     except TranscriptsDisabled:
         print("⚠️ Sous-titres désactivés, tentative avec yt-dlp...")
-        subtitles, error = get_subtitles_with_ytdlp(video_url)
-        if error == "translate_needed" and subtitles:
-            print("🌐 Traduction automatique du contenu anglais vers le français...")
-            translated_subtitles = translate_to_french(subtitles)
-            return translated_subtitles, None
-        return subtitles, error
+        return fetch_subtitles_with_ytdlp(video_url, cancel_token)
     except NoTranscriptFound:
         print("⚠️ Aucun sous-titre trouvé, tentative avec yt-dlp...")
-        subtitles, error = get_subtitles_with_ytdlp(video_url)
-        if error == "translate_needed" and subtitles:
-            print("🌐 Traduction automatique du contenu anglais vers le français...")
-            translated_subtitles = translate_to_french(subtitles)
-            return translated_subtitles, None
-        return subtitles, error
+        return fetch_subtitles_with_ytdlp(video_url, cancel_token)
     except Exception as e:
         print(f"❌ Erreur détaillée lors de la récupération des sous-titres: {str(e)}")
         print("🔄 Tentative avec méthode alternative (yt-dlp)...")
-        subtitles, error = get_subtitles_with_ytdlp(video_url)
-        if error == "translate_needed" and subtitles:
-            print("🌐 Traduction automatique du contenu anglais vers le français...")
-            translated_subtitles = translate_to_french(subtitles)
-            return translated_subtitles, None
-        return subtitles, error
+        return fetch_subtitles_with_ytdlp(video_url, cancel_token)
+
+def fetch_subtitles_with_ytdlp(video_url, cancel_token=None):
+    """Appelle get_subtitles_with_ytdlp et convertit le marqueur "translate_needed" en code de langue"""
+    check_cancelled(cancel_token)
+    subtitles, error = get_subtitles_with_ytdlp(video_url, cancel_token)
+    if error == "translate_needed" and subtitles:
+        return subtitles, None, "en"
+    return subtitles, error, "fr" if subtitles else None
+
+def get_subtitles(video_url, cancel_token=None):
+    """
+    Récupère les sous-titres d'une vidéo en français.
+    Le texte anglais est entièrement traduit : à réserver aux cas où la transcription
+    française complète est nécessaire (mode chat, commande /transcript).
+    """
+    subtitles, error, language = fetch_subtitles(video_url, cancel_token)
+    if subtitles and language and language != "fr":
+        print("🌐 Traduction automatique du contenu vers le français...")
+        return translate_to_french(subtitles, cancel_token), None
+    return subtitles, error
+
+def get_subtitles_for_summary(video_url, cancel_token=None):
+    """
+    Récupère les sous-titres à résumer.
+    En mode traduction fusionnée (FUSED_TRANSLATION), le texte reste dans sa langue d'origine
+    et c'est le résumé qui est rédigé directement en français : la transcription ne passe
+    qu'une seule fois dans le modèle.
+    
+    Returns:
+        tuple: (texte, erreur, langue)
+    """
+    if not FUSED_TRANSLATION:
+        subtitles, error = get_subtitles(video_url, cancel_token)
+        return subtitles, error, "fr"
+    return fetch_subtitles(video_url, cancel_token)
 
 def split_text(text, max_chars=6000):
     """
@@ -767,253 +1522,610 @@ def split_text(text, max_chars=6000):
     print(f"Texte découpé en {len(parts)} parties")
     return parts
 
-def chat_with_lmstudio(messages):
-    try:
-        # Vérifier si les variables d'environnement sont définies
-        if not LM_API_URL:
-            return "[Erreur] Variable d'environnement LM_API_URL non définie dans le fichier .env"
-        
-        # Détecter automatiquement le modèle si pas encore fait
-        if not DETECTED_MODEL:
-            if not detect_available_model():
-                return "[Erreur] Impossible de détecter un modèle disponible dans LM Studio. Vérifiez qu'un modèle est chargé."
-        
-        # Ne pas re-tester la connexion si le modèle est déjà détecté
-        # (évite la re-détection en boucle)
-        
-        # S'assurer que l'URL se termine par /v1/chat/completions
-        api_url = LM_API_URL.rstrip('/')
-        if not api_url.endswith('/v1/chat/completions'):
-            api_url = f"{api_url}/v1/chat/completions"
-        
-        print(f"Envoi de requête à {api_url}")
-        
-        # Préparation des messages au format OpenAI
-        formatted_messages = []
-        for msg in messages:
-            # S'assurer que le rôle est valide (system, user, assistant)
-            if msg["role"] not in ["system", "user", "assistant"]:
+def generation_params(stage, input_text=None):
+    """
+    Retourne les paramètres de génération (max_tokens, temperature, stop) et l'étape (task) qui choisit le modèle.
+    Pour la traduction, le budget est proportionnel à la taille du texte à traduire.
+    """
+    settings = GENERATION_SETTINGS.get(stage, GENERATION_SETTINGS["chat"])
+    params = dict(settings, task=stage if stage in GENERATION_SETTINGS else "chat")
+    if stage == "translate" and input_text:
+        # Une traduction fait à peu près la taille de l'original (+30% de marge pour le français)
+        proportional = int(estimate_tokens(input_text) * 1.3) + 50
+        params["max_tokens"] = min(params["max_tokens"], proportional) if params["max_tokens"] else proportional
+    return params
+
+class LLMCall:
+    """
+    Une requête de chat envoyée en streaming à un serveur, dans un thread : le temps jusqu'au premier token
+    est mesuré (voir LLMBackend.hedge_delay) et la requête peut être annulée si un doublon répond avant elle.
+    """
+    
+    def __init__(self, backend, model, payload, changed, timeout=300, probe=False):
+        self.backend = backend
+        self.model = model
+        self.probe = probe  # Requête de test d'un circuit ouvert (voir LLMRouter.release)
+        # Le budget demandé ne dépasse jamais la limite détectée du modèle
+        profile = backend.profile(model)
+        model_max_tokens = profile[1] if profile else int(os.getenv("LM_MAX_TOKENS", "500"))
+        max_tokens = payload.get("max_tokens")
+        self.payload = dict(payload, model=model,
+                            max_tokens=min(max_tokens, model_max_tokens) if max_tokens else model_max_tokens)
+        self.changed = changed  # Signalé au premier token et à la fin de la requête
+        self.timeout = timeout
+        self.first_token = threading.Event()
+        self.first_token_at = None
+        self.done = threading.Event()
+        self.cancelled = False
+        self.response = None
+        self.result = None
+        self.error = None
+        self.retryable = False  # Erreur venant du serveur : un autre serveur peut être essayé
+        self.thread = threading.Thread(target=self.run, name=f"llm-{backend.base_url}", daemon=True)
+        self.thread.start()
+    
+    def cancel(self):
+        """Annule la requête : couper la connexion interrompt aussi la génération côté LM Studio"""
+        self.cancelled = True
+        response = self.response
+        if response is None:
+            return
+        # response.close() attendrait la fin de la lecture en cours dans le thread de la requête :
+        # on coupe directement le socket (via son descripteur), ce qui débloque la lecture
+        try:
+            sock = socket.socket(fileno=response.raw.fileno())
+        except (OSError, ValueError, AttributeError):
+            # Réponse déjà fermée
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        finally:
+            # Le descripteur appartient toujours à la réponse : ne pas le fermer ici
+            sock.detach()
+    
+    def mark_first_token(self, sent):
+        if not self.first_token.is_set():
+            self.first_token_at = time.monotonic()
+            # Mesuré depuis l'envoi : l'attente d'une place sur le serveur (slots) n'est pas comptée
+            self.backend.record_first_token(self.first_token_at - sent)
+            self.first_token.set()
+            self.changed.set()
+    
+    def run(self):
+        success = False
+        try:
+            print(f"Envoi de requête à {self.backend.chat_url} ({self.model})")
+            # Une requête annulée pendant l'attente d'une place sur le serveur n'est jamais envoyée
+            while not self.backend.slots.acquire(timeout=1):
+                if self.cancelled:
+                    return
+            try:
+                if self.cancelled:
+                    return
+                sent = time.monotonic()
+                self.response = requests.post(self.backend.chat_url, json=self.payload, stream=True, timeout=self.timeout)
+                if self.cancelled:
+                    return
+                
+                if self.response.status_code != 200:
+                    # Une erreur 4xx vient de la requête ; une erreur 5xx, du serveur (autre serveur possible)
+                    self.error = f"[Erreur LM Studio] Code {self.response.status_code} : {self.response.text}"
+                    self.retryable = self.response.status_code >= 500
+                    success = not self.retryable
+                    print(self.error)
+                    return
+                
+                success = True
+                if self.response.headers.get("Content-Type", "").startswith("application/json"):
+                    # Serveur sans streaming : réponse complète en une fois
+                    self.mark_first_token(sent)
+                    self.result = self.parse_message(self.response.json())
+                    return
+                
+                pieces = []
+                for line in self.response.iter_lines():
+                    if self.cancelled:
+                        return
+                    line = line.decode('utf-8').strip()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    event = json.loads(data)
+                    if event.get("error"):
+                        self.error = f"[Erreur LM Studio] {event['error']}"
+                        print(self.error)
+                        return
+                    if not event.get("choices"):
+                        continue
+                    self.mark_first_token(sent)
+                    choice = event["choices"][0]
+                    piece = (choice.get("delta") or {}).get("content") or choice.get("text")
+                    if piece:
+                        pieces.append(piece)
+                self.result = "".join(pieces)
+                if self.first_token_at:
+                    # Débits mesurés (estimation des coûts, voir estimate_summary_cost)
+                    self.backend.record_throughput(
+                        sum(estimate_tokens(message["content"]) for message in self.payload["messages"]),
+                        self.first_token_at - sent,
+                        estimate_tokens(self.result),
+                        time.monotonic() - self.first_token_at
+                    )
+            finally:
+                if self.response is not None:
+                    self.response.close()
+                self.backend.slots.release()
+        except requests.exceptions.Timeout:
+            self.error = "[Erreur LM Studio] Timeout de la requête. Le serveur prend trop de temps à répondre."
+            self.retryable = True
+            success = False
+            if not self.cancelled:
+                print(f"{self.error} ({self.backend})")
+        except requests.exceptions.ConnectionError:
+            self.error = "[Erreur LM Studio] Erreur de connexion. Vérifiez que LM Studio est bien lancé et accessible."
+            self.retryable = True
+            success = False
+            if not self.cancelled:
+                print(f"{self.error} ({self.backend})")
+        except Exception as e:
+            if not self.cancelled:
+                self.error = f"[Erreur LM Studio] Erreur lors du parsing de la réponse: {str(e)}"
+                print(self.error)
+        finally:
+            if self.result is None and self.error is None:
+                self.error = "[Erreur LM Studio] Requête annulée" if self.cancelled else "[Erreur LM Studio] Format de réponse invalide"
+            # Une requête annulée ne dit rien de la santé du serveur
+            LLM_ROUTER.release(self.backend, None if self.cancelled else success, self.probe)
+            self.done.set()
+            self.changed.set()
+    
+    def parse_message(self, result):
+        if 'choices' in result and len(result['choices']) > 0:
+            return result['choices'][0]['message']['content']
+        self.error = "[Erreur LM Studio] Format de réponse invalide"
+        print(self.error)
+        print(f"Réponse complète : {result}")
+        return None
+
+def chat_with_lmstudio(messages, max_tokens=None, temperature=None, stop=None, task="chat", cancel_token=None):
+    """
+    Envoie une requête de chat à LM Studio, sur le serveur le moins chargé de LLM_ROUTER.
+    task indique l'étape (map, reduce, final, translate, qa, chat) qui détermine le modèle utilisé (LM_TASK_MODELS).
+    Si un serveur ne répond pas (connexion, timeout, erreur 5xx), la requête est renvoyée à un autre serveur.
+    Sans premier token après le délai habituel du serveur (hedge_delay), la requête est doublée vers un autre
+    serveur ayant le même modèle : la première qui répond est gardée, l'autre est annulée.
+    max_tokens, temperature et stop permettent de régler la génération pour chaque appel
+    (voir generation_params) ; sinon les valeurs globales sont utilisées.
+    Avec cancel_token, l'annulation de la tâche interrompt la requête en cours (JobCancelled est levée)
+    et le timeout ne dépasse pas son échéance.
+    """
+    check_cancelled(cancel_token)
+    
+    # Vérifier si les variables d'environnement sont définies
+    if not LLM_ROUTER.backends:
+        return "[Erreur] Variable d'environnement LM_API_URL non définie dans le fichier .env"
+    
+    # Préparation des messages au format OpenAI
+    formatted_messages = []
+    for msg in messages:
+        # S'assurer que le rôle est valide (system, user, assistant)
+        if msg["role"] not in ["system", "user", "assistant"]:
+            continue
+        formatted_messages.append({
+            "role": msg["role"],
+            "content": msg["content"]
+        })
+    
+    # S'assurer qu'il y a au moins un message
+    if not formatted_messages:
+        return "[Erreur] Aucun message valide à envoyer"
+    
+    if temperature is None:
+        temperature = float(os.getenv("LM_TEMPERATURE", "0.7"))
+    
+    # Format de requête compatible avec LM Studio (API OpenAI)
+    payload = {
+        "messages": formatted_messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": True
+    }
+    if stop:
+        payload["stop"] = stop
+    
+    LLM_ROUTER.add_hedge_budget()
+    tried = []
+    error_msg = "[Erreur LM Studio] Aucun serveur LM Studio disponible."
+    while True:
+        backend, model, probe = LLM_ROUTER.acquire(task, exclude=tried)
+        if backend is None:
+            print(error_msg)
+            return error_msg
+        tried.append(backend)
+        
+        # Détecter automatiquement le modèle du serveur si pas encore fait
+        if not model:
+            model = backend.detect()
+            if not model:
+                LLM_ROUTER.release(backend, False, probe)
+                error_msg = "[Erreur] Impossible de détecter un modèle disponible dans LM Studio. Vérifiez qu'un modèle est chargé."
                 continue
-            formatted_messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
+            LLM_ROUTER.update_profile()
         
-        # S'assurer qu'il y a au moins un message
-        if not formatted_messages:
-            return "[Erreur] Aucun message valide à envoyer"
+        changed = threading.Event()
+        request_timeout = cancel_timeout(cancel_token, 300)  # Timeout plus long pour les modèles lourds (5 minutes)
+        calls = [LLMCall(backend, model, payload, changed, request_timeout, probe)]
+        delay = backend.hedge_delay()
+        hedge_at = time.monotonic() + delay if delay else None
+        if cancel_token is not None:
+            cancel_token.on_cancel(changed.set)
         
-        # Format de requête compatible avec LM Studio (API OpenAI)
-        # Utiliser les paramètres détectés automatiquement
-        max_tokens = DETECTED_MAX_TOKENS if DETECTED_MAX_TOKENS else int(os.getenv("LM_MAX_TOKENS", "500"))
+        # Attendre qu'une requête commence à répondre (ou que toutes échouent)
+        winner = None
+        while True:
+            changed.clear()
+            if cancel_token is not None and cancel_token.cancelled:
+                for call in calls:
+                    call.cancel()
+                cancel_token.remove_callback(changed.set)
+                cancel_token.check()
+            answering = [call for call in calls if call.error is None and (call.first_token.is_set() or call.done.is_set())]
+            if answering:
+                winner = answering[0]
+                break
+            if all(call.done.is_set() for call in calls):
+                break
+            timeout = None
+            if hedge_at is not None:
+                timeout = hedge_at - time.monotonic()
+                if timeout <= 0:
+                    hedge_at = None
+                    hedge_backend, hedge_probe = LLM_ROUTER.acquire_hedge(model, exclude=tried)
+                    if hedge_backend:
+                        tried.append(hedge_backend)
+                        print(f"⏩ Pas de réponse de {backend} après {delay:.1f}s : requête doublée vers {hedge_backend}")
+                        calls.append(LLMCall(hedge_backend, model, payload, changed, request_timeout, hedge_probe))
+                    continue
+            changed.wait(timeout)
         
-        payload = {
-            "model": DETECTED_MODEL,  # Utiliser le modèle détecté automatiquement
-            "messages": formatted_messages,
-            "temperature": float(os.getenv("LM_TEMPERATURE", "0.7")),
-            "max_tokens": max_tokens,
-            "stream": False
-        }
-
-        # Utiliser un timeout plus long pour les modèles lourds (augmenté à 5 minutes)
-        response = requests.post(api_url, json=payload, timeout=300)  # 5 minutes de timeout (augmenté de 2 à 5 minutes)
-
-        if response.status_code == 200:
-            try:
-                result = response.json()
-                if 'choices' in result and len(result['choices']) > 0:
-                    return result['choices'][0]['message']['content']
-                else:
-                    error_msg = "[Erreur LM Studio] Format de réponse invalide"
-                    print(error_msg)
-                    print(f"Réponse complète : {result}")
-                    return error_msg
-            except Exception as e:
-                error_msg = f"[Erreur LM Studio] Erreur lors du parsing de la réponse: {str(e)}"
-                print(error_msg)
-                return error_msg
+        for call in calls:
+            if call is not winner:
+                call.cancel()
+        
+        if winner:
+            # La génération continue : attendre la fin (ou l'annulation de la tâche)
+            while True:
+                changed.clear()
+                if winner.done.is_set():
+                    break
+                if cancel_token is not None and cancel_token.cancelled:
+                    winner.cancel()
+                    cancel_token.remove_callback(changed.set)
+                    cancel_token.check()
+                changed.wait()
+        if cancel_token is not None:
+            cancel_token.remove_callback(changed.set)
+        
+        if winner:
+            if winner.error is None:
+                return winner.result
+            failed = [winner]
         else:
-            # Afficher plus de détails sur l'erreur
-            error_msg = f"[Erreur LM Studio] Code {response.status_code} : {response.text}"
-            print(error_msg)
-            return error_msg
-    except requests.exceptions.Timeout:
-        error_msg = "[Erreur LM Studio] Timeout de la requête. Le serveur prend trop de temps à répondre."
-        print(error_msg)
-        return error_msg
-    except requests.exceptions.ConnectionError:
-        error_msg = "[Erreur LM Studio] Erreur de connexion. Vérifiez que LM Studio est bien lancé et accessible."
-        print(error_msg)
-        return error_msg
-    except Exception as e:
-        error_msg = f"[Erreur LM Studio] {str(e)}"
-        print(error_msg)
-        return error_msg
+            failed = calls
+        
+        # Une erreur venant de la requête elle-même se reproduirait sur un autre serveur
+        for call in failed:
+            error_msg = call.error
+            if not call.retryable:
+                return error_msg
 
-def summarize(text):
-    try:
-        # Diviser le texte en chunks adaptatifs basés sur la configuration détectée
-        max_chunk_size = get_adaptive_chunk_size()
-        chunks = split_text(text, max_chunk_size)
-        summaries = []
+def estimate_tokens(text):
+    """Estime le nombre de tokens d'un texte (règle approximative: environ 4 caractères par token)"""
+    if not text:
+        return 0
+    return len(text) // 4 + 1
 
-        prompt = (
-            "Tu vas recevoir le contenu d'une vidéo YouTube. "
-            "Crée un résumé informatif en français qui commence par un titre accrocheur suivi d'un tiret. "
-            "Utilise des points clairs sans répétition et mets en avant les idées principales. "
-            "Pas de formatage Markdown (pas d'astérisques, crochets, etc.). "
-            "Écris ton résumé entièrement en français."
-        )
+def get_fusion_input_budget(system_prompt):
+    """
+    Calcule le nombre de tokens disponibles pour les résumés partiels dans un appel de fusion.
+    On retire du contexte la réponse attendue, le prompt système et une marge de sécurité.
+    """
+    context_limit = DETECTED_CONTEXT_LENGTH if DETECTED_CONTEXT_LENGTH else int(os.getenv("LM_CONTEXT_LENGTH", "4096"))
+    output_tokens = DETECTED_MAX_TOKENS if DETECTED_MAX_TOKENS else int(os.getenv("LM_MAX_TOKENS", "500"))
+    # Réserver seulement le budget de génération des étapes de fusion
+    stage_tokens = max(GENERATION_SETTINGS["reduce"]["max_tokens"], GENERATION_SETTINGS["final"]["max_tokens"])
+    if stage_tokens:
+        output_tokens = min(output_tokens, stage_tokens)
+    # Ne jamais réserver plus de la moitié du contexte pour la réponse
+    output_tokens = min(output_tokens, context_limit // 2)
+    # Garder 10% de marge pour l'imprécision de l'estimation
+    budget = int((context_limit - output_tokens - estimate_tokens(system_prompt)) * 0.9)
+    return max(budget, 256)
 
-        print(f"Traitement de {len(chunks)} chunks pour résumé...")
+def pack_summaries_for_fusion(summaries, token_budget):
+    """
+    Regroupe des résumés partiels consécutifs en autant de lots que nécessaire,
+    chaque lot contenant le maximum de résumés tenant dans le budget de tokens.
+    
+    Args:
+        summaries (list): Les résumés partiels, dans l'ordre de la vidéo
+        token_budget (int): Nombre de tokens disponibles pour un appel de fusion
         
-        # Pour les vidéos très longues, on peut avoir un nombre important de chunks
-        if len(chunks) > 15:
-            print(f"Vidéo très longue détectée ({len(chunks)} chunks). Utilisation d'une stratégie de résumé progressive.")
-            
-            # Première étape: résumer les chunks individuellement
-            batch_summaries = []
-            for i, chunk in enumerate(chunks):
-                try:
-                    print(f"Résumé du chunk {i+1}/{len(chunks)} (taille: {len(chunk)} caractères)")
-                    messages = [
-                        {"role": "system", "content": prompt},
-                        {"role": "user", "content": chunk}
-                    ]
-                    
-                    # Obtenir le résumé pour ce chunk
-                    chunk_summary = chat_with_lmstudio(messages)
-                    chunk_summary = sanitize_markdown(chunk_summary)
-                    
-                    # Vérifier si le résumé contient une erreur
-                    if chunk_summary.startswith("[Erreur"):
-                        print(f"Erreur lors du résumé du chunk {i+1}: {chunk_summary}")
-                        # En cas d'erreur, simplifier la demande pour ce chunk
-                        simplified_messages = [
-                            {"role": "system", "content": "Résume simplement ce contenu de vidéo en quelques phrases clés en français, sans formatage."},
-                            {"role": "user", "content": chunk[:len(chunk) // 2]}  # Utiliser moitié moins de texte
-                        ]
-                        chunk_summary = chat_with_lmstudio(simplified_messages)
-                        chunk_summary = sanitize_markdown(chunk_summary)
-                    
-                    # Si toujours en erreur, utiliser un résumé générique
-                    if chunk_summary.startswith("[Erreur"):
-                        chunk_summary = f"[Contenu du segment {i+1} non traité]"
-                    
-                    batch_summaries.append(chunk_summary)
-                except Exception as e:
-                    print(f"Erreur lors du traitement du chunk {i+1}: {str(e)}")
-                    batch_summaries.append(f"[Erreur dans le segment {i+1}]")
-            
-            # Deuxième étape: regrouper les résumés par lots de 5-7 et les fusionner
-            intermediate_summaries = []
-            batch_size = min(6, max(3, len(batch_summaries) // 5))  # Taille de lot dynamique
-            
-            for i in range(0, len(batch_summaries), batch_size):
-                batch = batch_summaries[i:i+batch_size]
-                batch_text = "\n\n".join([f"Section {i+j+1}: {summary}" for j, summary in enumerate(batch)])
-                
-                fusion_message = [
-                    {"role": "system", "content": "Combine ces résumés partiels de vidéo en un seul résumé cohérent en français. Garde seulement les points clés principaux, sans formatage."},
-                    {"role": "user", "content": batch_text}
-                ]
-                
-                try:
-                    batch_summary = chat_with_lmstudio(fusion_message)
-                    batch_summary = sanitize_markdown(batch_summary)
-                    
-                    if batch_summary.startswith("[Erreur"):
-                        print(f"Erreur lors de la fusion du lot {i//batch_size + 1}: {batch_summary}")
-                        batch_summary = f"[Résumé des sections {i+1} à {min(i+batch_size, len(batch_summaries))} non disponible]"
-                    
-                    intermediate_summaries.append(batch_summary)
-                except Exception as e:
-                    print(f"Erreur lors de la fusion du lot {i//batch_size + 1}: {str(e)}")
-                    intermediate_summaries.append(f"[Erreur dans la fusion du lot {i//batch_size + 1}]")
-            
-            # Troisième étape: fusion finale des résumés intermédiaires
-            summaries = intermediate_summaries
-        else:
-            # Stratégie standard pour les vidéos de taille normale
-            for i, chunk in enumerate(chunks):
-                try:
-                    print(f"Résumé du chunk {i+1}/{len(chunks)} (taille: {len(chunk)} caractères)")
-                    messages = [
-                        {"role": "system", "content": prompt},
-                        {"role": "user", "content": chunk}
-                    ]
-                    
-                    # Obtenir le résumé pour ce chunk
-                    chunk_summary = chat_with_lmstudio(messages)
-                    
-                    # Nettoyer immédiatement le résumé
-                    chunk_summary = sanitize_markdown(chunk_summary)
-                    
-                    # Vérifier si le résumé contient une erreur
-                    if chunk_summary.startswith("[Erreur"):
-                        print(f"Erreur lors du résumé du chunk {i+1}: {chunk_summary}")
-                        # En cas d'erreur, simplifier la demande pour ce chunk
-                        simplified_messages = [
-                            {"role": "system", "content": "Résume ce contenu de vidéo simplement en français, avec un titre suivi d'un tiret, sans formatage."},
-                            {"role": "user", "content": chunk[:max_chunk_size // 2]}  # Utiliser moitié moins de texte
-                        ]
-                        chunk_summary = chat_with_lmstudio(simplified_messages)
-                        chunk_summary = sanitize_markdown(chunk_summary)
-                        
-                    # Si toujours en erreur, utiliser un résumé générique
-                    if chunk_summary.startswith("[Erreur"):
-                        chunk_summary = f"[Contenu du segment {i+1}]"
-                    
-                    summaries.append(chunk_summary)
-                except Exception as e:
-                    print(f"Erreur lors du traitement du chunk {i+1}: {str(e)}")
-                    summaries.append(f"[Erreur dans le segment {i+1}: {str(e)}]")
+    Returns:
+        list: Liste de lots (listes de résumés)
+    """
+    # Chaque résumé est limité à la moitié du budget (séparateurs et arrondi de estimate_tokens compris)
+    # pour garantir au moins 2 résumés par lot, sinon la réduction pourrait ne jamais converger
+    max_chars_per_summary = ((token_budget - 2 * 2) // 2 - 1) * 4
+    
+    summaries = [summary[:max_chars_per_summary] for summary in summaries]
+    groups = []
+    current_group = []
+    current_tokens = 0
+    
+    for summary in summaries:
+        summary_tokens = estimate_tokens(summary) + 2  # Séparateur "\n\n"
+        
+        if current_group and current_tokens + summary_tokens > token_budget:
+            groups.append(current_group)
+            current_group = []
+            current_tokens = 0
+        
+        current_group.append(summary)
+        current_tokens += summary_tokens
+    
+    if current_group:
+        groups.append(current_group)
+    
+    # Un dernier lot isolé ne réduit rien : le fusionner avec le précédent s'il reste de la place
+    if len(groups) > 1 and len(groups[-1]) == 1:
+        last = groups[-1][0]
+        previous_tokens = sum(estimate_tokens(s) + 2 for s in groups[-2])
+        if previous_tokens + estimate_tokens(last) + 2 <= token_budget:
+            groups[-2].append(last)
+            groups.pop()
+    
+    # Sécurité : chaque niveau de fusion doit réduire le nombre de résumés, sinon regrouper deux par deux
+    if len(summaries) > 1 and len(groups) >= len(summaries):
+        groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+    
+    return groups
 
-        # S'il n'y a qu'un seul résumé, pas besoin de fusion
-        if len(summaries) == 1:
-            return sanitize_markdown(summaries[0])
-            
-        # S'il y a trop de résumés, les regrouper par petits groupes
-        if len(summaries) > 5:
-            print(f"Fusion de {len(summaries)} résumés en groupes...")
-            grouped_summaries = []
-            group_size = 3
-            
-            for i in range(0, len(summaries), group_size):
-                group = summaries[i:i+group_size]
-                fusion_message = [
-                    {"role": "system", "content": "Fusionne ces résumés partiels en un seul résumé cohérent sans formatage, en commençant par un titre suivi d'un tiret."},
-                    {"role": "user", "content": "\n\n".join(group)}
-                ]
-                group_summary = chat_with_lmstudio(fusion_message)
-                group_summary = sanitize_markdown(group_summary)
-                grouped_summaries.append(group_summary)
-                
-            summaries = grouped_summaries
-
-        # Fusion finale des résumés
-        print("Fusion finale des résumés...")
-        fusion_prompt = (
-            "Voici plusieurs résumés partiels d'une vidéo. "
-            "Fusionne-les en un résumé cohérent en commençant par un titre accrocheur qui résume le sujet principal, suivi d'un tiret. "
-            "Mets en avant les idées clés et les informations qui apportent le plus de valeur au lecteur. "
-            "N'utilise pas de formatage comme des astérisques ou du markdown."
-        )
+def run_llm_requests_in_parallel(message_lists, parallelism=None, **params):
+    """
+    Envoie plusieurs requêtes à LM Studio en parallèle et retourne les réponses dans le même ordre.
+    Le nombre de requêtes simultanées reste limité par serveur dans chat_with_lmstudio (LLM_ROUTER),
+    et à parallelism requêtes si indiqué (tâches basse priorité).
+    Les paramètres supplémentaires (max_tokens, temperature, stop, task, cancel_token) sont passés à chaque requête.
+    """
+    if not message_lists:
+        return []
+    if len(message_lists) == 1:
+        return [chat_with_lmstudio(message_lists[0], **params)]
+    
+    with ThreadPoolExecutor(max_workers=min(parallelism or LLM_ROUTER.capacity(), len(message_lists))) as executor:
+        return list(executor.map(lambda messages: chat_with_lmstudio(messages, **params), message_lists))
+
+LANGUAGE_NAMES = {
+    "en": "anglais",
+    "es": "espagnol",
+    "de": "allemand",
+    "it": "italien",
+    "pt": "portugais",
+}
+
+def source_language_instruction(source_language):
+    """Consigne à ajouter au prompt quand le texte source n'est pas en français (traduction fusionnée)"""
+    if not source_language or source_language == "fr":
+        return ""
+    language_name = LANGUAGE_NAMES.get(source_language, "une langue étrangère")
+    return (
+        f" Le contenu est en {language_name} : ne le traduis pas, "
+        "rédige directement le résumé en français."
+    )
+
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?…])\s+")
+
+def split_sentences(text, max_words=30):
+    """Découpe un texte en phrases ; les sous-titres automatiques, souvent sans ponctuation, sont coupés tous les max_words mots"""
+    sentences = []
+    for sentence in SENTENCE_END_PATTERN.split(text):
+        words = sentence.split()
+        for start in range(0, len(words), max_words):
+            sentences.append(" ".join(words[start:start + max_words]))
+    return sentences
+
+def extractive_summary(text, max_sentences=None):
+    """
+    Résumé extractif, sans LLM : dans chaque section du texte (pour couvrir toute la vidéo), la phrase
+    dont les mots (hors mots-outils) sont les plus fréquents dans la transcription, dans l'ordre d'origine.
+    Le résumé est dans la langue de la transcription.
+    """
+    max_sentences = max_sentences or EXTRACTIVE_SENTENCES
+    sentences = [sentence for sentence in split_sentences(text) if len(sentence.split()) >= 4]
+    if not sentences:
+        return text[:500].strip()
+    
+    frequencies = Counter(
+        word for word in WORD_PATTERN.findall(text.lower())
+        if len(word) > 3 and word not in STOP_WORD_LANGUAGES
+    )
+    
+    def score(sentence):
+        # Moyenne par mot, pour ne pas favoriser les phrases les plus longues
+        return sum(frequencies[word] for word in WORD_PATTERN.findall(sentence.lower())) / len(sentence.split())
+    
+    count = min(max_sentences, len(sentences))
+    section = len(sentences) / count
+    chosen = []
+    for i in range(count):
+        # Les transcriptions répètent souvent les mêmes phrases : une phrase n'est retenue qu'une fois
+        candidates = [sentence for sentence in sentences[int(i * section):int((i + 1) * section)] if sentence not in chosen]
+        if candidates:
+            chosen.append(max(candidates, key=score))
+    return "\n".join(sentence[0].upper() + sentence[1:] for sentence in chosen)
 
+def summarize_chunk(index, chunk, prompt, total_chunks, source_language="fr", cancel_token=None):
+    """
+    Résume un chunk de sous-titres, avec une nouvelle tentative simplifiée en cas d'erreur.
+    Renvoie (résumé, True), ou (extrait de la transcription, False) si LM Studio n'a pas pu le résumer.
+    """
+    try:
+        print(f"Résumé du chunk {index+1}/{total_chunks} (taille: {len(chunk)} caractères)")
         messages = [
-            {"role": "system", "content": fusion_prompt},
-            {"role": "user", "content": "\n\n".join(summaries)}
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": chunk}
+        ]
+        
+        # Obtenir le résumé pour ce chunk (nettoyé une fois les erreurs écartées : sanitize_markdown retire les crochets)
+        chunk_summary = chat_with_lmstudio(messages, cancel_token=cancel_token, **generation_params("map"))
+        
+        # Vérifier si le résumé contient une erreur
+        if chunk_summary.startswith("[Erreur"):
+            print(f"Erreur lors du résumé du chunk {index+1}: {chunk_summary}")
+            # En cas d'erreur, simplifier la demande pour ce chunk
+            simplified_messages = [
+                {"role": "system", "content": "Résume ce contenu de vidéo simplement en français, avec un titre suivi d'un tiret, sans formatage." + source_language_instruction(source_language)},
+                {"role": "user", "content": chunk[:len(chunk) // 2]}  # Utiliser moitié moins de texte
+            ]
+            chunk_summary = chat_with_lmstudio(simplified_messages, cancel_token=cancel_token, **generation_params("map"))
+        
+        # Si toujours en erreur, se rabattre sur un résumé extractif du chunk
+        if chunk_summary.startswith("[Erreur"):
+            return extractive_summary(chunk, 3), False
+        
+        return sanitize_markdown(chunk_summary), True
+    except Exception as e:
+        print(f"Erreur lors du traitement du chunk {index+1}: {str(e)}")
+        return extractive_summary(chunk, 3), False
+
+def reduce_summaries(summaries, cancel_token=None, parallelism=None, on_fallback=None):
+    """
+    Réduction hiérarchique des résumés partiels.
+    À chaque niveau, les résumés sont regroupés en lots aussi gros que le contexte le permet,
+    les lots sont fusionnés en parallèle, puis on recommence jusqu'à obtenir un seul résumé.
+    Le dernier appel (lot unique) utilise le prompt de fusion finale.
+    on_fallback(), optionnel, est appelé si une fusion échoue (lot conservé tel quel).
+    """
+    intermediate_prompt = (
+        "Fusionne ces résumés partiels consécutifs d'une vidéo en un seul résumé cohérent en français. "
+        "Garde seulement les points clés principaux, dans l'ordre, sans formatage."
+    )
+    final_prompt = (
+        "Voici plusieurs résumés partiels d'une vidéo. "
+        "Fusionne-les en un résumé cohérent en commençant par un titre accrocheur qui résume le sujet principal, suivi d'un tiret. "
+        "Mets en avant les idées clés et les informations qui apportent le plus de valeur au lecteur. "
+        "N'utilise pas de formatage comme des astérisques ou du markdown."
+    )
+    
+    # Les deux prompts ont une taille proche : prendre le plus long pour le budget
+    token_budget = get_fusion_input_budget(max(intermediate_prompt, final_prompt, key=len))
+    level = 0
+    
+    while len(summaries) > 1:
+        level += 1
+        groups = pack_summaries_for_fusion(summaries, token_budget)
+        is_final = len(groups) == 1
+        prompt = final_prompt if is_final else intermediate_prompt
+        
+        if is_final:
+            print(f"Fusion finale de {len(summaries)} résumés (niveau {level})...")
+        else:
+            print(f"Niveau {level}: fusion de {len(summaries)} résumés en {len(groups)} lots en parallèle...")
+        
+        message_lists = [
+            [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": "\n\n".join(group)}
+            ]
+            for group in groups
         ]
-        final_summary = chat_with_lmstudio(messages)
+        results = run_llm_requests_in_parallel(
+            message_lists, parallelism=parallelism, cancel_token=cancel_token,
+            **generation_params("final" if is_final else "reduce")
+        )
+        
+        next_summaries = []
+        for group_index, (group, result) in enumerate(zip(groups, results)):
+            if result.startswith("[Erreur") or not sanitize_markdown(result).strip():
+                print(f"Erreur lors de la fusion du lot {group_index+1} (niveau {level}): {result}")
+                if on_fallback:
+                    on_fallback()
+                if is_final:
+                    # Si la fusion finale échoue, retourner la concaténation des résumés
+                    concatenated = "\n\n".join([f"Partie {i+1}:\n{summary}" for i, summary in enumerate(group)])
+                    result = sanitize_markdown(concatenated)
+                else:
+                    # Conserver le contenu du lot : il sera tronqué au niveau suivant si nécessaire
+                    result = "\n".join(group)
+            else:
+                result = sanitize_markdown(result)
+            next_summaries.append(result)
+        
+        summaries = next_summaries
+    
+    return summaries[0] if summaries else ""
+
+def summarize(text, source_language="fr", load_checkpoint=None, save_checkpoint=None, cancel_token=None, parallelism=None,
+              on_fallback=None):
+    """
+    Résume une transcription en français.
+    Si source_language n'est pas "fr", les chunks sont résumés directement en français
+    sans passer par une traduction complète préalable.
+    load_checkpoint(index, chunk) et save_checkpoint(index, chunk, résumé), optionnels, permettent
+    de reprendre les résumés de chunks déjà calculés (file durable des résumés).
+    cancel_token (CancelToken), optionnel, interrompt le résumé en levant JobCancelled.
+    parallelism limite le nombre de requêtes LLM simultanées (tâches basse priorité).
+    on_fallback(), optionnel, est appelé si une partie du résumé a dû être remplacée par un extrait
+    de la transcription (LM Studio indisponible) : ce résumé ne doit alors pas être mis en cache.
+    """
+    try:
+        # Diviser le texte en chunks adaptatifs basés sur la configuration détectée
+        max_chunk_size = get_adaptive_chunk_size()
+        chunks = split_text(text, max_chunk_size)
+
+        prompt = (
+            "Tu vas recevoir le contenu d'une vidéo YouTube. "
+            "Crée un résumé informatif en français qui commence par un titre accrocheur suivi d'un tiret. "
+            "Utilise des points clairs sans répétition et mets en avant les idées principales. "
+            "Pas de formatage Markdown (pas d'astérisques, crochets, etc.). "
+            "Écris ton résumé entièrement en français."
+        ) + source_language_instruction(source_language)
+
+        print(f"Traitement de {len(chunks)} chunks pour résumé...")
         
-        # Nettoyer une dernière fois le résumé final
-        final_summary = sanitize_markdown(final_summary)
+        def summarize_or_resume(index, chunk):
+            if load_checkpoint:
+                saved_summary = load_checkpoint(index, chunk)
+                if saved_summary:
+                    print(f"Résumé du chunk {index+1}/{len(chunks)} repris d'un point de reprise")
+                    return saved_summary
+            chunk_summary, from_llm = summarize_chunk(index, chunk, prompt, len(chunks), source_language, cancel_token)
+            # Les résumés extractifs de secours ne sont pas conservés : ils seront recalculés
+            if not from_llm:
+                if on_fallback:
+                    on_fallback()
+            elif save_checkpoint:
+                save_checkpoint(index, chunk, chunk_summary)
+            return chunk_summary
         
-        # Si la fusion finale échoue, retourner la concaténation des résumés
-        if final_summary.startswith("[Erreur"):
-            print(f"Erreur lors de la fusion finale: {final_summary}")
-            concatenated = "\n\n".join([f"Partie {i+1}:\n{summary}" for i, summary in enumerate(summaries)])
-            final_summary = sanitize_markdown(concatenated)
+        # Première étape: résumer les chunks en parallèle (l'ordre est conservé)
+        if len(chunks) == 1:
+            summaries = [summarize_or_resume(0, chunks[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(parallelism or LLM_ROUTER.capacity(), len(chunks))) as executor:
+                summaries = list(executor.map(lambda item: summarize_or_resume(*item), enumerate(chunks)))
+
+        # S'il n'y a qu'un seul résumé, pas besoin de fusion
+        if len(summaries) == 1:
+            return sanitize_markdown(summaries[0])
+        
+        # Deuxième étape: réduction hiérarchique jusqu'à un seul résumé
+        final_summary = reduce_summaries(summaries, cancel_token, parallelism, on_fallback)
         
         # Vérification finale : s'assurer que le résumé n'est pas vide
         if not final_summary or not final_summary.strip():
@@ -1026,7 +2138,30 @@ def summarize(text):
         print(error_msg)
         return error_msg
 
-def ask_question_about_subtitles(subtitles, question):
+def estimate_summary_cost(text_length):
+    """
+    Estime le coût du résumé d'une transcription de text_length caractères, d'après le découpage
+    en chunks et les débits mesurés des serveurs (LLM_ROUTER.throughput).
+    
+    Returns:
+        tuple: (secondes de calcul LLM, durée estimée du résumé en secondes avec le parallélisme disponible)
+    """
+    prompt_rate, generation_rate = LLM_ROUTER.throughput()
+    chunks = max(1, math.ceil(text_length / get_adaptive_chunk_size()))
+    # Les budgets de génération sont des plafonds : l'estimation est volontairement prudente
+    map_tokens = GENERATION_SETTINGS["map"]["max_tokens"] or DETECTED_MAX_TOKENS or 500
+    final_tokens = GENERATION_SETTINGS["final"]["max_tokens"] or DETECTED_MAX_TOKENS or 500
+    
+    map_seconds = (text_length // 4) / prompt_rate + chunks * map_tokens / generation_rate
+    reduce_seconds = 0
+    if chunks > 1:
+        reduce_seconds = chunks * map_tokens / prompt_rate + final_tokens / generation_rate
+    
+    cost = map_seconds + reduce_seconds
+    duration = map_seconds / min(chunks, LLM_ROUTER.capacity()) + reduce_seconds
+    return cost, duration
+
+def ask_question_about_subtitles(subtitles, question, source_language="fr"):
     # Limiter la taille des sous-titres en utilisant la configuration adaptative
     max_subtitle_length = get_adaptive_chunk_size()
     
@@ -1035,15 +2170,20 @@ def ask_question_about_subtitles(subtitles, question):
         subtitles = subtitles[:max_subtitle_length] + "... [texte tronqué]"
         print(f"⚠️ Sous-titres tronqués à {max_subtitle_length} caractères pour éviter le dépassement de contexte")
     
+    # La transcription peut être dans sa langue d'origine (traduction fusionnée)
+    language_note = ""
+    if source_language and source_language != "fr":
+        language_note = f" (en {LANGUAGE_NAMES.get(source_language, 'langue étrangère')})"
+    
     prompt = (
-        f"Voici la transcription d'une vidéo YouTube :\n\n{subtitles}\n\n"
+        f"Voici la transcription d'une vidéo YouTube{language_note} :\n\n{subtitles}\n\n"
         f"Réponds à la question suivante de manière claire et utile : {question}"
     )
     messages = [
-        {"role": "system", "content": "Tu es un assistant qui répond précisément à des questions sur une vidéo."},
+        {"role": "system", "content": "Tu es un assistant qui répond précisément à des questions sur une vidéo. Réponds toujours en français."},
         {"role": "user", "content": prompt}
     ]
-    return chat_with_lmstudio(messages)
+    return chat_with_lmstudio(messages, **generation_params("qa"))
 
 def sanitize_markdown(text):
     """
@@ -1187,10 +2327,195 @@ def clean_text_for_audio(text):
     
     return clean_text
 
-def text_to_audio(text, filename="resume.mp3"):
+# --- Synthèse vocale ---
+
+class TTSBackend:
+    """
+    Base des moteurs de synthèse vocale : chacun définit name, voice() et synthesize(text, timeout),
+    qui retourne l'audio MP3 en bytes. La base fournit l'emplacement de ses fichiers dans le cache audio.
+    """
+    name = "base"
+    
+    def voice(self):
+        """Identifiant de la voix utilisée (fait partie de la clé du cache audio)"""
+        return ""
+    
+    def cache_path(self, clean_text):
+        """Chemin du fichier audio en cache pour un texte, avec la voix et le moteur de ce backend"""
+        key = hashlib.sha256(f"{self.name}\n{self.voice()}\n{clean_text}".encode('utf-8')).hexdigest()
+        return os.path.join(TTS_CACHE_DIR, f"{key}.mp3")
+
+class GTTSBackend(TTSBackend):
+    """Synthèse en ligne via Google Text-to-Speech"""
+    name = "gtts"
+    
+    def voice(self):
+        return TTS_LANGUAGE
+    
+    def synthesize(self, text, timeout=300):
+        buffer = io.BytesIO()
+        gTTS(text, lang=TTS_LANGUAGE, timeout=timeout).write_to_fp(buffer)
+        return buffer.getvalue()
+
+def encode_to_mp3(audio_data, input_args):
+    """Convertit un flux audio (WAV ou PCM brut) en MP3 avec ffmpeg"""
+    if not shutil.which("ffmpeg"):
+        raise RuntimeError("ffmpeg est requis pour encoder l'audio des moteurs hors ligne")
+    result = subprocess.run(
+        ["ffmpeg", "-loglevel", "error", *input_args, "-i", "pipe:0", "-f", "mp3", "pipe:1"],
+        input=audio_data, capture_output=True, check=True, timeout=120
+    )
+    return result.stdout
+
+class EspeakBackend(TTSBackend):
+    """Synthèse hors ligne via espeak-ng"""
+    name = "espeak"
+    
+    def voice(self):
+        return TTS_VOICE or TTS_LANGUAGE
+    
+    def synthesize(self, text, timeout=300):
+        result = subprocess.run(
+            ["espeak-ng", "-v", self.voice(), "--stdout"],
+            input=text.encode('utf-8'), capture_output=True, check=True, timeout=timeout
+        )
+        return encode_to_mp3(result.stdout, [])
+
+class PiperBackend(TTSBackend):
+    """Synthèse hors ligne via piper (modèle .onnx défini par PIPER_MODEL)"""
+    name = "piper"
+    
+    def voice(self):
+        return os.path.basename(PIPER_MODEL)
+    
+    def synthesize(self, text, timeout=300):
+        if not PIPER_MODEL:
+            raise RuntimeError("PIPER_MODEL non défini dans le fichier .env")
+        result = subprocess.run(
+            ["piper", "--model", PIPER_MODEL, "--output-raw"],
+            input=text.encode('utf-8'), capture_output=True, check=True, timeout=timeout
+        )
+        # piper produit du PCM 16 bits mono à la fréquence du modèle
+        return encode_to_mp3(result.stdout, ["-f", "s16le", "-ar", str(PIPER_SAMPLE_RATE), "-ac", "1"])
+
+TTS_BACKENDS = {
+    "gtts": GTTSBackend,
+    "espeak": EspeakBackend,
+    "piper": PiperBackend,
+}
+
+def get_tts_backend():
+    """Retourne le moteur de synthèse configuré (TTS_ENGINE), gTTS par défaut"""
+    global TTS_BACKEND
+    if TTS_BACKEND is None:
+        backend_class = TTS_BACKENDS.get(TTS_ENGINE)
+        if backend_class is None:
+            print(f"⚠️ Moteur TTS inconnu '{TTS_ENGINE}', utilisation de gTTS")
+            backend_class = GTTSBackend
+        TTS_BACKEND = backend_class()
+    return TTS_BACKEND
+
+def prune_tts_cache():
+    """Supprime les fichiers audio les moins récemment utilisés (mtime) tant que le cache dépasse TTS_CACHE_MAX_MB"""
+    if TTS_CACHE_MAX_MB <= 0:
+        return
+    entries = []
+    for entry in os.scandir(TTS_CACHE_DIR):
+        if entry.name.endswith(".mp3"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    
+    total = sum(size for _, size, _ in entries)
+    limit = TTS_CACHE_MAX_MB * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # Déjà supprimé par une autre synthèse
+        total -= size
+
+def synthesize_speech(clean_text, cancel_token=None):
+    """
+    Synthétise un texte déjà nettoyé et retourne l'audio MP3 en bytes.
+    Le résultat est mis en cache sur disque : un résumé déjà converti n'est pas resynthétisé.
+    Si le moteur hors ligne échoue, gTTS est utilisé en secours.
+    """
+    check_cancelled(cancel_token)
+    backend = get_tts_backend()
+    cache_path = backend.cache_path(clean_text)
+    
+    try:
+        with open(cache_path, 'rb') as f:
+            # Le mtime sert d'horodatage de dernier usage pour l'éviction du cache
+            os.utime(f.fileno())
+            print(f"♻️ Audio repris du cache ({os.path.basename(cache_path)})")
+            return f.read()
+    except FileNotFoundError:
+        pass  # Absent ou supprimé entre-temps par prune_tts_cache
+    
+    try:
+        audio_data = backend.synthesize(clean_text, timeout=cancel_timeout(cancel_token, 300))
+    except Exception as e:
+        if backend.name == "gtts":
+            raise
+        check_cancelled(cancel_token)
+        print(f"⚠️ Erreur du moteur TTS {backend.name}: {e} - utilisation de gTTS")
+        backend = GTTSBackend()
+        cache_path = backend.cache_path(clean_text)
+        audio_data = backend.synthesize(clean_text, timeout=cancel_timeout(cancel_token, 300))
+    
+    # Écriture atomique pour ne jamais laisser un fichier audio tronqué dans le cache
+    os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+    atomic_write(cache_path, audio_data, durable=False)
+    prune_tts_cache()
+    
+    return audio_data
+
+def split_text_for_tts(text, max_chars=None):
+    """
+    Découpe le texte aux limites de phrases en segments d'au plus max_chars caractères,
+    pour synthétiser les segments en parallèle.
+    """
+    max_chars = max_chars or TTS_SEGMENT_CHARS
+    sentences = re.split(r'(?<=[.!?…])\s+', text.strip())
+    
+    segments = []
+    current_segment = ""
+    for sentence in sentences:
+        if not sentence:
+            continue
+        # Une phrase trop longue est coupée aux espaces
+        while len(sentence) > max_chars:
+            split_index = sentence[:max_chars].rfind(' ')
+            if split_index <= 0:
+                split_index = max_chars
+            if current_segment:
+                segments.append(current_segment)
+                current_segment = ""
+            segments.append(sentence[:split_index].strip())
+            sentence = sentence[split_index:].strip()
+        
+        if current_segment and len(current_segment) + len(sentence) + 1 > max_chars:
+            segments.append(current_segment)
+            current_segment = sentence
+        else:
+            current_segment = f"{current_segment} {sentence}".strip()
+    
+    if current_segment:
+        segments.append(current_segment)
+    return segments
+
+def text_to_audio(text, filename="resume.mp3", cancel_token=None):
     """
-    Convertit le texte en fichier audio MP3.
+    Convertit le texte en audio MP3 et le retourne dans un buffer en mémoire (io.BytesIO).
     Nettoie le texte avant de le convertir pour éviter les problèmes de prononciation.
+    Le texte est découpé en phrases synthétisées en parallèle puis concaténées ;
+    filename sert seulement de nom au fichier envoyé à Telegram.
     """
     # Vérifier si le texte d'entrée est valide
     if not text or not text.strip():
@@ -1213,311 +2538,1206 @@ def text_to_audio(text, filename="resume.mp3"):
     
     print(f"🧹 Texte nettoyé pour l'audio ({len(clean_text)} caractères)")
     
-    # Convertir en audio
+    # Convertir en audio, segment par segment en parallèle (les MP3 se concatènent tels quels)
     try:
-        tts = gTTS(clean_text, lang='fr')
-        tts.save(filename)
-        print(f"✅ Audio sauvegardé dans {filename}")
-        return filename
+        segments = split_text_for_tts(clean_text)
+        print(f"🔊 Synthèse de {len(segments)} segment(s) en parallèle")
+        audio_buffer = io.BytesIO()
+        for audio_data in TTS_EXECUTOR.map(lambda segment: synthesize_speech(segment, cancel_token), segments):
+            audio_buffer.write(audio_data)
+        audio_buffer.seek(0)
+        audio_buffer.name = filename
+        print(f"✅ Audio généré ({audio_buffer.getbuffer().nbytes} octets)")
+        return audio_buffer
     except Exception as e:
         print(f"❌ Erreur lors de la conversion TTS: {e}")
         raise
 
+async def text_to_audio_async(text, filename="resume.mp3", cancel_token=None):
+    """
+    Version asynchrone de text_to_audio, sans bloquer le bot.
+    L'assemblage tourne dans un thread séparé de TTS_EXECUTOR, qui reste réservé aux segments.
+    """
+    return await asyncio.to_thread(text_to_audio, text, filename, cancel_token)
+
+# --- Réutilisation des résumés et des fichiers audio déjà envoyés ---
+
+def get_cached_summary(video_id):
+    """Retourne le résumé déjà généré pour une vidéo, ou None"""
+    if video_id in VIDEO_SUMMARY_CACHE:
+        VIDEO_SUMMARY_CACHE.move_to_end(video_id)
+        return VIDEO_SUMMARY_CACHE[video_id]
+    return None
+
+def store_cached_summary(video_id, summary):
+    """Mémorise le résumé d'une vidéo (les résumés en erreur ne sont pas conservés)"""
+    if not video_id or not summary or summary.startswith("[Erreur"):
+        return
+    VIDEO_SUMMARY_CACHE[video_id] = summary
+    VIDEO_SUMMARY_CACHE.move_to_end(video_id)
+    while len(VIDEO_SUMMARY_CACHE) > SUMMARY_CACHE_SIZE:
+        VIDEO_SUMMARY_CACHE.popitem(last=False)
+
+def audio_file_id_key(video_id, summary):
+    """Clé du file_id Telegram de l'audio d'un résumé : la vidéo et le texte exact du résumé"""
+    return hashlib.sha256(f"{video_id}\n{summary}".encode('utf-8')).hexdigest()
+
+def get_audio_file_id(video_id, summary):
+    """Retourne le file_id Telegram de l'audio de ce résumé s'il a déjà été envoyé, ou None"""
+    return AUDIO_FILE_IDS.get(audio_file_id_key(video_id, summary))
+
+def store_audio_file_id(video_id, summary, file_id):
+    """Mémorise le file_id Telegram de l'audio d'un résumé"""
+    key = audio_file_id_key(video_id, summary)
+    AUDIO_FILE_IDS[key] = file_id
+    AUDIO_FILE_IDS.move_to_end(key)
+    while len(AUDIO_FILE_IDS) > SUMMARY_CACHE_SIZE:
+        AUDIO_FILE_IDS.popitem(last=False)
+
+async def send_summary_voice(bot, video_id, summary, audio_buffer=None, rate_limiter=None, cancel_token=None, **kwargs):
+    """
+    Envoie l'audio d'un résumé.
+    Si cet audio a déjà été envoyé, son file_id Telegram est réutilisé (pas de nouvel envoi du fichier) ;
+    sinon le fichier est envoyé une fois (synthétisé si audio_buffer est None) et son file_id mémorisé.
+    
+    Args:
+        bot: L'instance du bot Telegram
+        video_id: ID de la vidéo résumée
+        summary: Texte du résumé
+        audio_buffer: Audio déjà synthétisé (io.BytesIO), optionnel
+        rate_limiter: TelegramRateLimiter optionnel pour régler le débit d'envoi
+        cancel_token: CancelToken optionnel, qui interrompt la synthèse, l'attente du verrou et l'envoi
+        **kwargs: Arguments pour send_voice (chat_id, caption, message_thread_id...)
+        
+    Returns:
+        Le message envoyé
+    """
+    async def send_voice(voice):
+        if rate_limiter:
+            send_kwargs = {key: value for key, value in kwargs.items() if key != 'chat_id'}
+            return await run_cancellable(
+                rate_limiter.send(kwargs['chat_id'], bot.send_voice, voice=voice, **send_kwargs), cancel_token
+            )
+        return await run_cancellable(bot.send_voice(voice=voice, **kwargs), cancel_token)
+    
+    key = audio_file_id_key(video_id, summary)
+    
+    async def send_file_id(file_id):
+        """Renvoie l'audio par son file_id ; None si Telegram le refuse (expiré ou d'un autre bot)"""
+        try:
+            return await send_voice(file_id)
+        except telegram.error.BadRequest as e:
+            print(f"⚠️ file_id audio refusé pour {video_id}: {e}")
+            if AUDIO_FILE_IDS.get(key) == file_id:
+                AUDIO_FILE_IDS.pop(key, None)
+            return None
+    
+    file_id = AUDIO_FILE_IDS.get(key)
+    if file_id:
+        message = await send_file_id(file_id)
+        if message:
+            return message
+    
+    # Un seul envoi du fichier à la fois par résumé : lors d'une diffusion en parallèle, les autres
+    # destinataires attendent le file_id du premier envoi, puis l'utilisent en dehors du verrou.
+    # Le verrou disparaît de AUDIO_UPLOAD_LOCKS quand plus aucun envoi (ni attente) ne le référence.
+    lock = AUDIO_UPLOAD_LOCKS.setdefault(key, asyncio.Lock())
+    await run_cancellable(lock.acquire(), cancel_token)
+    try:
+        file_id = AUDIO_FILE_IDS.get(key)
+        if not file_id:
+            if audio_buffer is None:
+                audio_buffer = await text_to_audio_async(summary, f"resume_{video_id}.mp3", cancel_token)
+            audio_buffer.seek(0)
+            
+            message = await send_voice(audio_buffer)
+            if message and message.voice:
+                store_audio_file_id(video_id, summary, message.voice.file_id)
+            return message
+    finally:
+        lock.release()
+    
+    message = await send_file_id(file_id)
+    if message:
+        return message
+    # file_id envoyé par un autre destinataire mais refusé : renvoyer le fichier
+    return await send_summary_voice(bot, video_id, summary, audio_buffer, rate_limiter, cancel_token, **kwargs)
+
 # --- Gestion des abonnements ---
 
-def save_subscriptions():
-    """Sauvegarde les abonnements dans un fichier JSON."""
-    with open(SUBSCRIPTION_FILE, 'w', encoding='utf-8') as f:
-        json.dump({
-            "subscriptions": CHANNEL_SUBSCRIPTIONS,
-            "latest_videos": LATEST_VIDEOS
-        }, f, ensure_ascii=False, indent=2)
-    print(f"Abonnements sauvegardés dans {SUBSCRIPTION_FILE}")
+class JsonSubscriptionStore:
+    """
+    Stockage des abonnements dans subscriptions.json (format historique).
+    Chaque modification est d'abord ajoutée au journal (subscriptions.json.journal), puis le fichier
+    complet est réécrit de façon atomique au plus une fois par STATE_FLUSH_DELAY secondes.
+    Au démarrage, le journal est rejoué sur le dernier fichier complet : un arrêt brutal ne perd rien.
+    """
+    name = "json"
+    
+    def __init__(self, path=SUBSCRIPTION_FILE, flush_delay=None):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.flush_delay = STATE_FLUSH_DELAY if flush_delay is None else flush_delay
+        self.lock = threading.RLock()
+        self.flush_timer = None
+        self.journal = None
+        self.subscriptions = {}  # Format: {user_id: {channel_id: channel_name}}
+        self.latest_videos = {}  # Format: {channel_id: [video_ids]}
+        self.channel_aliases = {}  # Format: {"handle:nom": {"id": "UC…", "name": ...}}
+        self.subscribers = {}  # Index inverse - Format: {channel_id: {user_id: channel_name}}
+        self.loaded = self.load()
+    
+    def load(self):
+        """Charge les abonnements (fichier JSON puis journal) ; renvoie False si le fichier est illisible."""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                # Une copie est conservée : la prochaine sauvegarde ne doit pas effacer les abonnements
+                shutil.copy2(self.path, f"{self.path}.corrupt")
+                print(f"Erreur lors du chargement des abonnements: {e} (copie conservée dans {self.path}.corrupt)")
+                return False
+            # Convertir les clés user_id en entiers (car JSON les stocke comme strings)
+            self.subscriptions = {int(user_id): channels for user_id, channels in data.get("subscriptions", {}).items()}
+            self.latest_videos = data.get("latest_videos", {})
+            self.channel_aliases = data.get("channel_aliases", {})
+            for user_id, channels in self.subscriptions.items():
+                for channel_id, channel_name in channels.items():
+                    self.subscribers.setdefault(channel_id, {})[user_id] = channel_name
+            print(f"Abonnements chargés depuis {self.path}")
+        
+        replayed = self.replay_journal()
+        if replayed:
+            print(f"{replayed} modification(s) d'abonnements rejouée(s) depuis {self.journal_path}")
+            self.flush()
+        return True
+    
+    def replay_journal(self):
+        """Réapplique les modifications journalisées depuis la dernière sauvegarde complète"""
+        if not os.path.exists(self.journal_path):
+            return 0
+        replayed = 0
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    operation, *args = json.loads(line)
+                except ValueError:
+                    # Dernière ligne tronquée par un arrêt pendant l'écriture
+                    break
+                getattr(self, f"_apply_{operation}")(*args)
+                replayed += 1
+        return replayed
+    
+    def flush(self):
+        """Écrit l'état complet de façon atomique puis vide le journal."""
+        with self.lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            data = json.dumps({
+                "subscriptions": self.subscriptions,
+                "latest_videos": self.latest_videos,
+                "channel_aliases": self.channel_aliases
+            }, ensure_ascii=False, indent=2)
+            atomic_write(self.path, data.encode('utf-8'))
+            # Tout est dans le fichier : le journal peut repartir de zéro
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+    
+    def close(self):
+        """Sauvegarde les modifications en attente (appelée à l'arrêt du bot)"""
+        with self.lock:
+            if self.flush_timer is not None or self.journal is not None:
+                self.flush()
+    
+    def _commit(self, operation, *args):
+        """Journalise une modification (écriture durable d'une ligne), l'applique et planifie la sauvegarde"""
+        with self.lock:
+            if self.journal is None:
+                self.journal = open(self.journal_path, 'a', encoding='utf-8')
+            self.journal.write(json.dumps([operation, *args], ensure_ascii=False) + "\n")
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            getattr(self, f"_apply_{operation}")(*args)
+            
+            # Les modifications rapprochées sont regroupées en une seule réécriture du fichier
+            if self.flush_timer is None:
+                self.flush_timer = threading.Timer(self.flush_delay, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+    
+    def _apply_subscribe(self, user_id, channel_id, channel_name):
+        self.subscriptions.setdefault(user_id, {})[channel_id] = channel_name
+        self.subscribers.setdefault(channel_id, {})[user_id] = channel_name
+        self.latest_videos.setdefault(channel_id, [])
+    
+    def _apply_unsubscribe(self, user_id, channel_id):
+        channels = self.subscriptions.get(user_id, {})
+        channels.pop(channel_id, None)
+        # Si l'utilisateur n'a plus d'abonnements, supprime son entrée
+        if not channels:
+            self.subscriptions.pop(user_id, None)
+        self.subscribers.get(channel_id, {}).pop(user_id, None)
+        if not self.subscribers.get(channel_id):
+            self.subscribers.pop(channel_id, None)
+    
+    def _apply_seen(self, channel_id, video_ids):
+        known_videos = self.latest_videos.setdefault(channel_id, [])
+        known_videos.extend(video_id for video_id in video_ids if video_id not in known_videos)
+        self.latest_videos[channel_id] = known_videos[-SEEN_VIDEOS_LIMIT:]
+    
+    def _apply_alias(self, key, channel_info):
+        self.channel_aliases[key] = {"id": channel_info["id"], "name": channel_info["name"]}
+    
+    def _apply_rename(self, old_channel_id, new_channel_id):
+        for user_id, channel_name in self.subscribers.pop(old_channel_id, {}).items():
+            channels = self.subscriptions[user_id]
+            channels.pop(old_channel_id, None)
+            if new_channel_id not in channels:
+                channels[new_channel_id] = channel_name
+                self.subscribers.setdefault(new_channel_id, {})[user_id] = channel_name
+        self._apply_seen(new_channel_id, self.latest_videos.pop(old_channel_id, []))
+    
+    def subscribe(self, user_id, channel_id, channel_name):
+        """Abonne l'utilisateur à la chaîne ; renvoie False s'il y était déjà abonné"""
+        with self.lock:
+            if channel_id in self.subscriptions.get(user_id, {}):
+                return False
+            self._commit("subscribe", user_id, channel_id, channel_name)
+            return True
+    
+    def unsubscribe(self, user_id, channel_id):
+        """Désabonne l'utilisateur ; renvoie le nom de la chaîne, ou None s'il n'y était pas abonné"""
+        with self.lock:
+            channel_name = self.subscriptions.get(user_id, {}).get(channel_id)
+            if channel_name is None:
+                return None
+            self._commit("unsubscribe", user_id, channel_id)
+            return channel_name
+    
+    def get_user_subscriptions(self, user_id):
+        """Chaînes suivies par l'utilisateur - Format: {channel_id: channel_name}"""
+        with self.lock:
+            return dict(self.subscriptions.get(user_id, {}))
+    
+    def get_subscribers(self, channel_id):
+        """Abonnés de la chaîne - Format: {user_id: channel_name}"""
+        with self.lock:
+            return dict(self.subscribers.get(channel_id, {}))
+    
+    def get_channel_ids(self):
+        """Ensemble des chaînes ayant au moins un abonné"""
+        with self.lock:
+            return set(self.subscribers)
+    
+    def get_seen_videos(self, channel_id):
+        """IDs des vidéos déjà vues pour la chaîne"""
+        with self.lock:
+            return set(self.latest_videos.get(channel_id, []))
+    
+    def mark_videos_seen(self, channel_id, video_ids):
+        """Enregistre des vidéos comme vues (seules les SEEN_VIDEOS_LIMIT plus récentes sont conservées)"""
+        self._commit("seen", channel_id, list(video_ids))
+    
+    def get_alias(self, key):
+        """Chaîne résolue pour un alias (@handle, /c/, /user/), ou None"""
+        with self.lock:
+            alias = self.channel_aliases.get(key)
+            return dict(alias) if alias else None
+    
+    def set_alias(self, key, channel_info):
+        self._commit("alias", key, {"id": channel_info["id"], "name": channel_info["name"]})
+    
+    def rename_channel(self, old_channel_id, new_channel_id):
+        """Transfère abonnements et vidéos vues d'un ancien identifiant de chaîne vers l'ID canonique"""
+        self._commit("rename", old_channel_id, new_channel_id)
+
+class SqliteSubscriptionStore:
+    """
+    Stockage transactionnel des abonnements dans SQLite (mode WAL).
+    Chaque modification n'écrit que les lignes concernées, et l'index sur subscriptions(channel_id)
+    permet de trouver les abonnés d'une chaîne sans parcourir tous les utilisateurs.
+    Chaque modification est une transaction validée dans le WAL : un arrêt brutal du bot ne perd ni ne
+    tronque rien, sans le journal et les réécritures groupées dont a besoin JsonSubscriptionStore.
+    """
+    name = "sqlite"
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS channels (
+            channel_id TEXT PRIMARY KEY,
+            name TEXT
+        );
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            user_id INTEGER NOT NULL REFERENCES users(user_id),
+            channel_id TEXT NOT NULL REFERENCES channels(channel_id),
+            channel_name TEXT,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (user_id, channel_id)
+        );
+        CREATE INDEX IF NOT EXISTS subscriptions_by_channel ON subscriptions(channel_id, user_id);
+        CREATE TABLE IF NOT EXISTS seen_videos (
+            channel_id TEXT NOT NULL,
+            video_id TEXT NOT NULL,
+            seen_at REAL NOT NULL,
+            PRIMARY KEY (channel_id, video_id)
+        );
+        CREATE TABLE IF NOT EXISTS channel_aliases (
+            alias TEXT PRIMARY KEY,
+            channel_id TEXT NOT NULL,
+            name TEXT
+        );
+        CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+    
+    def __init__(self, path=DATABASE_FILE, json_path=SUBSCRIPTION_FILE):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = open_database(path)
+        with self.lock, self.connection:
+            self.connection.executescript(self.SCHEMA)
+        self.import_json(json_path)
+    
+    def close(self):
+        with self.lock:
+            self.connection.close()
+    
+    def import_json(self, json_path):
+        """Importe (une seule fois) les abonnements de l'ancien fichier subscriptions.json"""
+        with self.lock:
+            if self.connection.execute("SELECT 1 FROM metadata WHERE key = 'json_imported'").fetchone():
+                return
+            if os.path.exists(json_path):
+                legacy = JsonSubscriptionStore(json_path)
+                if not legacy.loaded:
+                    # Fichier illisible : l'import sera retenté au prochain démarrage
+                    return
+                with self.connection:
+                    for user_id, channels in legacy.subscriptions.items():
+                        for channel_id, channel_name in channels.items():
+                            self._subscribe(user_id, channel_id, channel_name)
+                    for channel_id, video_ids in legacy.latest_videos.items():
+                        self._mark_videos_seen(channel_id, video_ids)
+                    for key, channel_info in legacy.channel_aliases.items():
+                        self._set_alias(key, channel_info)
+                print(f"Abonnements importés depuis {json_path} dans {self.path}")
+            with self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('json_imported', ?)", (str(time.time()),))
+    
+    def _subscribe(self, user_id, channel_id, channel_name):
+        now = time.time()
+        self.connection.execute("INSERT OR IGNORE INTO users (user_id, created_at) VALUES (?, ?)", (user_id, now))
+        self.connection.execute("INSERT OR IGNORE INTO channels (channel_id, name) VALUES (?, ?)", (channel_id, channel_name))
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO subscriptions (user_id, channel_id, channel_name, created_at) VALUES (?, ?, ?, ?)",
+            (user_id, channel_id, channel_name, now)
+        )
+        return cursor.rowcount > 0
+    
+    def _mark_videos_seen(self, channel_id, video_ids):
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO seen_videos (channel_id, video_id, seen_at) VALUES (?, ?, ?)",
+            # Horodatages croissants pour conserver l'ordre d'arrivée
+            [(channel_id, video_id, now + index * 1e-6) for index, video_id in enumerate(video_ids)]
+        )
+        self.connection.execute(
+            """DELETE FROM seen_videos WHERE channel_id = ? AND video_id NOT IN (
+                   SELECT video_id FROM seen_videos WHERE channel_id = ? ORDER BY seen_at DESC LIMIT ?
+               )""",
+            (channel_id, channel_id, SEEN_VIDEOS_LIMIT)
+        )
+    
+    def _set_alias(self, key, channel_info):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO channel_aliases (alias, channel_id, name) VALUES (?, ?, ?)",
+            (key, channel_info["id"], channel_info["name"])
+        )
+    
+    def subscribe(self, user_id, channel_id, channel_name):
+        """Abonne l'utilisateur à la chaîne ; renvoie False s'il y était déjà abonné"""
+        with self.lock, self.connection:
+            return self._subscribe(user_id, channel_id, channel_name)
+    
+    def unsubscribe(self, user_id, channel_id):
+        """Désabonne l'utilisateur ; renvoie le nom de la chaîne, ou None s'il n'y était pas abonné"""
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT channel_name FROM subscriptions WHERE user_id = ? AND channel_id = ?",
+                (user_id, channel_id)
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("DELETE FROM subscriptions WHERE user_id = ? AND channel_id = ?", (user_id, channel_id))
+            return row[0]
+    
+    def get_user_subscriptions(self, user_id):
+        """Chaînes suivies par l'utilisateur - Format: {channel_id: channel_name}"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT channel_id, channel_name FROM subscriptions WHERE user_id = ? ORDER BY created_at",
+                (user_id,)
+            ).fetchall()
+        return dict(rows)
+    
+    def get_subscribers(self, channel_id):
+        """Abonnés de la chaîne - Format: {user_id: channel_name}"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT user_id, channel_name FROM subscriptions WHERE channel_id = ?",
+                (channel_id,)
+            ).fetchall()
+        return dict(rows)
+    
+    def get_channel_ids(self):
+        """Ensemble des chaînes ayant au moins un abonné"""
+        with self.lock:
+            rows = self.connection.execute("SELECT DISTINCT channel_id FROM subscriptions").fetchall()
+        return {row[0] for row in rows}
+    
+    def get_seen_videos(self, channel_id):
+        """IDs des vidéos déjà vues pour la chaîne"""
+        with self.lock:
+            rows = self.connection.execute("SELECT video_id FROM seen_videos WHERE channel_id = ?", (channel_id,)).fetchall()
+        return {row[0] for row in rows}
+    
+    def mark_videos_seen(self, channel_id, video_ids):
+        """Enregistre des vidéos comme vues (seules les SEEN_VIDEOS_LIMIT plus récentes sont conservées)"""
+        with self.lock, self.connection:
+            self._mark_videos_seen(channel_id, video_ids)
+    
+    def get_alias(self, key):
+        """Chaîne résolue pour un alias (@handle, /c/, /user/), ou None"""
+        with self.lock:
+            row = self.connection.execute("SELECT channel_id, name FROM channel_aliases WHERE alias = ?", (key,)).fetchone()
+        return {"id": row[0], "name": row[1]} if row else None
+    
+    def set_alias(self, key, channel_info):
+        with self.lock, self.connection:
+            self._set_alias(key, channel_info)
+    
+    def rename_channel(self, old_channel_id, new_channel_id):
+        """Transfère abonnements et vidéos vues d'un ancien identifiant de chaîne vers l'ID canonique"""
+        with self.lock, self.connection:
+            rows = self.connection.execute(
+                "SELECT user_id, channel_name FROM subscriptions WHERE channel_id = ?",
+                (old_channel_id,)
+            ).fetchall()
+            for user_id, channel_name in rows:
+                self._subscribe(user_id, new_channel_id, channel_name)
+            self.connection.execute("DELETE FROM subscriptions WHERE channel_id = ?", (old_channel_id,))
+            self.connection.execute(
+                "UPDATE OR IGNORE seen_videos SET channel_id = ? WHERE channel_id = ?",
+                (new_channel_id, old_channel_id)
+            )
+            self.connection.execute("DELETE FROM seen_videos WHERE channel_id = ?", (old_channel_id,))
+            self.connection.execute("DELETE FROM channels WHERE channel_id = ?", (old_channel_id,))
+
+SUBSCRIPTION_BACKENDS = {
+    "json": JsonSubscriptionStore,
+    "sqlite": SqliteSubscriptionStore,
+}
+
+def open_database(path):
+    """Ouvre la base SQLite partagée du bot (mode WAL : lectures non bloquées par les écritures)"""
+    connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
 
 def load_subscriptions():
-    """Charge les abonnements depuis un fichier JSON s'il existe."""
-    global CHANNEL_SUBSCRIPTIONS, LATEST_VIDEOS
-    if os.path.exists(SUBSCRIPTION_FILE):
-        try:
-            with open(SUBSCRIPTION_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                # Convertir les clés user_id en entiers (car JSON les stocke comme strings)
-                CHANNEL_SUBSCRIPTIONS = {int(user_id): channels for user_id, channels in data.get("subscriptions", {}).items()}
-                LATEST_VIDEOS = data.get("latest_videos", {})
-            print(f"Abonnements chargés depuis {SUBSCRIPTION_FILE}")
-        except Exception as e:
-            print(f"Erreur lors du chargement des abonnements: {e}")
+    """Ouvre le stockage des abonnements configuré (SUBSCRIPTION_BACKEND) et convertit les anciens abonnements."""
+    global SUBSCRIPTIONS
+    backend_class = SUBSCRIPTION_BACKENDS.get(SUBSCRIPTION_BACKEND)
+    if backend_class is None:
+        print(f"⚠️ Stockage des abonnements inconnu '{SUBSCRIPTION_BACKEND}', utilisation de SQLite")
+        backend_class = SqliteSubscriptionStore
+    SUBSCRIPTIONS = backend_class()
+    atexit.register(SUBSCRIPTIONS.close)
+    print(f"Stockage des abonnements : {SUBSCRIPTIONS.name}")
+    
+    # Les abonnements par @handle des anciennes versions sont convertis en IDs canoniques
+    migrate_subscriptions()
 
-def extract_channel_id(url):
-    """Extrait l'ID de la chaîne à partir de l'URL."""
+def is_canonical_channel_id(channel_id):
+    """Indique si l'identifiant est un ID de chaîne YouTube canonique (UC…)"""
+    return bool(CHANNEL_ID_PATTERN.fullmatch(channel_id or ""))
+
+def parse_channel_reference(url):
+    """
+    Identifie la chaîne désignée par une URL (ou un @handle).
+    
+    Returns:
+        tuple: (type, valeur) avec type parmi "id", "handle", "c", "user", ou None si non reconnue
+    """
     # Nettoyer l'URL - supprimer les paramètres après ?
-    if "?" in url:
-        url = url.split("?")[0]
+    url = urllib.parse.unquote(url.strip().split("?")[0])
     
     if "youtube.com/channel/" in url:
         # Format: https://www.youtube.com/channel/UC_x5XG1OV2P6uZZ5FSM9Ttw
-        return url.split("youtube.com/channel/")[1].split("/")[0]
-    elif "youtube.com/c/" in url or "youtube.com/user/" in url:
-        # Pour les URLs personnalisées, nous devrons faire une requête
-        # à l'API YouTube pour obtenir l'ID de la chaîne
+        return "id", url.split("youtube.com/channel/")[1].split("/")[0]
+    if "youtube.com/@" in url:
+        # Format: https://www.youtube.com/@NomDeLaChaine
+        return "handle", url.split("youtube.com/@")[1].split("/")[0]
+    if "youtube.com/c/" in url:
+        return "c", url.split("youtube.com/c/")[1].split("/")[0]
+    if "youtube.com/user/" in url:
+        return "user", url.split("youtube.com/user/")[1].split("/")[0]
+    if url.startswith("@"):
+        return "handle", url[1:].split("/")[0]
+    if is_canonical_channel_id(url):
+        return "id", url
+    return None
+
+def extract_channel_id(url):
+    """Extrait l'ID de la chaîne à partir de l'URL (uniquement pour les URLs /channel/UC…)."""
+    reference = parse_channel_reference(url)
+    if reference and reference[0] == "id":
+        return reference[1]
+    return None
+
+def channel_alias_key(kind, value):
+    """Clé du cache des alias de chaînes (les handles et noms personnalisés ne sont pas sensibles à la casse)"""
+    return f"{kind}:{value.lower()}"
+
+def resolve_channel_with_api(kind, value, api_key):
+    """Résout un @handle (forHandle) ou un nom d'utilisateur (forUsername) via channels.list"""
+    if kind == "handle":
+        request_params = {"forHandle": f"@{value}"}
+    elif kind == "user":
+        request_params = {"forUsername": value}
+    else:
+        # Les URLs /c/ n'ont pas d'équivalent dans l'API
+        return None
+    
+    youtube = get_youtube_client(api_key)
+    response = execute_youtube_request(youtube.channels().list(part='snippet', **request_params))
+    if not response.get('items'):
+        return None
+    item = response['items'][0]
+    return {"id": item['id'], "name": item['snippet']['title']}
+
+def resolve_channel_with_page(kind, value):
+    """Résout une chaîne en lisant les métadonnées de sa page YouTube (sans clé d'API)"""
+    path = f"@{value}" if kind == "handle" else f"{kind}/{value}"
+    response = FEED_SESSION.get(
+        f"https://www.youtube.com/{urllib.parse.quote(path, safe='@/')}",
+        # Évite la page de consentement aux cookies servie en Europe
+        cookies={"CONSENT": "YES+1"},
+        timeout=FEED_TIMEOUT
+    )
+    if response.status_code != 200:
         return None
-    elif "youtube.com/@" in url:
-        # Format: https://www.youtube.com/@nomdelacha@ne
-        return url.split("youtube.com/@")[1].split("/")[0]
+    
+    for pattern in CHANNEL_PAGE_ID_PATTERNS:
+        match = pattern.search(response.text)
+        if match:
+            name_match = CHANNEL_PAGE_TITLE_PATTERN.search(response.text)
+            return {
+                "id": match.group(1),
+                "name": html.unescape(name_match.group(1)) if name_match else None
+            }
     return None
 
+def resolve_channel_reference(kind, value, api_key=None):
+    """
+    Résout un @handle ou une URL /c/ ou /user/ en ID de chaîne canonique (UC…).
+    Le résultat est mis en cache (et sauvegardé avec les abonnements) : chaque alias n'est résolu qu'une fois.
+    
+    Returns:
+        dict: {"id": ..., "name": ...} ou None si la chaîne est introuvable
+    """
+    key = channel_alias_key(kind, value)
+    cached = SUBSCRIPTIONS.get_alias(key)
+    if cached:
+        return cached
+    
+    resolved = None
+    if api_key:
+        try:
+            resolved = resolve_channel_with_api(kind, value, api_key)
+        except Exception as e:
+            print(f"Erreur lors de la résolution de {key} via l'API YouTube: {e}")
+    if not resolved:
+        try:
+            resolved = resolve_channel_with_page(kind, value)
+        except requests.exceptions.RequestException as e:
+            print(f"Erreur lors de la résolution de {key} via la page de la chaîne: {e}")
+    
+    if not resolved or not is_canonical_channel_id(resolved["id"]):
+        return None
+    
+    if not resolved.get("name"):
+        resolved["name"] = f"@{value}" if kind == "handle" else value
+    SUBSCRIPTIONS.set_alias(key, resolved)
+    print(f"Chaîne {key} résolue en {resolved['id']}")
+    return dict(resolved)
+
 def get_channel_info(url, api_key=None):
-    """Obtient les informations de la chaîne à partir de l'URL."""
+    """Obtient les informations de la chaîne (ID canonique UC… et nom) à partir de l'URL."""
+    if api_key is None:
+        api_key = os.getenv("YOUTUBE_API_KEY")
+    
+    reference = parse_channel_reference(url)
+    if not reference:
+        return None
+    kind, value = reference
+    
     try:
-        # Nettoyer l'URL - supprimer les paramètres après ?
-        if "?" in url:
-            url = url.split("?")[0]
-            
-        # Essayer d'extraire directement l'ID de la chaîne
-        channel_id = extract_channel_id(url)
-        
-        # Si nous avons l'ID direct de la chaîne
-        if channel_id:
-            # Si nous n'avons pas d'API key, nous pouvons juste renvoyer l'ID
-            # et essayer d'extraire le nom depuis l'URL
-            if not api_key:
-                # Extraire le nom depuis l'URL pour @username
-                if "youtube.com/@" in url:
-                    channel_name = url.split("youtube.com/@")[1].split("/")[0]
-                    return {"id": channel_id, "name": f"@{channel_name}"}
-                return {"id": channel_id, "name": channel_id}
-
-        # Si nous avons une API key, nous pouvons obtenir plus d'informations
-        if api_key:
-            youtube = build('youtube', 'v3', developerKey=api_key)
-            
-            # Si c'est une URL personnalisée, nous cherchons par le nom de la chaîne
-            if not channel_id:
-                # Extraire le nom personnalisé
-                if "youtube.com/c/" in url:
-                    custom_name = url.split("youtube.com/c/")[1].split("/")[0]
-                elif "youtube.com/user/" in url:
-                    custom_name = url.split("youtube.com/user/")[1].split("/")[0]
-                elif "youtube.com/@" in url:
-                    custom_name = url.split("youtube.com/@")[1].split("/")[0]
-                else:
-                    return None
-                
-                # Rechercher la chaîne par son nom
-                search_response = youtube.search().list(
-                    q=custom_name,
-                    type='channel',
-                    part='id,snippet',
-                    maxResults=1
-                ).execute()
-                
-                if search_response['items']:
-                    item = search_response['items'][0]
-                    return {
-                        "id": item['id']['channelId'],
-                        "name": item['snippet']['title']
-                    }
-                return None
-            
-            # Si nous avons déjà l'ID, nous obtenons directement les informations
-            channel_response = youtube.channels().list(
-                part='snippet',
-                id=channel_id
-            ).execute()
-            
-            if channel_response['items']:
-                item = channel_response['items'][0]
-                return {
-                    "id": item['id'],
-                    "name": item['snippet']['title']
-                }
-        
-        # Si nous n'avons pas pu obtenir les informations complètes
-        if channel_id:
-            # Utiliser l'ID comme nom
-            return {"id": channel_id, "name": channel_id}
+        # Les @handles et URLs personnalisées sont convertis en ID canonique (une seule fois)
+        if kind != "id":
+            return resolve_channel_reference(kind, value, api_key)
         
-        return None
+        # Si nous avons une API key, nous pouvons obtenir le nom de la chaîne
+        if api_key:
+            details = get_channels_details([value], api_key)
+            if value in details:
+                return {"id": value, "name": details[value]["name"]}
     except Exception as e:
         print(f"Erreur lors de l'obtention des informations de la chaîne: {e}")
-        # En cas d'erreur, si nous avons l'ID, nous le renvoyons
-        if channel_id:
-            return {"id": channel_id, "name": channel_id}
+    
+    # Utiliser l'ID comme nom
+    return {"id": value, "name": value}
+
+def migrate_subscriptions(api_key=None):
+    """
+    Convertit en IDs canoniques les abonnements enregistrés sous forme de @handle
+    (les anciennes versions stockaient le handle comme ID, ce qui ne renvoyait jamais de vidéos).
+    Les abonnements non résolus sont conservés et réessayés plus tard.
+    
+    Returns:
+        int: Nombre de chaînes converties
+    """
+    if api_key is None:
+        api_key = os.getenv("YOUTUBE_API_KEY")
+    
+    legacy_ids = {channel_id for channel_id in SUBSCRIPTIONS.get_channel_ids() if not is_canonical_channel_id(channel_id)}
+    migrated = 0
+    for legacy_id in legacy_ids:
+        reference = parse_channel_reference(legacy_id) or ("handle", legacy_id)
+        resolved = resolve_channel_reference(*reference, api_key)
+        if not resolved:
+            print(f"Impossible de convertir l'abonnement {legacy_id} en ID de chaîne")
+            continue
+        
+        SUBSCRIPTIONS.rename_channel(legacy_id, resolved["id"])
+        migrated += 1
+    
+    if migrated:
+        print(f"{migrated} abonnement(s) converti(s) en ID de chaîne canonique")
+    return migrated
+
+def get_youtube_client(api_key):
+    """
+    Renvoie le client de l'API YouTube Data pour cette clé.
+    build() télécharge et analyse le document de découverte de l'API, ce qui est lent :
+    le client est donc construit une seule fois puis réutilisé.
+    """
+    with YOUTUBE_API_LOCK:
+        youtube = YOUTUBE_CLIENTS.get(api_key)
+        if youtube is None:
+            youtube = build('youtube', 'v3', developerKey=api_key, cache_discovery=False)
+            YOUTUBE_CLIENTS[api_key] = youtube
+        return youtube
+
+def execute_youtube_request(request):
+    """Exécute une requête de l'API YouTube (sérialisée, le client partagé n'étant pas thread-safe)"""
+    with YOUTUBE_API_LOCK:
+        return request.execute()
+
+def iter_batches(items, batch_size=YOUTUBE_API_BATCH_SIZE):
+    """Découpe une liste en lots de batch_size éléments au plus"""
+    items = list(items)
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+def parse_iso8601_duration(duration):
+    """Convertit une durée ISO 8601 de l'API YouTube (ex: PT1H2M3S) en secondes"""
+    match = ISO8601_DURATION_PATTERN.fullmatch(duration or "")
+    if not match:
         return None
+    days, hours, minutes, seconds = (int(value or 0) for value in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+def format_duration(seconds):
+    """Formate une durée en secondes (ex: 1:02:03 ou 12:34)"""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+def get_channels_details(channel_ids, api_key):
+    """
+    Récupère le nom et la playlist des mises en ligne de plusieurs chaînes,
+    avec un appel channels.list par lot de 50 chaînes.
+    
+    Returns:
+        dict: {channel_id: {"name": ..., "uploads": ...}} pour les chaînes trouvées
+    """
+    youtube = get_youtube_client(api_key)
+    details = {}
+    for batch in iter_batches(channel_ids):
+        response = execute_youtube_request(youtube.channels().list(
+            part='snippet,contentDetails',
+            id=','.join(batch),
+            maxResults=len(batch)
+        ))
+        for item in response.get('items', []):
+            uploads = item.get('contentDetails', {}).get('relatedPlaylists', {}).get('uploads')
+            details[item['id']] = {"name": item['snippet']['title'], "uploads": uploads}
+            if uploads:
+                UPLOADS_PLAYLISTS[item['id']] = uploads
+    return details
+
+def get_uploads_playlists(channel_ids, api_key):
+    """Renvoie la playlist des mises en ligne de chaque chaîne (résolue une seule fois par chaîne)"""
+    missing = [channel_id for channel_id in channel_ids if channel_id not in UPLOADS_PLAYLISTS]
+    if missing:
+        get_channels_details(missing, api_key)
+    return {channel_id: UPLOADS_PLAYLISTS[channel_id] for channel_id in channel_ids if channel_id in UPLOADS_PLAYLISTS}
+
+def fetch_latest_videos_from_api(channel_ids, api_key, max_results=5):
+    """
+    Récupère les dernières vidéos de plusieurs chaînes via l'API YouTube Data.
+    La playlist des mises en ligne est lue avec playlistItems.list (1 unité de quota)
+    plutôt qu'avec search.list (100 unités).
+    
+    Returns:
+        dict: {channel_id: [{"id", "title", "published_at"}]} pour les chaînes interrogées avec succès
+    """
+    youtube = get_youtube_client(api_key)
+    results = {}
+    for channel_id, playlist_id in get_uploads_playlists(channel_ids, api_key).items():
+        try:
+            response = execute_youtube_request(youtube.playlistItems().list(
+                part='snippet,contentDetails',
+                playlistId=playlist_id,
+                maxResults=max_results
+            ))
+        except Exception as e:
+            print(f"Erreur lors de la récupération des vidéos pour {channel_id}: {e}")
+            continue
+        
+        videos = []
+        for item in response.get('items', []):
+            content_details = item.get('contentDetails', {})
+            videos.append({
+                "id": content_details.get('videoId') or item['snippet']['resourceId']['videoId'],
+                "title": item['snippet']['title'],
+                "published_at": content_details.get('videoPublishedAt') or item['snippet'].get('publishedAt', "")
+            })
+        results[channel_id] = videos
+    return results
+
+def get_videos_metadata(video_ids, api_key):
+    """
+    Récupère la durée et la présence de sous-titres de plusieurs vidéos (un appel videos.list par lot de 50).
+    
+    Returns:
+        dict: {video_id: {"duration": secondes ou None, "captions": bool}}
+    """
+    youtube = get_youtube_client(api_key)
+    metadata = {}
+    for batch in iter_batches(video_ids):
+        response = execute_youtube_request(youtube.videos().list(
+            part='contentDetails',
+            id=','.join(batch),
+            maxResults=len(batch)
+        ))
+        for item in response.get('items', []):
+            content_details = item.get('contentDetails', {})
+            metadata[item['id']] = {
+                "duration": parse_iso8601_duration(content_details.get('duration')),
+                "captions": content_details.get('caption') == 'true'
+            }
+    return metadata
+
+def fetch_channel_feed(channel_id, max_results=5):
+    """
+    Récupère les dernières vidéos d'une chaîne via son flux Atom public (sans quota d'API).
+    Les requêtes sont conditionnelles (ETag / If-Modified-Since) : si le flux n'a pas changé,
+    YouTube répond 304 sans contenu et les vidéos déjà connues sont renvoyées.
+    
+    Returns:
+        list: Les vidéos ({"id", "title", "published_at"}), ou None si le flux est indisponible
+    """
+    state = FEED_STATE.setdefault(channel_id, {})
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+    
+    try:
+        response = FEED_SESSION.get(
+            YOUTUBE_FEED_URL,
+            params={"channel_id": channel_id},
+            headers=headers,
+            timeout=FEED_TIMEOUT
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"Erreur lors de la récupération du flux de {channel_id}: {e}")
+        return None
+    
+    if response.status_code == 304:
+        return state.get("videos", [])[:max_results]
+    if response.status_code != 200:
+        print(f"Flux indisponible pour {channel_id} (code {response.status_code})")
+        return None
+    
+    try:
+        root = ET.fromstring(response.content)
+    except ET.ParseError as e:
+        print(f"Flux invalide pour {channel_id}: {e}")
+        return None
+    
+    videos = []
+    for entry in root.findall("atom:entry", ATOM_NAMESPACES):
+        video_id = entry.findtext("yt:videoId", namespaces=ATOM_NAMESPACES)
+        if not video_id:
+            continue
+        videos.append({
+            "id": video_id,
+            "title": entry.findtext("atom:title", default="", namespaces=ATOM_NAMESPACES),
+            "published_at": entry.findtext("atom:published", default="", namespaces=ATOM_NAMESPACES)
+        })
+    
+    state["etag"] = response.headers.get("ETag")
+    state["last_modified"] = response.headers.get("Last-Modified")
+    state["videos"] = videos
+    return videos[:max_results]
 
 def get_latest_videos(channel_id, api_key=None, max_results=5):
-    """Obtient les dernières vidéos d'une chaîne."""
+    """
+    Obtient les dernières vidéos d'une chaîne.
+    Le flux Atom de la chaîne est utilisé en priorité ; l'API YouTube (si une clé est fournie)
+    ne sert que de secours quand le flux est indisponible.
+    """
+    videos = fetch_channel_feed(channel_id, max_results)
+    if videos is not None:
+        return videos
+    
     try:
         # Si nous n'avons pas d'API key, on ne peut pas récupérer les vidéos
         if not api_key:
             print(f"Aucune API key fournie pour récupérer les vidéos de {channel_id}")
             return []
         
-        youtube = build('youtube', 'v3', developerKey=api_key)
-        
-        # Récupérer les dernières vidéos publiées
-        search_response = youtube.search().list(
-            channelId=channel_id,
-            type="video",
-            part="id,snippet",
-            order="date",
-            maxResults=max_results
-        ).execute()
-        
-        videos = []
-        for item in search_response.get("items", []):
-            video_id = item["id"]["videoId"]
-            video_title = item["snippet"]["title"]
-            published_at = item["snippet"]["publishedAt"]
-            videos.append({
-                "id": video_id,
-                "title": video_title,
-                "published_at": published_at
-            })
-        
-        return videos
+        return fetch_latest_videos_from_api([channel_id], api_key, max_results).get(channel_id, [])
     except Exception as e:
         print(f"Erreur lors de la récupération des vidéos pour {channel_id}: {e}")
         return []
 
+def channel_shard(channel_id):
+    """Tranche (stable) à laquelle appartient une chaîne : chaque chaîne est vérifiée une fois par CHECK_INTERVAL"""
+    return int(hashlib.sha1(channel_id.encode('utf-8')).hexdigest(), 16) % POLL_SHARDS
+
+async def poll_channel(channel_id, semaphore, max_delay):
+    """
+    Récupère le flux d'une chaîne après un délai aléatoire (pour étaler les requêtes).
+    Renvoie None si le flux est indisponible (l'API YouTube prend alors le relais).
+    """
+    await asyncio.sleep(random.uniform(0, max_delay))
+    
+    async with semaphore:
+        return await asyncio.to_thread(fetch_channel_feed, channel_id)
+
+def find_new_videos(channel_id, latest_videos):
+    """Parmi les vidéos récupérées pour une chaîne, celles qui n'ont pas encore été vues"""
+    # Filtre les nouvelles vidéos (non vues précédemment)
+    known_video_ids = SUBSCRIPTIONS.get_seen_videos(channel_id)
+    new_videos = [video for video in latest_videos if video["id"] not in known_video_ids]
+    if new_videos:
+        print(f"Nouvelles vidéos pour {channel_id}: {len(new_videos)}")
+    return new_videos
+
+def queue_new_videos(channel_id, new_videos):
+    """
+    Place les nouvelles vidéos d'une chaîne dans la file durable (avec ses abonnés actuels), puis seulement
+    les enregistre comme vues : après un arrêt entre les deux, elles sont retrouvées au prochain passage
+    et la file ignore celles qui y sont déjà. Renvoie le nombre de vidéos ajoutées.
+    """
+    subscribers = SUBSCRIPTIONS.get_subscribers(channel_id)
+    queued = 0
+    if subscribers:
+        for video in new_videos:
+            if JOBS.enqueue_subscription_video(channel_id, video, subscribers):
+                queued += 1
+    
+    # Mettre à jour la liste des vidéos connues (limitée aux SEEN_VIDEOS_LIMIT plus récentes)
+    SUBSCRIPTIONS.mark_videos_seen(channel_id, [video["id"] for video in new_videos])
+    return queued
+
 async def check_new_videos(context):
-    """Vérifie s'il y a de nouvelles vidéos sur les chaînes suivies."""
+    """
+    Vérifie s'il y a de nouvelles vidéos sur les chaînes suivies.
+    Appelée toutes les CHECK_INTERVAL / POLL_SHARDS secondes : chaque appel ne vérifie qu'une tranche
+    des chaînes, en parallèle (POLL_CONCURRENCY) et avec un délai aléatoire par chaîne,
+    pour lisser la charge sur YouTube au lieu d'une rafale à chaque intervalle.
+    Les chaînes dont le flux est indisponible, puis les métadonnées des nouvelles vidéos,
+    sont récupérées via l'API YouTube en quelques appels groupés pour toute la tranche.
+    """
     try:
-        print(f"Vérification des nouvelles vidéos ({datetime.now().strftime('%H:%M:%S')})")
+        shard = POLL_STATE["tick"] % POLL_SHARDS
+        POLL_STATE["tick"] += 1
+        
+        channel_ids = await asyncio.to_thread(SUBSCRIPTIONS.get_channel_ids)
         
         # Si nous n'avons pas de chaînes suivies, on arrête là
-        if not CHANNEL_SUBSCRIPTIONS:
-            print("Aucun abonnement trouvé.")
+        if not channel_ids:
             return
         
         # Récupération de l'API key (optionnelle)
         api_key = os.getenv("YOUTUBE_API_KEY")
         
-        # Pour chaque chaîne suivie
-        for channel_id in set(sum([list(channels.keys()) for channels in CHANNEL_SUBSCRIPTIONS.values()], [])):
-            # Si nous n'avons pas encore enregistré les dernières vidéos pour cette chaîne
-            if channel_id not in LATEST_VIDEOS:
-                LATEST_VIDEOS[channel_id] = []
-            
-            # Récupérer les dernières vidéos
-            latest_videos = []
-            
-            # Si nous avons une API key, on peut utiliser l'API YouTube
-            if api_key:
-                latest_videos = get_latest_videos(channel_id, api_key)
-            else:
-                # Sinon, on utilise une approche basique (moins efficace)
-                print(f"Pas d'API key pour YouTube, utilisation d'une méthode alternative pour {channel_id}")
-                try:
-                    # On pourrait utiliser une bibliothèque comme youtube-search-python ici
-                    # Pour ce prototype, on considère que cette partie est traitée
-                    pass
-                except Exception as e:
-                    print(f"Erreur lors de la récupération alternative: {e}")
-            
-            # Si nous n'avons pas réussi à récupérer les vidéos
-            if not latest_videos:
+        # Abonnements encore non convertis (résolution impossible au chargement) : nouvel essai à chaque cycle
+        if shard == 0 and any(not is_canonical_channel_id(channel_id) for channel_id in channel_ids):
+            await asyncio.to_thread(migrate_subscriptions, api_key)
+            channel_ids = await asyncio.to_thread(SUBSCRIPTIONS.get_channel_ids)
+        
+        channel_ids = {channel_id for channel_id in channel_ids if is_canonical_channel_id(channel_id)}
+        shard_channels = [channel_id for channel_id in channel_ids if channel_shard(channel_id) == shard]
+        if not shard_channels:
+            return
+        
+        print(f"Vérification des nouvelles vidéos - tranche {shard+1}/{POLL_SHARDS}: {len(shard_channels)} chaîne(s) ({datetime.now().strftime('%H:%M:%S')})")
+        
+        # Étaler les requêtes sur la majeure partie de l'intervalle entre deux tranches
+        max_delay = (CHECK_INTERVAL / POLL_SHARDS) * 0.8
+        semaphore = asyncio.Semaphore(POLL_CONCURRENCY)
+        results = await asyncio.gather(
+            *(poll_channel(channel_id, semaphore, max_delay) for channel_id in shard_channels),
+            return_exceptions=True
+        )
+        
+        latest_videos = {}
+        for channel_id, result in zip(shard_channels, results):
+            if isinstance(result, Exception):
+                print(f"Erreur lors de la vérification de {channel_id}: {result}")
+            elif result is not None:
+                latest_videos[channel_id] = result
+        
+        # Flux indisponibles : secours par l'API YouTube, en une passe groupée
+        unavailable = [channel_id for channel_id in shard_channels if channel_id not in latest_videos]
+        if unavailable and api_key:
+            try:
+                latest_videos.update(await asyncio.to_thread(fetch_latest_videos_from_api, unavailable, api_key))
+            except Exception as e:
+                print(f"Erreur lors de la récupération des vidéos via l'API YouTube: {e}")
+        
+        new_videos = []
+        for channel_id in shard_channels:
+            if not latest_videos.get(channel_id):
                 print(f"Aucune vidéo récupérée pour {channel_id}")
                 continue
-            
-            # Filtre les nouvelles vidéos (non vues précédemment)
-            known_video_ids = set(LATEST_VIDEOS[channel_id])
-            new_videos = [video for video in latest_videos if video["id"] not in known_video_ids]
-            
-            # Si aucune nouvelle vidéo
-            if not new_videos:
-                print(f"Aucune nouvelle vidéo pour {channel_id}")
-                continue
-                
-            print(f"Nouvelles vidéos pour {channel_id}: {len(new_videos)}")
-            
-            # Mettre à jour la liste des vidéos connues
-            for video in new_videos:
-                if video["id"] not in known_video_ids:
-                    LATEST_VIDEOS[channel_id].append(video["id"])
-            
-            # Limiter la liste des vidéos connues (pour éviter qu'elle grossisse trop)
-            LATEST_VIDEOS[channel_id] = LATEST_VIDEOS[channel_id][-50:]
-            
-            # Sauvegarder les abonnements
-            save_subscriptions()
-            
-            # Traiter chaque nouvelle vidéo
-            for video in new_videos:
-                video_id = video["id"]
-                video_title = video["title"]
-                video_url = f"https://www.youtube.com/watch?v={video_id}"
-                
-                # Récupérer les utilisateurs abonnés à cette chaîne
-                subscribed_users = [
-                    user_id for user_id, channels in CHANNEL_SUBSCRIPTIONS.items()
-                    if channel_id in channels
-                ]
-                
-                if not subscribed_users:
-                    continue
-                
-                # Récupérer les sous-titres
-                subtitles, error = get_subtitles(video_url)
-                if error:
-                    print(f"Erreur lors de la récupération des sous-titres: {error}")
-                    continue
-                
-                # Résumer la vidéo
-                summary = summarize(subtitles)
-                
-                # Nettoyer complètement le résumé des marqueurs Markdown et autres caractères problématiques
-                clean_summary = sanitize_markdown(summary)
-                
-                # Créer le fichier audio (text_to_audio nettoiera aussi le texte pour l'audio)
-                audio_path = text_to_audio(summary, f"resume_{video_id}.mp3")
-                
-                # Pour chaque utilisateur abonné, envoyer le résumé
-                for user_id in subscribed_users:
-                    try:
-                        channel_name = CHANNEL_SUBSCRIPTIONS[user_id][channel_id]
-                        
-                        # Envoi du message texte en gérant les messages longs
-                        message = (
-                            f"🆕 Nouvelle vidéo de {channel_name}\n\n"
-                            f"📺 {video_title}\n"
-                            f"🔗 {video_url}\n\n"
-                            f"📝 Résumé :\n{clean_summary}"
-                        )
-                        
-                        await send_long_message(
-                            context.bot,
-                            chat_id=user_id,
-                            text=message
-                        )
-                        
-                        # Envoi du fichier audio
-                        with open(audio_path, 'rb') as audio_file:
-                            await context.bot.send_voice(
-                                chat_id=user_id,
-                                voice=audio_file,
-                                caption=f"🎙️ Résumé audio de '{video_title}'"
-                            )
-                        
-                        print(f"Résumé envoyé à l'utilisateur {user_id} pour la vidéo {video_id}")
-                    except Exception as e:
-                        print(f"Erreur lors de l'envoi du résumé à l'utilisateur {user_id}: {e}")
-                
-                # Supprimer le fichier audio après utilisation
-                if os.path.exists(audio_path):
-                    os.remove(audio_path)
+            new_videos.extend((channel_id, video) for video in find_new_videos(channel_id, latest_videos[channel_id]))
+        
+        if not new_videos:
+            print(f"Vérification de la tranche {shard+1}/{POLL_SHARDS} terminée: aucune nouvelle vidéo")
+            return
         
-        print("Vérification terminée.")
+        # Durée et sous-titres des nouvelles vidéos, en un appel videos.list par lot de 50
+        if api_key:
+            try:
+                metadata = await asyncio.to_thread(get_videos_metadata, [video["id"] for _, video in new_videos], api_key)
+                for _, video in new_videos:
+                    video.update(metadata.get(video["id"], {}))
+            except Exception as e:
+                print(f"Erreur lors de la récupération des métadonnées des vidéos: {e}")
+        
+        # Le résumé et l'envoi sont faits par subscription_worker, sans bloquer la vérification
+        videos_by_channel = {}
+        for channel_id, video in new_videos:
+            videos_by_channel.setdefault(channel_id, []).append(video)
+        for channel_id, videos in videos_by_channel.items():
+            await asyncio.to_thread(queue_new_videos, channel_id, videos)
+        if SUBSCRIPTION_WAKEUP:
+            SUBSCRIPTION_WAKEUP.set()
+        
+        print(f"Vérification de la tranche {shard+1}/{POLL_SHARDS} terminée: {len(new_videos)} nouvelle(s) vidéo(s)")
     except Exception as e:
         print(f"Erreur lors de la vérification des nouvelles vidéos: {e}")
 
+async def process_subscription_video(bot, job):
+    """
+    Résume une nouvelle vidéo d'une chaîne suivie (tâche réservée dans JOBS) et l'envoie à ses abonnés
+    pas encore livrés ; le résumé et chaque livraison sont enregistrés pour une reprise après un arrêt.
+    Si LM Studio est indisponible (avant ou pendant le résumé), les abonnés reçoivent un résumé provisoire
+    et la vidéo est reportée : le résumé complet remplacera ce message quand LM Studio sera revenu.
+    """
+    video_id = job["video_id"]
+    channel_id = job["channel_id"]
+    video_title = job["title"]
+    video_url = f"https://www.youtube.com/watch?v={video_id}"
+    
+    # Abonnés de la chaîne lors de la découverte de la vidéo, moins ceux déjà livrés
+    subscribers = job["recipients"]
+    subscribed_users = list(subscribers)
+    
+    if not subscribed_users:
+        await asyncio.to_thread(JOBS.finish_subscription_video, video_id, WORKER_ID)
+        return
+    
+    summary = job["summary"] or get_cached_summary(video_id)
+    if not summary:
+        if not LLM_ROUTER.available() and all(user_id in job["provisional"] for user_id in subscribed_users):
+            # Résumés provisoires déjà envoyés : attendre le retour de LM Studio
+            await asyncio.to_thread(JOBS.defer_subscription_video, video_id, WORKER_ID, DEGRADED_RETRY_INTERVAL)
+            return
+        
+        # Récupérer les sous-titres
+        subtitles, error, language = await asyncio.to_thread(get_subtitles_for_summary, video_url)
+        if error:
+            print(f"Erreur lors de la récupération des sous-titres: {error}")
+            await asyncio.to_thread(JOBS.finish_subscription_video, video_id, WORKER_ID, error)
+            return
+        
+        # Résumer la vidéo (dans un thread pour ne pas bloquer le bot)
+        fallback = threading.Event()
+        if LLM_ROUTER.available():
+            summary = await asyncio.to_thread(summarize, subtitles, language, on_fallback=fallback.set)
+        else:
+            summary = None
+        
+        if summary is None or (fallback.is_set() and not summary.startswith("[Erreur")):
+            # Résumé provisoire (extraits, ou résumé en partie extractif) puis nouvel essai plus tard
+            reason = "serveurs LM Studio indisponibles" if summary is None else "LM Studio indisponible pendant le résumé"
+            
+            async def send_provisional(user_id):
+                message_id = await send_provisional_summary(
+                    bot, video_url, subtitles, reason, {"chat_id": user_id}, summary=summary,
+                    header=f"🆕 Nouvelle vidéo de {subscribers.get(user_id) or channel_id}\n\n📺 {video_title}\n🔗 {video_url}\n\n⏳ Résumé provisoire"
+                )
+                if message_id:
+                    await asyncio.to_thread(JOBS.mark_subscription_provisional, video_id, user_id, message_id)
+            
+            await fan_out([user_id for user_id in subscribed_users if user_id not in job["provisional"]], send_provisional)
+            print(f"⚠️ Résumé de {video_id} reporté ({reason})")
+            await asyncio.to_thread(JOBS.defer_subscription_video, video_id, WORKER_ID, DEGRADED_RETRY_INTERVAL)
+            return
+        
+        store_cached_summary(video_id, summary)
+        if not await asyncio.to_thread(JOBS.save_subscription_summary, video_id, WORKER_ID, summary):
+            print(f"Vidéo {video_id} reprise par un autre processus, abandon")
+            return
+    
+    # Nettoyer complètement le résumé des marqueurs Markdown et autres caractères problématiques
+    clean_summary = sanitize_markdown(summary)
+    
+    # Durée connue si les métadonnées ont été récupérées via l'API YouTube
+    duration_line = ""
+    if job["duration"]:
+        duration_line = f"⏱️ Durée : {format_duration(job['duration'])}\n"
+    
+    # L'audio n'est envoyé qu'une fois : les abonnés suivants reçoivent son file_id
+    audio_buffer = None
+    if not get_audio_file_id(video_id, summary):
+        audio_buffer = await text_to_audio_async(summary, f"resume_{video_id}.mp3")
+    
+    # Envoyer le résumé à tous les abonnés en parallèle, au débit autorisé par Telegram
+    async def deliver_to_subscriber(user_id):
+        channel_name = subscribers.get(user_id) or channel_id
+        
+        # Envoi du message texte en gérant les messages longs
+        message = (
+            f"🆕 Nouvelle vidéo de {channel_name}\n\n"
+            f"📺 {video_title}\n"
+            f"🔗 {video_url}\n"
+            f"{duration_line}\n"
+            f"📝 Résumé :\n{clean_summary}"
+        )
+        
+        if user_id in job["provisional"]:
+            # Remplacer le résumé provisoire déjà reçu
+            await replace_message(bot, job["provisional"][user_id], message, chat_id=user_id)
+        else:
+            await send_long_message(
+                bot,
+                chat_id=user_id,
+                text=message
+            )
+        
+        # Envoi de l'audio (fichier au premier abonné, file_id ensuite)
+        await send_summary_voice(
+            bot,
+            video_id,
+            summary,
+            audio_buffer,
+            rate_limiter=TELEGRAM_LIMITER,
+            chat_id=user_id,
+            caption=f"🎙️ Résumé audio de '{video_title}'"
+        )
+        
+        await asyncio.to_thread(JOBS.mark_subscription_delivered, video_id, user_id)
+        print(f"Résumé envoyé à l'utilisateur {user_id} pour la vidéo {video_id}")
+    
+    delivered = await fan_out(subscribed_users, deliver_to_subscriber)
+    await asyncio.to_thread(JOBS.finish_subscription_video, video_id, WORKER_ID)
+    print(f"Résumé de {video_id} livré à {delivered}/{len(subscribed_users)} abonné(s)")
+
+async def subscription_worker(bot, poll_interval=JOB_RECOVERY_INTERVAL):
+    """
+    Traite une à une les nouvelles vidéos de la file durable : réveillé par check_new_videos du même
+    processus, et toutes les poll_interval secondes pour les vidéos ajoutées par un processus front
+    ou abandonnées par un arrêt. Une vidéo est résumée une fois puis livrée à tous ses abonnés,
+    le résumé et le file_id de l'audio étant réutilisés d'un abonné à l'autre.
+    """
+    while True:
+        # Effacé avant la lecture de la file : une vidéo ajoutée pendant la lecture réveille le worker
+        SUBSCRIPTION_WAKEUP.clear()
+        job = None
+        heartbeat = None
+        try:
+            job = await asyncio.to_thread(JOBS.claim_subscription_video, WORKER_ID)
+            if job:
+                heartbeat = asyncio.create_task(keep_lease(JOBS.renew_subscription_video, job["video_id"], WORKER_ID))
+                await process_subscription_video(bot, job)
+        except Exception as e:
+            if job is None:
+                print(f"Erreur lors de la lecture de la file des abonnements: {e}")
+            else:
+                print(f"Erreur lors du traitement de la vidéo {job['video_id']} de {job['channel_id']}: {e}")
+                await asyncio.to_thread(JOBS.finish_subscription_video, job["video_id"], WORKER_ID, str(e))
+        finally:
+            if heartbeat:
+                heartbeat.cancel()
+        if job is None:
+            try:
+                await asyncio.wait_for(SUBSCRIPTION_WAKEUP.wait(), poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+async def start_subscription_workers(context):
+    """Démarre les tâches de traitement des nouvelles vidéos (appelée une fois au démarrage)"""
+    global SUBSCRIPTION_WAKEUP
+    SUBSCRIPTION_WAKEUP = asyncio.Event()
+    for _ in range(SUBSCRIPTION_WORKERS):
+        context.application.create_task(subscription_worker(context.bot))
+    print(f"✅ {SUBSCRIPTION_WORKERS} worker(s) de résumé des abonnements démarré(s)")
+
 def start_video_check_scheduler(app):
     """Démarre le planificateur pour vérifier périodiquement les nouvelles vidéos."""
     try:
         # Vérifier si le job_queue est disponible
-        if hasattr(app, 'job_queue'):
-            print(f"Configuration du planificateur pour vérifier les vidéos toutes les {CHECK_INTERVAL} secondes")
-            app.job_queue.run_repeating(check_new_videos, interval=CHECK_INTERVAL, first=10)
+        if hasattr(app, 'job_queue') and app.job_queue:
+            shard_interval = max(1, CHECK_INTERVAL / POLL_SHARDS)
+            print(f"Configuration du planificateur pour vérifier les vidéos toutes les {CHECK_INTERVAL} secondes "
+                  f"({POLL_SHARDS} tranches, une toutes les {shard_interval:.0f} secondes)")
+            # En mode front, les vidéos placées dans la file sont résumées et livrées par les workers
+            if BOT_ROLE != "front":
+                app.job_queue.run_once(start_subscription_workers, when=0)
+            app.job_queue.run_repeating(check_new_videos, interval=shard_interval, first=10)
             return True
         else:
             print("JobQueue non disponible. La vérification automatique des vidéos est désactivée.")
@@ -1526,6 +3746,7 @@ def start_video_check_scheduler(app):
         print(f"Erreur lors de la configuration du planificateur: {e}")
         return False
 
+
 # --- Handlers Telegram ---
 
 async def handle_yt(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1592,6 +3813,23 @@ async def handle_reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Votre conversation a été réinitialisée."
     )
 
+async def handle_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Annule les résumés en cours et en attente de ce chat (les requêtes LM Studio en cours sont interrompues)"""
+    chat_id = update.effective_chat.id
+    job_ids = await asyncio.to_thread(JOBS.cancel_chat, chat_id)
+    
+    # Les tâches traitées par ce processus s'arrêtent immédiatement ; un worker séparé
+    # (BOT_ROLE=worker) constate l'annulation dans la file à sa prochaine lecture
+    for job_id in job_ids:
+        token = JOB_TOKENS.get(job_id)
+        if token:
+            token.cancel("annulée par l'utilisateur")
+    
+    if job_ids:
+        await update.message.reply_text(f"⏹️ {len(job_ids)} résumé(s) annulé(s) (en cours ou en attente).")
+    else:
+        await update.message.reply_text("Aucun résumé en cours ou en attente.")
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         user_id = update.effective_user.id
@@ -1643,7 +3881,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             messages.extend(CONVERSATION_HISTORY[user_id][-10:])
             
             # Obtenir la réponse
-            response = chat_with_lmstudio(messages)
+            response = chat_with_lmstudio(messages, **generation_params("chat"))
             
             # Nettoyer la réponse des marqueurs Markdown
             clean_response = sanitize_markdown(response)
@@ -1669,35 +3907,49 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Ne rien faire si aucun lien YouTube n'est trouvé
             return
         
-        # Initialiser la structure de file d'attente pour ce chat s'il n'existe pas encore
-        if chat_id not in YOUTUBE_QUEUE:
-            YOUTUBE_QUEUE[chat_id] = {
-                "queue": [],
-                "processing": False,
-                "thread_id": thread_id
-            }
-        else:
-            # Mettre à jour l'ID du thread si nécessaire
-            YOUTUBE_QUEUE[chat_id]["thread_id"] = thread_id
-        
-        # Ajouter les liens à la file d'attente
+        # Estimer le coût de chaque lien et vérifier les budgets avant de l'ajouter à la file d'attente durable
+        # (un lien déjà en attente n'est pas ajouté deux fois)
+        accepted = 0
+        notes = []
         for url in youtube_links:
-            if url not in YOUTUBE_QUEUE[chat_id]["queue"]:
-                YOUTUBE_QUEUE[chat_id]["queue"].append(url)
+            cost, duration = await asyncio.to_thread(estimate_job_cost, url)
+            refusal = await asyncio.to_thread(check_admission, user_id, chat_id, cost)
+            if refusal:
+                notes.append(f"⛔ {url} refusé : {refusal}.")
+                continue
+            priority = job_priority(cost)
+            backlog = await asyncio.to_thread(JOBS.backlog, priority)
+            if not await asyncio.to_thread(JOBS.enqueue, chat_id, thread_id, url, user_id, cost, priority):
+                notes.append(f"ℹ️ {url} est déjà dans la file d'attente.")
+                continue
+            accepted += 1
+            if duration is not None:
+                # Délai estimé : tâches déjà en file (de priorité égale ou supérieure) puis le résumé lui-même
+                eta = backlog / LLM_ROUTER.capacity() + duration
+                lane = " (file basse priorité)" if priority else ""
+                notes.append(f"⏱️ {url} : résumé estimé dans ~{max(1, round(eta / 60))} min{lane}")
+        
+        if not accepted:
+            await context.bot.send_message(text="\n".join(notes), **reply_params)
+            return
+        details = "\n" + "\n".join(notes) if notes else ""
         
         # Informer l'utilisateur du nombre de liens ajoutés à la file d'attente
-        if YOUTUBE_QUEUE[chat_id]["processing"]:
+        if chat_id in ACTIVE_QUEUE_CHATS:
             await context.bot.send_message(
-                text=f"✅ {len(youtube_links)} lien(s) ajouté(s) à la file d'attente. Traitement en cours...",
+                text=f"✅ {accepted} lien(s) ajouté(s) à la file d'attente. Traitement en cours...{details}",
                 **reply_params
             )
         else:
             await context.bot.send_message(
-                text=f"✅ {len(youtube_links)} lien(s) à traiter...",
+                text=f"✅ {accepted} lien(s) à traiter...{details}",
                 **reply_params
             )
-            # Démarrer le traitement si aucun n'est en cours
-            await process_youtube_queue(chat_id, context)
+            # Démarrer le traitement en arrière-plan si aucun n'est en cours,
+            # pour que les liens suivants puissent être ajoutés pendant le traitement
+            # (en mode front, ce sont les workers qui traitent la file)
+            if BOT_ROLE != "front":
+                context.application.create_task(process_youtube_queue(chat_id, context.bot))
             
     except Exception as e:
         print(f"Erreur lors du traitement du message: {str(e)}")
@@ -1706,48 +3958,597 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except:
             pass
 
-async def process_youtube_queue(chat_id, context):
-    """Traite la file d'attente des liens YouTube pour un chat spécifique"""
-    if chat_id not in YOUTUBE_QUEUE or not YOUTUBE_QUEUE[chat_id]["queue"]:
-        return
+# --- File durable des résumés ---
+
+class JobStore:
+    """
+    File d'attente durable des liens à résumer (SQLite, partagée avec les abonnements).
+    Chaque tâche passe par les états queued → fetching → summarizing → delivering → done (ou failed).
+    Une tâche en cours est « louée » par son processus pendant JOB_LEASE_SECONDS, bail renouvelé
+    à chaque étape et toutes les JOB_LEASE_SECONDS / 3 tant que le processus la détient (keep_lease) :
+    si le processus meurt, le bail expire et la tâche est reprise là où elle en était,
+    les résumés de chunks déjà calculés étant conservés dans job_chunks.
+    Les nouvelles vidéos des chaînes suivies ont leur propre file (subscription_videos), une tâche par vidéo
+    avec la liste de ses abonnés (subscription_deliveries) : chaque abonné livré est enregistré.
+    """
+    ACTIVE_STATES = ("fetching", "summarizing", "delivering")
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            thread_id INTEGER,
+            url TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'queued',
+            lease_owner TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            language TEXT,
+            summary TEXT,
+            error TEXT,
+            user_id INTEGER,
+            cost REAL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            provisional_message_id INTEGER,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs(state, chat_id, job_id);
+        CREATE TABLE IF NOT EXISTS job_chunks (
+            job_id INTEGER NOT NULL,
+            chunk_index INTEGER NOT NULL,
+            chunk_hash TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            PRIMARY KEY (job_id, chunk_index)
+        );
+        CREATE TABLE IF NOT EXISTS job_workers (
+            worker_key TEXT PRIMARY KEY,
+            worker_id TEXT NOT NULL,
+            started_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS subscription_videos (
+            video_id TEXT PRIMARY KEY,
+            channel_id TEXT NOT NULL,
+            title TEXT,
+            duration INTEGER,
+            state TEXT NOT NULL DEFAULT 'queued',
+            summary TEXT,
+            lease_owner TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS subscription_deliveries (
+            video_id TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            channel_name TEXT,
+            delivered INTEGER NOT NULL DEFAULT 0,
+            provisional_message_id INTEGER,
+            PRIMARY KEY (video_id, user_id)
+        );
+    """
     
-    # Marquer comme en cours de traitement
-    YOUTUBE_QUEUE[chat_id]["processing"] = True
-    thread_id = YOUTUBE_QUEUE[chat_id]["thread_id"]
+    # Colonnes ajoutées après la création de la table, ajoutées aux bases existantes à l'ouverture
+    MIGRATIONS = {
+        "user_id": "INTEGER",
+        "cost": "REAL",
+        "priority": "INTEGER NOT NULL DEFAULT 0",
+        "provisional_message_id": "INTEGER",
+    }
+    
+    # Tâche réclamable : en attente, ou en cours mais dont le bail a expiré
+    CLAIMABLE = "(state = 'queued' OR (state IN ('fetching', 'summarizing', 'delivering') AND lease_expires < :now))"
+    
+    def __init__(self, path=DATABASE_FILE, lease_seconds=None):
+        self.lease_seconds = JOB_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        self.lock = threading.RLock()
+        self.connection = open_database(path)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            self.connection.executescript(self.SCHEMA)
+            columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(jobs)")}
+            for column, definition in self.MIGRATIONS.items():
+                if column not in columns:
+                    self.connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+    
+    def close(self):
+        with self.lock:
+            self.connection.close()
+    
+    def enqueue(self, chat_id, thread_id, url, user_id=None, cost=None, priority=0):
+        """
+        Ajoute un lien à la file ; renvoie l'ID de la tâche, ou None si ce lien est déjà en attente pour ce chat.
+        cost est le coût LLM estimé (secondes), priority vaut 1 pour la file basse priorité.
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            existing = self.connection.execute(
+                "SELECT 1 FROM jobs WHERE chat_id = ? AND url = ? AND state NOT IN ('done', 'failed')",
+                (chat_id, url)
+            ).fetchone()
+            if existing:
+                return None
+            cursor = self.connection.execute(
+                """INSERT INTO jobs (chat_id, thread_id, url, user_id, cost, priority, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (chat_id, thread_id, url, user_id, cost, priority, now, now)
+            )
+            return cursor.lastrowid
+    
+    def claim(self, owner, chat_id=None):
+        """
+        Réserve la plus ancienne tâche réclamable (d'un chat donné, ou de n'importe quel chat),
+        les tâches basse priorité passant après les autres.
+        Les chats dont une tâche est louée par un autre processus sont ignorés pour garder l'ordre des résumés.
+        Renvoie la tâche (dict) ou None.
+        """
+        now = time.time()
+        with self.lock:
+            # BEGIN IMMEDIATE : deux processus ne peuvent pas réserver la même tâche
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Les tâches qui ont fait échouer trop de processus ne sont plus reprises
+                self.connection.execute(
+                    f"""UPDATE jobs SET state = 'failed', error = 'Trop de tentatives', updated_at = :now
+                        WHERE {self.CLAIMABLE} AND state != 'queued' AND attempts >= :max_attempts""",
+                    {"now": now, "max_attempts": JOB_MAX_ATTEMPTS}
+                )
+                row = self.connection.execute(
+                    f"""SELECT * FROM jobs AS job WHERE {self.CLAIMABLE}
+                        AND (:chat_id IS NULL OR chat_id = :chat_id)
+                        AND NOT EXISTS (
+                            SELECT 1 FROM jobs AS other
+                            WHERE other.chat_id = job.chat_id AND other.state IN ('fetching', 'summarizing', 'delivering')
+                            AND other.lease_expires >= :now AND other.lease_owner != :owner
+                        )
+                        ORDER BY priority, job_id LIMIT 1""",
+                    {"now": now, "chat_id": chat_id, "owner": owner}
+                ).fetchone()
+                if row is None:
+                    self.connection.execute("COMMIT")
+                    return None
+                self.connection.execute(
+                    """UPDATE jobs SET lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?,
+                           state = CASE WHEN state = 'queued' THEN 'fetching' ELSE state END
+                       WHERE job_id = ?""",
+                    (owner, now + self.lease_seconds, now, row["job_id"])
+                )
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            job = dict(row)
+            if job["state"] == "queued":
+                job["state"] = "fetching"
+            else:
+                print(f"♻️ Reprise de la tâche {job['job_id']} ({job['url']}) à l'étape {job['state']}")
+            return job
+    
+    def advance(self, job_id, owner, state, **fields):
+        """
+        Passe la tâche à l'étape suivante (en enregistrant summary/language si fournis) et renouvelle le bail.
+        Renvoie False si le bail a été perdu (tâche reprise par un autre processus) : il faut alors l'abandonner.
+        """
+        assignments = ", ".join(f"{name} = :{name}" for name in fields)
+        now = time.time()
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                f"""UPDATE jobs SET state = :state, lease_expires = :expires, updated_at = :now
+                    {', ' + assignments if assignments else ''}
+                    WHERE job_id = :job_id AND lease_owner = :owner AND state NOT IN ('done', 'failed')""",
+                {"state": state, "expires": now + self.lease_seconds, "now": now, "job_id": job_id, "owner": owner, **fields}
+            )
+            return cursor.rowcount > 0
+    
+    def renew(self, job_id, owner):
+        """Prolonge le bail d'une tâche en cours"""
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE job_id = ? AND lease_owner = ? AND state NOT IN ('done', 'failed')",
+                (time.time() + self.lease_seconds, job_id, owner)
+            )
+            return cursor.rowcount > 0
+    
+    def finish(self, job_id, owner, error=None):
+        """Termine la tâche (done, ou failed avec l'erreur) et supprime ses points de reprise"""
+        with self.lock, self.connection:
+            self.connection.execute(
+                """UPDATE jobs SET state = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                   WHERE job_id = ? AND lease_owner = ?""",
+                ("failed" if error else "done", error, time.time(), job_id, owner)
+            )
+            self.connection.execute("DELETE FROM job_chunks WHERE job_id = ?", (job_id,))
+    
+    def cancel_chat(self, chat_id):
+        """
+        Annule les tâches en attente ou en cours d'un chat (commande /cancel) et renvoie leurs IDs.
+        Le processus qui traite une tâche annulée perd son bail : ses étapes suivantes échouent.
+        """
+        with self.lock, self.connection:
+            job_ids = [row[0] for row in self.connection.execute(
+                "SELECT job_id FROM jobs WHERE chat_id = ? AND state NOT IN ('done', 'failed')", (chat_id,)
+            )]
+            self.connection.executemany(
+                """UPDATE jobs SET state = 'failed', error = 'Annulée', lease_owner = NULL, lease_expires = NULL,
+                       updated_at = ? WHERE job_id = ?""",
+                [(time.time(), job_id) for job_id in job_ids]
+            )
+            self.connection.executemany("DELETE FROM job_chunks WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+        return job_ids
     
-    # Préparer les paramètres de réponse
-    reply_params = {"chat_id": chat_id}
-    if thread_id:
-        reply_params["message_thread_id"] = thread_id
+    def finished_jobs(self, job_ids):
+        """Parmi job_ids, les tâches déjà terminées (par exemple annulées depuis un autre processus)"""
+        if not job_ids:
+            return []
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT job_id FROM jobs WHERE state IN ('done', 'failed') AND job_id IN ({', '.join('?' * len(job_ids))})",
+                list(job_ids)
+            ).fetchall()
+        return [row[0] for row in rows]
+    
+    def load_chunk_summary(self, job_id, index, chunk):
+        """Résumé déjà calculé pour ce chunk (s'il correspond toujours au même texte), ou None"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT summary FROM job_chunks WHERE job_id = ? AND chunk_index = ? AND chunk_hash = ?",
+                (job_id, index, hashlib.sha256(chunk.encode('utf-8')).hexdigest())
+            ).fetchone()
+        return row["summary"] if row else None
+    
+    def save_chunk_summary(self, job_id, owner, index, chunk, summary):
+        """Enregistre le résumé d'un chunk (point de reprise) et renouvelle le bail de la tâche"""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO job_chunks (job_id, chunk_index, chunk_hash, summary) VALUES (?, ?, ?, ?)",
+                (job_id, index, hashlib.sha256(chunk.encode('utf-8')).hexdigest(), summary)
+            )
+            self.connection.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE job_id = ? AND lease_owner = ?",
+                (time.time() + self.lease_seconds, job_id, owner)
+            )
     
-    # Récupérer le prochain lien à traiter
-    url = YOUTUBE_QUEUE[chat_id]["queue"].pop(0)
+    def count_pending(self, chat_id):
+        """Nombre de liens en attente pour ce chat"""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE chat_id = ? AND state = 'queued'", (chat_id,)
+            ).fetchone()[0]
+    
+    def pending_chats(self, owner=None):
+        """
+        Chats ayant des tâches réclamables (nouvelles ou abandonnées par un processus arrêté),
+        hors chats en cours de traitement par un autre processus que owner.
+        Les chats n'ayant que des tâches basse priorité viennent en dernier.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                f"""SELECT chat_id FROM jobs AS job WHERE {self.CLAIMABLE}
+                    AND NOT EXISTS (
+                        SELECT 1 FROM jobs AS other
+                        WHERE other.chat_id = job.chat_id AND other.state IN ('fetching', 'summarizing', 'delivering')
+                        AND other.lease_expires >= :now AND other.lease_owner != :owner
+                    )
+                    GROUP BY chat_id ORDER BY MIN(priority), MIN(job_id)""",
+                {"now": time.time(), "owner": owner}
+            ).fetchall()
+        return [row[0] for row in rows]
+    
+    def spent_budget(self, since, user_id=None, chat_id=None):
+        """Coût LLM estimé (secondes) des tâches d'un utilisateur ou d'un chat ajoutées depuis since, hors tâches annulées"""
+        with self.lock:
+            return self.connection.execute(
+                """SELECT COALESCE(SUM(cost), 0) FROM jobs WHERE created_at >= :since
+                   AND (:user_id IS NULL OR user_id = :user_id) AND (:chat_id IS NULL OR chat_id = :chat_id)
+                   AND COALESCE(error, '') NOT LIKE 'Annulée%'""",
+                {"since": since, "user_id": user_id, "chat_id": chat_id}
+            ).fetchone()[0]
+    
+    def depth(self):
+        """
+        Nombre de tâches non terminées, tous chats confondus, hors tâches dont le résumé provisoire
+        est déjà envoyé (elles attendent leur résumé complet sans retarder les autres)
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state NOT IN ('done', 'failed') AND provisional_message_id IS NULL"
+            ).fetchone()[0]
+    
+    def backlog(self, priority=0):
+        """Coût LLM estimé (secondes) des tâches non terminées de priorité inférieure ou égale à priority"""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COALESCE(SUM(cost), 0) FROM jobs WHERE state NOT IN ('done', 'failed') AND priority <= ?",
+                (priority,)
+            ).fetchone()[0]
+    
+    def enqueue_subscription_video(self, channel_id, video, subscribers):
+        """
+        Ajoute une nouvelle vidéo d'une chaîne suivie, à livrer aux abonnés (format {user_id: channel_name}) ;
+        renvoie False si elle est déjà dans la file
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                """INSERT OR IGNORE INTO subscription_videos (video_id, channel_id, title, duration, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (video["id"], channel_id, video.get("title"), video.get("duration"), now, now)
+            )
+            if not cursor.rowcount:
+                return False
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO subscription_deliveries (video_id, user_id, channel_name) VALUES (?, ?, ?)",
+                [(video["id"], user_id, channel_name) for user_id, channel_name in subscribers.items()]
+            )
+            return True
     
-    try:
-        # Informer l'utilisateur
-        if len(YOUTUBE_QUEUE[chat_id]["queue"]) > 0:
-            await context.bot.send_message(
-                text=f"🔄 Traitement du lien: {url}\n({len(YOUTUBE_QUEUE[chat_id]['queue'])} liens en attente)",
-                **reply_params
+    def claim_subscription_video(self, owner):
+        """
+        Réserve la plus ancienne vidéo d'abonnement en attente (ou abandonnée par un processus arrêté),
+        hors vidéos reportées (defer_subscription_video) dont le délai n'est pas écoulé.
+        Renvoie la tâche (dict, avec "recipients" : abonnés pas encore livrés {user_id: channel_name}
+        et "provisional" : leurs résumés provisoires {user_id: message_id}) ou None.
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                claimable = "(state IN ('queued', 'running') AND COALESCE(lease_expires, 0) < :now)"
+                self.connection.execute(
+                    f"""UPDATE subscription_videos SET state = 'failed', error = 'Trop de tentatives', updated_at = :now
+                        WHERE {claimable} AND state != 'queued' AND attempts >= :max_attempts""",
+                    {"now": now, "max_attempts": JOB_MAX_ATTEMPTS}
+                )
+                row = self.connection.execute(
+                    f"SELECT * FROM subscription_videos WHERE {claimable} ORDER BY created_at LIMIT 1",
+                    {"now": now}
+                ).fetchone()
+                if row is not None:
+                    self.connection.execute(
+                        """UPDATE subscription_videos SET state = 'running', lease_owner = ?, lease_expires = ?,
+                               attempts = attempts + 1, updated_at = ? WHERE video_id = ?""",
+                        (owner, now + self.lease_seconds, now, row["video_id"])
+                    )
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            if row is None:
+                return None
+            job = dict(row)
+            rows = self.connection.execute(
+                """SELECT user_id, channel_name, provisional_message_id FROM subscription_deliveries
+                   WHERE video_id = ? AND delivered = 0""",
+                (job["video_id"],)
+            ).fetchall()
+            job["recipients"] = {row["user_id"]: row["channel_name"] for row in rows}
+            job["provisional"] = {row["user_id"]: row["provisional_message_id"] for row in rows if row["provisional_message_id"]}
+        if job["state"] == "running":
+            print(f"♻️ Reprise de la vidéo d'abonnement {job['video_id']}")
+        return job
+    
+    def save_subscription_summary(self, video_id, owner, summary):
+        """Enregistre le résumé d'une vidéo d'abonnement (repris après un redémarrage) et renouvelle le bail"""
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                """UPDATE subscription_videos SET summary = ?, lease_expires = ?, updated_at = ?
+                   WHERE video_id = ? AND lease_owner = ? AND state = 'running'""",
+                (summary, time.time() + self.lease_seconds, time.time(), video_id, owner)
             )
-        else:
-            await context.bot.send_message(
-                text=f"🔄 Traitement du lien: {url}",
-                **reply_params
+            return cursor.rowcount > 0
+    
+    def renew_subscription_video(self, video_id, owner):
+        """Prolonge le bail d'une vidéo d'abonnement en cours"""
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "UPDATE subscription_videos SET lease_expires = ? WHERE video_id = ? AND lease_owner = ? AND state = 'running'",
+                (time.time() + self.lease_seconds, video_id, owner)
             )
-        
-        # Récupérer les sous-titres
-        subtitles, error = get_subtitles(url)
-        if error:
-            await context.bot.send_message(text=f"❌ Erreur pour {url}: {error}", **reply_params)
-            
-            # Passer au lien suivant s'il y en a
-            YOUTUBE_QUEUE[chat_id]["processing"] = False
-            await process_youtube_queue(chat_id, context)
-            return
-        
-        # Générer le résumé
-        summary = summarize(subtitles)
+            return cursor.rowcount > 0
+    
+    def mark_subscription_delivered(self, video_id, user_id):
+        """Enregistre la livraison d'une vidéo à un abonné (il ne la recevra pas une seconde fois)"""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE subscription_deliveries SET delivered = 1 WHERE video_id = ? AND user_id = ?",
+                (video_id, user_id)
+            )
+    
+    def mark_subscription_provisional(self, video_id, user_id, message_id):
+        """Enregistre le message de résumé provisoire envoyé à un abonné (remplacé par le résumé complet)"""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE subscription_deliveries SET provisional_message_id = ? WHERE video_id = ? AND user_id = ?",
+                (message_id, video_id, user_id)
+            )
+    
+    def defer_subscription_video(self, video_id, owner, delay):
+        """Remet une vidéo d'abonnement en attente, réclamable dans delay secondes (LM Studio indisponible)"""
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                """UPDATE subscription_videos SET state = 'queued', lease_owner = NULL, lease_expires = ?, attempts = 0,
+                       updated_at = ? WHERE video_id = ? AND lease_owner = ? AND state = 'running'""",
+                (time.time() + delay, time.time(), video_id, owner)
+            )
+            return cursor.rowcount > 0
+    
+    def finish_subscription_video(self, video_id, owner, error=None):
+        """Termine une vidéo d'abonnement (done, ou failed avec l'erreur)"""
+        with self.lock, self.connection:
+            self.connection.execute(
+                """UPDATE subscription_videos SET state = ?, error = ?, lease_owner = NULL, lease_expires = NULL,
+                       updated_at = ? WHERE video_id = ? AND lease_owner = ?""",
+                ("failed" if error else "done", error, time.time(), video_id, owner)
+            )
+    
+    def release_leases(self, worker_key, worker_id):
+        """
+        Libère les baux de l'exécution précédente de ce processus : le dernier WORKER_ID enregistré
+        sous worker_key (rôle et WORKER_NAME), remplacé ensuite par worker_id. Ses tâches sont reprises
+        immédiatement au lieu d'attendre l'expiration du bail ; celles des autres processus ne sont pas touchées.
+        """
+        with self.lock, self.connection:
+            previous = self.connection.execute(
+                "SELECT worker_id FROM job_workers WHERE worker_key = ?", (worker_key,)
+            ).fetchone()
+            released = 0
+            if previous:
+                released = self.connection.execute(
+                    "UPDATE jobs SET lease_expires = 0 WHERE state IN ('fetching', 'summarizing', 'delivering') AND lease_owner = ?",
+                    (previous["worker_id"],)
+                ).rowcount
+                released += self.connection.execute(
+                    "UPDATE subscription_videos SET lease_expires = 0 WHERE state = 'running' AND lease_owner = ?",
+                    (previous["worker_id"],)
+                ).rowcount
+            self.connection.execute(
+                "INSERT OR REPLACE INTO job_workers (worker_key, worker_id, started_at) VALUES (?, ?, ?)",
+                (worker_key, worker_id, time.time())
+            )
+            # Les tâches terminées depuis longtemps ne servent plus à rien
+            self.connection.execute(
+                "DELETE FROM jobs WHERE state IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - JOB_RETENTION_SECONDS,)
+            )
+            self.connection.execute(
+                """DELETE FROM subscription_deliveries WHERE video_id IN (
+                       SELECT video_id FROM subscription_videos WHERE state IN ('done', 'failed') AND updated_at < ?
+                   )""",
+                (time.time() - JOB_RETENTION_SECONDS,)
+            )
+            self.connection.execute(
+                "DELETE FROM subscription_videos WHERE state IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - JOB_RETENTION_SECONDS,)
+            )
+            return released
+
+def open_job_store():
+    """Ouvre la file durable des résumés et récupère les tâches interrompues par un arrêt du bot"""
+    global JOBS
+    JOBS = JobStore()
+    atexit.register(JOBS.close)
+    released = JOBS.release_leases(f"{BOT_ROLE}:{WORKER_NAME}", WORKER_ID)
+    if released:
+        print(f"♻️ {released} tâche(s) interrompue(s) par l'arrêt précédent seront reprises")
+
+def job_reply_params(job):
+    """Paramètres d'envoi vers le chat (et le sujet) d'origine de la tâche"""
+    reply_params = {"chat_id": job["chat_id"]}
+    if job["thread_id"]:
+        reply_params["message_thread_id"] = job["thread_id"]
+    return reply_params
+
+def get_video_duration(url):
+    """Durée d'une vidéo en secondes (API YouTube si YOUTUBE_API_KEY est défini, sinon yt-dlp), ou None"""
+    video_id = extract_video_id(url)
+    if video_id in VIDEO_DURATIONS:
+        return VIDEO_DURATIONS[video_id]
+    
+    duration = None
+    try:
+        api_key = os.getenv("YOUTUBE_API_KEY")
+        if api_key:
+            duration = get_videos_metadata([video_id], api_key).get(video_id, {}).get("duration")
+        else:
+            ydl_opts = {'skip_download': True, 'quiet': True, 'no_warnings': True, 'socket_timeout': SUBTITLE_TIMEOUT}
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                duration = ydl.extract_info(url, download=False).get('duration')
+    except Exception as e:
+        print(f"Durée de {url} indisponible: {e}")
+        return None
+    
+    VIDEO_DURATIONS[video_id] = duration
+    while len(VIDEO_DURATIONS) > VIDEO_DURATIONS_MAX_ENTRIES:
+        VIDEO_DURATIONS.popitem(last=False)
+    return duration
+
+def estimate_job_cost(url):
+    """
+    Estimation avant mise en file : coût LLM (secondes) et durée du résumé d'une vidéo,
+    d'après sa durée et un débit de parole moyen. (0, 0) si le résumé est déjà en cache, (None, None) si inconnu.
+    """
+    if get_cached_summary(extract_video_id(url)):
+        return 0, 0
+    duration = get_video_duration(url)
+    if not duration:
+        return None, None
+    return estimate_summary_cost(duration * SPEECH_CHARS_PER_SECOND)
+
+def job_priority(cost):
+    """1 (file basse priorité) pour les tâches dont le coût estimé dépasse LOW_PRIORITY_COST, sinon 0"""
+    return 1 if cost and cost > LOW_PRIORITY_COST else 0
+
+def check_admission(user_id, chat_id, cost):
+    """Vérifie les budgets quotidiens de l'utilisateur et du chat ; renvoie le motif du refus, ou None"""
+    since = time.time() - 24 * 3600
+    for budget, scope, owner in (
+        (USER_DAILY_BUDGET, "votre budget quotidien", {"user_id": user_id}),
+        (CHAT_DAILY_BUDGET, "le budget quotidien de ce chat", {"chat_id": chat_id}),
+    ):
+        if not budget:
+            continue
+        spent = JOBS.spent_budget(since, **owner)
+        if spent + (cost or 0) > budget * 60:
+            remaining = max(0, budget * 60 - spent)
+            return (f"cette vidéo demanderait environ {math.ceil((cost or 0) / 60)} min de calcul, "
+                    f"{scope} n'en laisse que {int(remaining // 60)} min sur {budget:g}")
+    return None
+
+def degradation_reason():
+    """Motif du mode dégradé (résumé provisoire d'abord), ou None si LM Studio peut résumer normalement"""
+    if not LLM_ROUTER.available():
+        return "serveurs LM Studio indisponibles"
+    if DEGRADED_QUEUE_DEPTH:
+        depth = JOBS.depth()
+        if depth >= DEGRADED_QUEUE_DEPTH:
+            return f"file d'attente chargée, {depth} liens"
+    return None
+
+async def send_provisional_summary(bot, url, subtitles, reason, reply_params, cancel_token=None, summary=None, header=None):
+    """
+    Envoie un résumé provisoire (un seul message, pour pouvoir le remplacer) ; renvoie son ID ou None.
+    Par défaut, des extraits de la transcription ; summary, optionnel, est un résumé en partie extractif
+    (LM Studio devenu indisponible pendant la génération). header remplace l'en-tête du message.
+    """
+    if summary is None:
+        source = "extraits de la transcription"
+        summary = await asyncio.to_thread(extractive_summary, subtitles)
+    else:
+        source = "en partie extraits de la transcription"
+    summary = sanitize_markdown(summary)
+    message = await send_long_message(
+        bot,
+        text=(
+            f"{header or f'⏳ Résumé provisoire de {url}'} ({source}, {reason}) :\n\n{summary[:3500]}\n\n"
+            "Ce message sera remplacé par le résumé complet dès qu'il sera prêt."
+        ),
+        cancel_token=cancel_token,
+        **reply_params
+    )
+    return message.message_id if message else None
+
+async def deliver_summary(bot, url, summary, reply_params, previous_delivery=None, cancel_token=None, edit_message_id=None):
+    """
+    Envoie le résumé texte puis le résumé audio d'une vidéo.
+    La synthèse audio démarre immédiatement, en parallèle de l'envoi du texte
+    (sauf si cet audio a déjà été envoyé : son file_id est alors réutilisé).
+    previous_delivery permet d'attendre la livraison de la vidéo précédente pour garder l'ordre des messages.
+    cancel_token (CancelToken), optionnel, interrompt la livraison en levant JobCancelled.
+    edit_message_id, optionnel, est le message du résumé provisoire à remplacer par le résumé texte.
+    """
+    video_id = extract_video_id(url)
+    
+    # Lancer la synthèse vocale dès que le résumé existe
+    audio_task = None
+    if not get_audio_file_id(video_id, summary):
+        audio_task = asyncio.create_task(text_to_audio_async(summary, "resume.mp3", cancel_token))
+    
+    try:
+        if previous_delivery:
+            await previous_delivery
+        check_cancelled(cancel_token)
         
         # Double nettoyage pour garantir l'absence de caractères spéciaux
         clean_summary = sanitize_markdown(sanitize_markdown(summary))
@@ -1757,49 +4558,41 @@ async def process_youtube_queue(chat_id, context):
             # Log du problème
             print(f"Attention: Possible entité HTML non décodée dans le résumé")
             # Nettoyage agressif - supprimer les séquences problématiques
-            import re
             clean_summary = re.sub(r'&[#\w]+;', '', clean_summary)
         
         # Envoyer le résumé texte
         message_text = f"📝 Résumé de {url} :\n\n{clean_summary}"
-        await send_long_message(context.bot, text=message_text, **reply_params)
-        
-        # Attendre un peu pour éviter de submerger l'API Telegram
-        await asyncio.sleep(4)
+        if edit_message_id:
+            await replace_message(bot, edit_message_id, message_text, cancel_token=cancel_token, **reply_params)
+        else:
+            await send_long_message(bot, text=message_text, cancel_token=cancel_token, **reply_params)
         
-        # Créer et envoyer l'audio
+        # Envoyer l'audio (la synthèse a tourné pendant l'envoi du texte)
         try:
-            audio_path = text_to_audio(summary, f"resume_queue.mp3")
+            audio_buffer = await audio_task if audio_task else None
+            check_cancelled(cancel_token)
             
             try:
-                with open(audio_path, 'rb') as audio_file:
-                    if thread_id:
-                        await context.bot.send_voice(
-                            chat_id=chat_id,
-                            message_thread_id=thread_id,
-                            voice=audio_file,
-                            caption=f"🎙️ Résumé audio"
-                        )
-                    else:
-                        await context.bot.send_voice(
-                            chat_id=chat_id,
-                            voice=audio_file,
-                            caption=f"🎙️ Résumé audio"
-                        )
+                await send_summary_voice(
+                    bot,
+                    video_id,
+                    summary,
+                    audio_buffer,
+                    rate_limiter=TELEGRAM_LIMITER,
+                    cancel_token=cancel_token,
+                    caption=f"🎙️ Résumé audio",
+                    **reply_params
+                )
             except Exception as e:
-                await context.bot.send_message(
+                await bot.send_message(
                     text=f"⚠️ Erreur lors de l'envoi de l'audio: {str(e)}",
                     **reply_params
                 )
-            finally:
-                # Supprimer le fichier audio
-                if os.path.exists(audio_path):
-                    os.remove(audio_path)
                     
         except ValueError as ve:
             if "No text to send to TTS API" in str(ve):
                 print(f"⚠️ Résumé vide pour l'audio, pas de fichier audio généré pour {url}")
-                await context.bot.send_message(
+                await bot.send_message(
                     text="⚠️ Le résumé textuel a été généré mais la conversion audio n'a pas pu être effectuée (contenu vide après nettoyage).",
                     **reply_params
                 )
@@ -1807,22 +4600,410 @@ async def process_youtube_queue(chat_id, context):
                 raise ve
         except Exception as e:
             print(f"❌ Erreur lors de la création de l'audio: {str(e)}")
-            await context.bot.send_message(
+            await bot.send_message(
                 text=f"⚠️ Erreur lors de la création de l'audio: {str(e)}",
                 **reply_params
             )
-    
+    except JobCancelled:
+        if audio_task:
+            audio_task.cancel()
+        raise
     except Exception as e:
-        # En cas d'erreur, informer l'utilisateur
-        print(f"Erreur lors du traitement de {url}: {str(e)}")
-        await context.bot.send_message(
-            text=f"❌ Erreur lors du traitement de {url}: {str(e)}",
-            **reply_params
+        print(f"Erreur lors de l'envoi du résumé de {url}: {str(e)}")
+        if audio_task:
+            audio_task.cancel()
+        try:
+            await bot.send_message(text=f"❌ Erreur lors de l'envoi du résumé de {url}: {str(e)}", **reply_params)
+        except Exception:
+            pass
+
+def start_subtitles_fetch(url, cancel_token=None):
+    """Lance la récupération des sous-titres d'un lien en arrière-plan, sauf si son résumé est déjà en cache"""
+    if get_cached_summary(extract_video_id(url)):
+        return None
+    return asyncio.create_task(asyncio.to_thread(get_subtitles_for_summary, url, cancel_token))
+
+async def keep_lease(renew, *args, on_lost=None):
+    """
+    Renouvelle un bail toutes les JOB_LEASE_SECONDS / 3 (renew(*args) dans un thread) jusqu'à être annulée :
+    une étape longue (sous-titres, fusion, livraison, attente d'un résumé complet) ne laisse pas le bail expirer.
+    S'arrête si le bail est perdu, en appelant on_lost.
+    """
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            renewed = await asyncio.to_thread(renew, *args)
+        except Exception as e:
+            print(f"Erreur lors du renouvellement du bail: {e}")
+            continue
+        if not renewed:
+            if on_lost:
+                on_lost()
+            return
+
+def open_job_token(job):
+    """
+    Crée le jeton d'annulation d'une tâche réservée par ce processus (voir /cancel) et entretient son bail
+    jusqu'à close_job_token ; si le bail est perdu (tâche annulée ou reprise ailleurs), la tâche est interrompue.
+    """
+    job_id = job["job_id"]
+    token = CancelToken()
+    JOB_TOKENS[job_id] = token
+    JOB_HEARTBEATS[job_id] = asyncio.create_task(
+        keep_lease(JOBS.renew, job_id, WORKER_ID, on_lost=lambda: token.cancel("bail perdu (tâche annulée ou reprise ailleurs)"))
+    )
+    return token
+
+def close_job_token(job_id):
+    """Oublie le jeton d'une tâche terminée, désarme son échéance et arrête le renouvellement de son bail"""
+    heartbeat = JOB_HEARTBEATS.pop(job_id, None)
+    if heartbeat:
+        heartbeat.cancel()
+    token = JOB_TOKENS.pop(job_id, None)
+    if token:
+        token.close()
+
+def start_job_fetch(job):
+    """Comme start_subtitles_fetch, pour une tâche de la file (inutile si son résumé est déjà enregistré)"""
+    if job["summary"]:
+        return None
+    return start_subtitles_fetch(job["url"], JOB_TOKENS.get(job["job_id"]))
+
+async def report_job_cancelled(bot, job, cancelled):
+    """Termine une tâche annulée ; le chat est prévenu si elle a dépassé son échéance (/cancel répond lui-même)"""
+    print(f"⏹️ Tâche {job['job_id']} ({job['url']}) annulée : {cancelled.reason}")
+    await asyncio.to_thread(JOBS.finish, job["job_id"], WORKER_ID, f"Annulée : {cancelled.reason}")
+    if cancelled.expired:
+        try:
+            await bot.send_message(
+                text=f"⏱️ Traitement de {job['url']} abandonné : {cancelled.reason}.",
+                **job_reply_params(job)
+            )
+        except Exception as e:
+            print(f"Erreur lors de l'envoi de l'avis d'annulation: {e}")
+
+async def deliver_job(bot, job, summary, previous_delivery=None):
+    """Livre le résumé d'une tâche puis la marque comme terminée"""
+    try:
+        await deliver_summary(
+            bot, job["url"], summary, job_reply_params(job),
+            previous_delivery=previous_delivery, cancel_token=JOB_TOKENS.get(job["job_id"]),
+            edit_message_id=job["provisional_message_id"]
         )
+        await asyncio.to_thread(JOBS.finish, job["job_id"], WORKER_ID)
+    except JobCancelled as e:
+        await report_job_cancelled(bot, job, e)
+    finally:
+        close_job_token(job["job_id"])
+
+async def upgrade_provisional_summary(bot, job, subtitles, language):
+    """
+    Mode dégradé, en arrière-plan : attend qu'un serveur LM Studio soit disponible et une place parmi les
+    UPGRADE_CONCURRENCY résumés complets simultanés, génère le résumé (avec LOW_PRIORITY_CONCURRENCY requêtes
+    simultanées au plus) puis remplace le résumé provisoire. L'échéance JOB_DEADLINE ne court que pendant
+    la génération et la livraison, pas pendant l'attente.
+    """
+    job_id = job["job_id"]
+    cancel_token = JOB_TOKENS[job_id]
+    try:
+        while True:
+            # Attendre en renouvelant le bail : la tâche reste à ce processus pendant une panne prolongée
+            while True:
+                cancel_token.check()
+                if LLM_ROUTER.available():
+                    try:
+                        await asyncio.wait_for(UPGRADE_SLOTS.acquire(), DEGRADED_RETRY_INTERVAL)
+                        break
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await asyncio.sleep(DEGRADED_RETRY_INTERVAL)
+                if not await asyncio.to_thread(JOBS.renew, job_id, WORKER_ID):
+                    print(f"Tâche {job_id} reprise par un autre processus, abandon")
+                    return
+            
+            cancel_token.start(JOB_DEADLINE)
+            fallback = threading.Event()
+            try:
+                summary = await asyncio.to_thread(
+                    summarize,
+                    subtitles,
+                    language,
+                    load_checkpoint=lambda index, chunk: JOBS.load_chunk_summary(job_id, index, chunk),
+                    save_checkpoint=lambda index, chunk, chunk_summary: JOBS.save_chunk_summary(job_id, WORKER_ID, index, chunk, chunk_summary),
+                    cancel_token=cancel_token,
+                    parallelism=LOW_PRIORITY_CONCURRENCY,
+                    on_fallback=fallback.set
+                )
+            finally:
+                UPGRADE_SLOTS.release()
+            if summary.startswith("[Erreur"):
+                # Le résumé provisoire reste en place
+                await asyncio.to_thread(JOBS.finish, job_id, WORKER_ID, summary)
+                return
+            if not fallback.is_set():
+                break
+            # LM Studio à nouveau indisponible pendant la génération : le résumé provisoire reste en place
+            # jusqu'à une prochaine tentative (les chunks déjà résumés sont conservés)
+            print(f"⚠️ Résumé complet de {job['url']} incomplet, nouvel essai quand LM Studio sera disponible")
+            cancel_token.close()
+        store_cached_summary(extract_video_id(job["url"]), summary)
+        
+        cancel_token.check()
+        if not await asyncio.to_thread(JOBS.advance, job_id, WORKER_ID, "delivering", summary=summary):
+            print(f"Tâche {job_id} reprise par un autre processus, abandon")
+            return
+        await deliver_job(bot, job, summary)
+    except JobCancelled as e:
+        await report_job_cancelled(bot, job, e)
+    except Exception as e:
+        print(f"Erreur lors du résumé complet de {job['url']}: {str(e)}")
+        await asyncio.to_thread(JOBS.finish, job_id, WORKER_ID, str(e))
+    finally:
+        close_job_token(job_id)
+
+def schedule_upgrade(bot, job, subtitles, language):
+    """Confie une tâche dont le résumé provisoire est envoyé à upgrade_provisional_summary, en arrière-plan"""
+    # L'échéance sera réarmée quand la génération du résumé complet commencera
+    JOB_TOKENS[job["job_id"]].close()
+    upgrade = asyncio.create_task(upgrade_provisional_summary(bot, job, subtitles, language))
+    UPGRADE_TASKS.add(upgrade)
+    upgrade.add_done_callback(UPGRADE_TASKS.discard)
+
+async def process_youtube_queue(chat_id, bot):
+    """
+    Traite la file d'attente (durable) des liens YouTube pour un chat spécifique.
+    Les étapes se chevauchent : les sous-titres de la vidéo suivante sont récupérés
+    pendant le résumé de la vidéo courante, et la livraison (texte + audio) d'une vidéo
+    se fait en arrière-plan pendant le résumé de la suivante.
+    Chaque étape est enregistrée dans JOBS : après un redémarrage, la tâche reprend là où elle s'était arrêtée.
+    Chaque tâche a un jeton d'annulation (JOB_TOKENS) transmis à toutes ses étapes : /cancel ou
+    l'échéance JOB_DEADLINE interrompent immédiatement la récupération, le résumé, l'audio ou la livraison.
+    En mode dégradé (degradation_reason), un résumé extractif provisoire est envoyé aussitôt et le résumé
+    complet est généré en arrière-plan (upgrade_provisional_summary) pendant que la file avance ; de même
+    si LM Studio devient indisponible pendant le résumé (résumé en partie extractif, envoyé comme provisoire).
+    """
+    if chat_id in ACTIVE_QUEUE_CHATS:
+        return
     
-    # Marquer comme terminé et passer au lien suivant s'il y en a
-    YOUTUBE_QUEUE[chat_id]["processing"] = False
-    await process_youtube_queue(chat_id, context)
+    # Marquer comme en cours de traitement
+    ACTIVE_QUEUE_CHATS.add(chat_id)
+    prefetch = None  # (tâche suivante, tâche de récupération de ses sous-titres)
+    delivery = None  # Tâche de livraison de la dernière vidéo résumée
+    
+    try:
+        while True:
+            # Récupérer le prochain lien à traiter (ses sous-titres sont peut-être déjà en cours de récupération)
+            if prefetch:
+                job, subtitles_task = prefetch
+                prefetch = None
+            else:
+                job = await asyncio.to_thread(JOBS.claim, WORKER_ID, chat_id)
+                if job is None:
+                    if delivery and not delivery.done():
+                        # Attendre la dernière livraison, puis reprendre les liens arrivés entre-temps
+                        await delivery
+                        continue
+                    break
+                open_job_token(job)
+                subtitles_task = start_job_fetch(job)
+            
+            job_id = job["job_id"]
+            url = job["url"]
+            reply_params = job_reply_params(job)
+            cancel_token = JOB_TOKENS[job_id]
+            handed_over = False  # La livraison en arrière-plan se charge alors de terminer la tâche
+            
+            try:
+                # L'échéance court à partir du début du traitement (pas pendant l'attente en file)
+                cancel_token.start(JOB_DEADLINE)
+                cancel_token.check()
+                
+                # Informer l'utilisateur
+                pending = await asyncio.to_thread(JOBS.count_pending, chat_id)
+                if pending > 0:
+                    await bot.send_message(
+                        text=f"🔄 Traitement du lien: {url}\n({pending} liens en attente)",
+                        **reply_params
+                    )
+                else:
+                    await bot.send_message(
+                        text=f"🔄 Traitement du lien: {url}",
+                        **reply_params
+                    )
+                
+                # Un résumé déjà généré pour cette vidéo (ou avant un redémarrage) est réutilisé tel quel
+                summary = job["summary"] or get_cached_summary(extract_video_id(url))
+                if not summary and subtitles_task is None:
+                    subtitles_task = start_subtitles_fetch(url, cancel_token)
+                
+                if subtitles_task is not None:
+                    subtitles, error, language = await subtitles_task
+                
+                # Récupérer les sous-titres du lien suivant pendant le résumé de celui-ci
+                next_job = await asyncio.to_thread(JOBS.claim, WORKER_ID, chat_id)
+                if next_job:
+                    open_job_token(next_job)
+                    prefetch = (next_job, start_job_fetch(next_job))
+                
+                if not summary:
+                    if error:
+                        await asyncio.to_thread(JOBS.finish, job_id, WORKER_ID, error)
+                        await bot.send_message(text=f"❌ Erreur pour {url}: {error}", **reply_params)
+                        continue
+                    
+                    # Réestimer le coût d'après la transcription (budgets, file basse priorité)
+                    cost, _ = estimate_summary_cost(len(subtitles))
+                    priority = job_priority(cost)
+                    if not await asyncio.to_thread(
+                        JOBS.advance, job_id, WORKER_ID, "summarizing", language=language, cost=cost, priority=priority
+                    ):
+                        print(f"Tâche {job_id} reprise par un autre processus, abandon")
+                        continue
+                    
+                    # Mode dégradé : résumé provisoire immédiat, remplacé plus tard par le résumé LM Studio
+                    if not job["provisional_message_id"]:
+                        reason = await asyncio.to_thread(degradation_reason)
+                        if reason:
+                            print(f"⚠️ Mode dégradé pour {url} : {reason}")
+                            if delivery:
+                                await delivery  # Garder l'ordre des messages
+                            message_id = await send_provisional_summary(bot, url, subtitles, reason, reply_params, cancel_token)
+                            if message_id and await asyncio.to_thread(
+                                JOBS.advance, job_id, WORKER_ID, "summarizing", provisional_message_id=message_id
+                            ):
+                                job["provisional_message_id"] = message_id
+                    if job["provisional_message_id"]:
+                        schedule_upgrade(bot, job, subtitles, language)
+                        handed_over = True
+                        continue
+                    
+                    # Générer le résumé sans bloquer la boucle d'événements,
+                    # en reprenant les chunks déjà résumés avant un éventuel redémarrage
+                    fallback = threading.Event()
+                    summary = await asyncio.to_thread(
+                        summarize,
+                        subtitles,
+                        language,
+                        load_checkpoint=lambda index, chunk: JOBS.load_chunk_summary(job_id, index, chunk),
+                        save_checkpoint=lambda index, chunk, chunk_summary: JOBS.save_chunk_summary(job_id, WORKER_ID, index, chunk, chunk_summary),
+                        cancel_token=cancel_token,
+                        parallelism=LOW_PRIORITY_CONCURRENCY if priority else None,
+                        on_fallback=fallback.set
+                    )
+                    # Un résumé en partie extractif (LM Studio indisponible) n'est ni mis en cache ni livré
+                    # comme définitif : il est envoyé comme résumé provisoire, remplacé plus tard
+                    if fallback.is_set() and not summary.startswith("[Erreur"):
+                        print(f"⚠️ Résumé de {url} en partie extractif : envoi comme résumé provisoire")
+                        if delivery:
+                            await delivery  # Garder l'ordre des messages
+                        message_id = await send_provisional_summary(
+                            bot, url, subtitles, "LM Studio indisponible pendant le résumé", reply_params,
+                            cancel_token, summary=summary
+                        )
+                        if message_id and await asyncio.to_thread(
+                            JOBS.advance, job_id, WORKER_ID, "summarizing", provisional_message_id=message_id
+                        ):
+                            job["provisional_message_id"] = message_id
+                            schedule_upgrade(bot, job, subtitles, language)
+                            handed_over = True
+                            continue
+                    elif not fallback.is_set():
+                        store_cached_summary(extract_video_id(url), summary)
+                
+                cancel_token.check()
+                if not await asyncio.to_thread(JOBS.advance, job_id, WORKER_ID, "delivering", summary=summary):
+                    print(f"Tâche {job_id} reprise par un autre processus, abandon")
+                    continue
+                
+                # Livrer en arrière-plan et passer directement au lien suivant
+                delivery = asyncio.create_task(deliver_job(bot, job, summary, previous_delivery=delivery))
+                handed_over = True
+            
+            except JobCancelled as e:
+                await report_job_cancelled(bot, job, e)
+            except Exception as e:
+                # En cas d'erreur, informer l'utilisateur
+                print(f"Erreur lors du traitement de {url}: {str(e)}")
+                await asyncio.to_thread(JOBS.finish, job_id, WORKER_ID, str(e))
+                await bot.send_message(
+                    text=f"❌ Erreur lors du traitement de {url}: {str(e)}",
+                    **reply_params
+                )
+            finally:
+                if not handed_over:
+                    close_job_token(job_id)
+        
+    finally:
+        if prefetch:
+            close_job_token(prefetch[0]["job_id"])
+        # Marquer comme terminé
+        ACTIVE_QUEUE_CHATS.discard(chat_id)
+    
+    # Un lien ajouté pendant la dernière réservation a vu le chat encore actif : relancer le traitement
+    # (pending_chats exclut, comme claim, les chats traités par un autre processus)
+    if chat_id in await asyncio.to_thread(JOBS.pending_chats, WORKER_ID) and chat_id not in ACTIVE_QUEUE_CHATS:
+        asyncio.create_task(process_youtube_queue(chat_id, bot))
+
+async def resume_pending_jobs(context):
+    """
+    Relance le traitement des chats ayant des tâches en attente : au démarrage (tâches interrompues
+    par un arrêt du bot), puis périodiquement (tâches dont le bail a expiré).
+    """
+    try:
+        chat_ids = await asyncio.to_thread(JOBS.pending_chats, WORKER_ID)
+    except Exception as e:
+        print(f"Erreur lors de la lecture de la file des résumés: {e}")
+        return
+    for chat_id in chat_ids:
+        if chat_id not in ACTIVE_QUEUE_CHATS:
+            context.application.create_task(process_youtube_queue(chat_id, context.bot))
+
+async def run_worker():
+    """
+    Mode worker (BOT_ROLE=worker) : pas de réception des messages Telegram, uniquement le traitement
+    de la file partagée. Le worker réserve les chats en attente (au plus WORKER_CONCURRENCY à la fois)
+    et les nouvelles vidéos des abonnements (SUBSCRIPTION_WORKERS à la fois), résume avec son propre
+    LM Studio (LM_API_URL) et livre directement via l'API Telegram.
+    Démarrer plusieurs workers sur la même base ajoute de la capacité.
+    """
+    global SUBSCRIPTION_WAKEUP
+    bot = telegram.Bot(TELEGRAM_TOKEN)
+    running = {}  # Format: {chat_id: tâche de traitement}
+    print(f"👷 Worker {WORKER_ID} démarré ({WORKER_CONCURRENCY} chat(s) en parallèle)")
+    
+    async with bot:
+        SUBSCRIPTION_WAKEUP = asyncio.Event()
+        # Références conservées pour que les tâches ne soient pas collectées
+        subscription_workers = [
+            asyncio.create_task(subscription_worker(bot, WORKER_POLL_INTERVAL)) for _ in range(SUBSCRIPTION_WORKERS)
+        ]
+        while True:
+            try:
+                # Tâches annulées (/cancel) depuis le processus front : interrompre leur traitement
+                for job_id in await asyncio.to_thread(JOBS.finished_jobs, list(JOB_TOKENS)):
+                    token = JOB_TOKENS.get(job_id)
+                    if token:
+                        token.cancel("annulée par l'utilisateur")
+                
+                for chat_id in await asyncio.to_thread(JOBS.pending_chats, WORKER_ID):
+                    if len(running) >= WORKER_CONCURRENCY:
+                        break
+                    if chat_id not in running:
+                        task = asyncio.create_task(process_youtube_queue(chat_id, bot))
+                        running[chat_id] = task
+                        task.add_done_callback(lambda _, chat_id=chat_id: running.pop(chat_id, None))
+            except Exception as e:
+                print(f"Erreur lors de la lecture de la file des résumés: {e}")
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+
+def start_job_recovery(app):
+    """Planifie la reprise des tâches de la file durable (au démarrage puis toutes les JOB_RECOVERY_INTERVAL secondes)"""
+    if not (hasattr(app, 'job_queue') and app.job_queue):
+        print("JobQueue non disponible. Les tâches interrompues ne seront reprises qu'à l'arrivée de nouveaux liens.")
+        return False
+    app.job_queue.run_repeating(resume_pending_jobs, interval=JOB_RECOVERY_INTERVAL, first=1)
+    return True
 
 async def handle_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message_text = update.message.text
@@ -1869,7 +5050,7 @@ async def handle_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     
     # Récupérer les sous-titres
-    subtitles, error = get_subtitles(url)
+    subtitles, error, language = get_subtitles_for_summary(url)
     if error:
         await processing_message.edit_text(
             f"❌ {error}"
@@ -1881,7 +5062,7 @@ async def handle_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     
     # Répondre à la question
-    answer = ask_question_about_subtitles(subtitles, question)
+    answer = ask_question_about_subtitles(subtitles, question, language)
     
     # Nettoyer la réponse pour éviter les problèmes de formatage
     clean_answer = sanitize_markdown(answer)
@@ -1902,6 +5083,38 @@ async def handle_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Envoyer un message d'erreur
         await update.message.reply_text(f"❌ Erreur lors de l'envoi de la réponse: {str(e)}")
 
+async def handle_transcript(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Envoie la transcription complète d'une vidéo en français (traduite si nécessaire)"""
+    message_parts = update.message.text.split(" ", 1)
+    
+    if len(message_parts) < 2 or not extract_video_id(message_parts[1].strip()):
+        await update.message.reply_text(
+            "❗ Utilisation : /transcript [lien YouTube]\n\n"
+            "Exemple : /transcript https://youtube.com/watch?v=VIDEO_ID"
+        )
+        return
+    
+    url = message_parts[1].strip()
+    processing_message = await update.message.reply_text(
+        "⏳ Je récupère la transcription (et la traduis si nécessaire)..."
+    )
+    
+    # Seule commande qui demande explicitement une traduction complète
+    subtitles, error = get_subtitles(url)
+    if error or not subtitles:
+        await processing_message.edit_text(f"❌ {error or 'Aucune transcription disponible.'}")
+        return
+    
+    try:
+        await processing_message.delete()
+    except Exception:
+        pass
+    await send_long_message(
+        context.bot,
+        chat_id=update.effective_chat.id,
+        text=f"📄 Transcription de {url} :\n\n{sanitize_markdown(subtitles)}"
+    )
+
 async def handle_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
     help_text = """
 🤖 Bot YouTube Telegram 🤖
@@ -1917,6 +5130,8 @@ Résumé et questions :
 • Envoyez un lien YouTube pour obtenir un résumé
 • /yt - Traiter explicitement un lien YouTube
 • /question ou /q - Poser une question sur une vidéo
+• /transcript ou /t - Obtenir la transcription complète en français
+• /cancel - Annuler les résumés en cours et en attente
 
 Mode conversation :
 • /chat ou /c - Activer le mode conversation
@@ -1975,8 +5190,8 @@ async def handle_subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    # Obtenir les informations de la chaîne
-    channel_info = get_channel_info(channel_url)
+    # Obtenir les informations de la chaîne (résolution réseau dans un thread)
+    channel_info = await asyncio.to_thread(get_channel_info, channel_url)
     
     if not channel_info:
         await update.message.reply_text(
@@ -1985,29 +5200,16 @@ async def handle_subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    # Initialiser la structure pour l'utilisateur si nécessaire
-    if user_id not in CHANNEL_SUBSCRIPTIONS:
-        CHANNEL_SUBSCRIPTIONS[user_id] = {}
-    
     # Ajouter l'abonnement
     channel_id = channel_info["id"]
     channel_name = channel_info["name"]
     
-    if channel_id in CHANNEL_SUBSCRIPTIONS[user_id]:
+    if not SUBSCRIPTIONS.subscribe(user_id, channel_id, channel_name):
         await update.message.reply_text(
             f"ℹ️ Vous êtes déjà abonné à la chaîne {channel_name}."
         )
         return
     
-    CHANNEL_SUBSCRIPTIONS[user_id][channel_id] = channel_name
-    
-    # Initialiser le suivi des dernières vidéos pour cette chaîne
-    if channel_id not in LATEST_VIDEOS:
-        LATEST_VIDEOS[channel_id] = []
-    
-    # Sauvegarder les abonnements
-    save_subscriptions()
-    
     await update.message.reply_text(
         f"✅ Vous êtes maintenant abonné à la chaîne {channel_name}.\n\n"
         "Vous recevrez des résumés des nouvelles vidéos publiées sur cette chaîne."
@@ -2016,8 +5218,9 @@ async def handle_subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def handle_unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     message_parts = update.message.text.split(" ", 1)
+    user_subscriptions = SUBSCRIPTIONS.get_user_subscriptions(user_id)
     
-    if user_id not in CHANNEL_SUBSCRIPTIONS or not CHANNEL_SUBSCRIPTIONS[user_id]:
+    if not user_subscriptions:
         await update.message.reply_text(
             "❗ Vous n'êtes abonné à aucune chaîne YouTube."
         )
@@ -2026,7 +5229,7 @@ async def handle_unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if len(message_parts) < 2:
         # Liste les chaînes auxquelles l'utilisateur est abonné
         channels_list = "\n".join([f"• {name} - /unsubscribe {channel_id}" 
-                                 for channel_id, name in CHANNEL_SUBSCRIPTIONS[user_id].items()])
+                                 for channel_id, name in user_subscriptions.items()])
         
         await update.message.reply_text(
             "❗ Utilisation : /unsubscribe [ID chaîne YouTube]\n\n"
@@ -2040,7 +5243,7 @@ async def handle_unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     # Vérifie si c'est une URL ou un ID
     if "youtube.com" in channel_id_or_url or "youtu.be" in channel_id_or_url:
-        channel_info = get_channel_info(channel_id_or_url)
+        channel_info = await asyncio.to_thread(get_channel_info, channel_id_or_url)
         if not channel_info:
             await update.message.reply_text(
                 "❌ Impossible d'obtenir les informations de cette chaîne.\n\n"
@@ -2051,41 +5254,30 @@ async def handle_unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE)
     else:
         channel_id = channel_id_or_url
     
-    # Vérifie si l'utilisateur est abonné à cette chaîne
-    if channel_id not in CHANNEL_SUBSCRIPTIONS[user_id]:
+    # Supprime l'abonnement (None si l'utilisateur n'est pas abonné à cette chaîne)
+    channel_name = SUBSCRIPTIONS.unsubscribe(user_id, channel_id)
+    if channel_name is None:
         await update.message.reply_text(
             "❌ Vous n'êtes pas abonné à cette chaîne."
         )
         return
     
-    # Récupère le nom de la chaîne avant de supprimer
-    channel_name = CHANNEL_SUBSCRIPTIONS[user_id][channel_id]
-    
-    # Supprime l'abonnement
-    del CHANNEL_SUBSCRIPTIONS[user_id][channel_id]
-    
-    # Si l'utilisateur n'a plus d'abonnements, supprime son entrée
-    if not CHANNEL_SUBSCRIPTIONS[user_id]:
-        del CHANNEL_SUBSCRIPTIONS[user_id]
-    
-    # Sauvegarder les abonnements
-    save_subscriptions()
-    
     await update.message.reply_text(
         f"✅ Vous êtes maintenant désabonné de la chaîne {channel_name}."
     )
 
 async def handle_list_subscriptions(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
+    user_subscriptions = SUBSCRIPTIONS.get_user_subscriptions(user_id)
     
-    if user_id not in CHANNEL_SUBSCRIPTIONS or not CHANNEL_SUBSCRIPTIONS[user_id]:
+    if not user_subscriptions:
         await update.message.reply_text(
             "ℹ️ Vous n'êtes abonné à aucune chaîne YouTube."
         )
         return
     
     channels_list = "\n".join([f"• {name} ({channel_id})" 
-                             for channel_id, name in CHANNEL_SUBSCRIPTIONS[user_id].items()])
+                             for channel_id, name in user_subscriptions.items()])
     
     await update.message.reply_text(
         "📋 Vos abonnements actuels :\n\n"
@@ -2094,6 +5286,134 @@ async def handle_list_subscriptions(update: Update, context: ContextTypes.DEFAUL
         "/unsubscribe [ID chaîne]"
     )
 
+# --- Limitation du débit d'envoi Telegram ---
+
+class TokenBucket:
+    """Seau à jetons : autorise `rate` envois par seconde avec des rafales de `capacity` envois"""
+    
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+    
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    def wait_time(self, now):
+        """Temps d'attente (secondes) avant qu'un jeton soit disponible"""
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+    
+    def consume(self):
+        self.tokens -= 1
+
+class TelegramRateLimiter:
+    """
+    Limiteur partagé pour les envois Telegram : un seau global (~30 messages/s pour le bot)
+    et un seau par chat (1 message/s en privé, 20/min dans les groupes).
+    Les indications RetryAfter de Telegram suspendent les envois vers le chat concerné
+    et réduisent temporairement le débit global, qui remonte ensuite progressivement
+    à chaque envoi réussi.
+    """
+    
+    def __init__(self, global_rate, chat_rate, group_rate, chat_burst):
+        self.max_global_rate = global_rate
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets = {}
+        self.blocked_until = {}  # Format: {chat_id: instant (monotonic) de fin de suspension}
+    
+    def chat_bucket(self, chat_id):
+        if chat_id not in self.chat_buckets:
+            # Les groupes et canaux ont un identifiant négatif
+            is_group = isinstance(chat_id, int) and chat_id < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            self.chat_buckets[chat_id] = TokenBucket(rate, self.chat_burst)
+        return self.chat_buckets[chat_id]
+    
+    async def acquire(self, chat_id):
+        """Attend qu'un envoi vers chat_id soit autorisé, puis le comptabilise"""
+        while True:
+            now = time.monotonic()
+            chat_bucket = self.chat_bucket(chat_id)
+            wait = max(
+                self.global_bucket.wait_time(now),
+                chat_bucket.wait_time(now),
+                self.blocked_until.get(chat_id, 0) - now,
+            )
+            if wait <= 0:
+                self.global_bucket.consume()
+                chat_bucket.consume()
+                return
+            await asyncio.sleep(wait)
+    
+    def block(self, chat_id, seconds):
+        """Suspend les envois vers un chat (suite à un RetryAfter)"""
+        self.blocked_until[chat_id] = max(self.blocked_until.get(chat_id, 0), time.monotonic() + seconds)
+    
+    def on_flood(self):
+        """Réduit le débit global après un RetryAfter (sans descendre sous 1 message/s)"""
+        self.global_bucket.rate = max(1.0, self.global_bucket.rate * 0.5)
+    
+    def on_success(self):
+        """Remonte progressivement le débit global vers la limite configurée"""
+        if self.global_bucket.rate < self.max_global_rate:
+            self.global_bucket.rate = min(self.max_global_rate, self.global_bucket.rate + 0.5)
+    
+    async def send(self, chat_id, send_func, *args, max_retries=3, **kwargs):
+        """
+        Appelle send_func (ex: bot.send_message) dès que le débit le permet.
+        En cas de RetryAfter, attend exactement le délai indiqué par Telegram puis réessaie.
+        """
+        for attempt in range(max_retries + 1):
+            await self.acquire(chat_id)
+            try:
+                result = await send_func(*args, chat_id=chat_id, **kwargs)
+                self.on_success()
+                return result
+            except telegram.error.RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                print(f"⏳ Limite Telegram atteinte pour {chat_id}, nouvel essai dans {retry_after}s")
+                self.block(chat_id, retry_after)
+                self.on_flood()
+                if attempt >= max_retries:
+                    raise
+
+TELEGRAM_LIMITER = TelegramRateLimiter(
+    global_rate=float(os.getenv("TELEGRAM_GLOBAL_RATE", "30")),
+    chat_rate=float(os.getenv("TELEGRAM_CHAT_RATE", "1")),
+    group_rate=float(os.getenv("TELEGRAM_GROUP_RATE_PER_MINUTE", "20")) / 60,
+    chat_burst=int(os.getenv("TELEGRAM_CHAT_BURST", "3")),
+)
+
+async def fan_out(recipients, deliver, concurrency=None):
+    """
+    Exécute deliver(destinataire) pour tous les destinataires en parallèle,
+    avec au plus `concurrency` livraisons simultanées. Le débit réel est réglé par TELEGRAM_LIMITER.
+    
+    Returns:
+        int: Nombre de livraisons réussies
+    """
+    semaphore = asyncio.Semaphore(concurrency or DELIVERY_CONCURRENCY)
+    
+    async def deliver_one(recipient):
+        async with semaphore:
+            try:
+                await deliver(recipient)
+                return True
+            except Exception as e:
+                print(f"Erreur lors de la livraison à {recipient}: {e}")
+                return False
+    
+    results = await asyncio.gather(*(deliver_one(recipient) for recipient in recipients))
+    return sum(1 for delivered in results if delivered)
+
 def split_message_for_telegram(text, max_length=4000):
     """
     Divise un message en plusieurs parties pour respecter la limite de taille de Telegram.
@@ -2155,14 +5475,39 @@ def split_message_for_telegram(text, max_length=4000):
     
     return parts
 
-async def send_long_message(bot, text, **kwargs):
+async def replace_message(bot, message_id, text, cancel_token=None, **kwargs):
+    """
+    Remplace le texte d'un message déjà envoyé (résumé provisoire).
+    Un texte trop long pour un seul message, ou un message qui ne peut plus être modifié,
+    est envoyé à la suite avec send_long_message.
+    """
+    parts = split_message_for_telegram(text)
+    check_cancelled(cancel_token)
+    try:
+        await TELEGRAM_LIMITER.send(
+            kwargs['chat_id'],
+            bot.edit_message_text,
+            message_id=message_id,
+            text=parts[0] if len(parts) == 1 else "📝 Résumé complet ci-dessous."
+        )
+    except telegram.error.BadRequest as e:
+        print(f"Impossible de modifier le message {message_id}: {e}")
+        return await send_long_message(bot, text=text, cancel_token=cancel_token, **kwargs)
+    if len(parts) > 1:
+        return await send_long_message(bot, text=text, cancel_token=cancel_token, **kwargs)
+
+async def send_long_message(bot, text, rate_limiter=None, cancel_token=None, **kwargs):
     """
     Envoie un message potentiellement long en le divisant si nécessaire.
-    Gère les timeouts et ajoute des délais entre les messages pour éviter les erreurs Telegram.
+    Les parties sont envoyées dès que le limiteur de débit partagé le permet (pas de délai fixe),
+    les RetryAfter de Telegram sont respectés à la seconde près et les timeouts sont réessayés
+    avec un délai exponentiel.
     
     Args:
         bot: L'instance du bot Telegram
         text: Le texte du message
+        rate_limiter: TelegramRateLimiter à utiliser (TELEGRAM_LIMITER par défaut)
+        cancel_token: CancelToken optionnel, vérifié avant chaque envoi (JobCancelled est levée)
         **kwargs: Arguments supplémentaires pour send_message (comme chat_id, message_thread_id)
         
     Returns:
@@ -2176,12 +5521,16 @@ async def send_long_message(bot, text, **kwargs):
         print("Erreur: chat_id manquant dans send_long_message")
         return None
         
+    rate_limiter = rate_limiter or TELEGRAM_LIMITER
+    chat_id = kwargs['chat_id']
+    send_kwargs = {key: value for key, value in kwargs.items() if key != 'chat_id'}
+        
     # Diviser le message si nécessaire
     message_parts = split_message_for_telegram(text)
     
     last_message = None
     
-    # Envoyer chaque partie avec délai entre les envois
+    # Envoyer chaque partie au rythme autorisé par le limiteur
     for i, part in enumerate(message_parts):
         # Ajouter un indicateur de partie pour les messages divisés
         if len(message_parts) > 1:
@@ -2193,15 +5542,10 @@ async def send_long_message(bot, text, **kwargs):
         retry_count = 0
         
         while retry_count < max_retries:
+            check_cancelled(cancel_token)
             try:
-                # Attendre un peu entre les messages (délai proportionnel à la longueur du message)
-                if i > 0:
-                    # Attendre entre 2 et 5 secondes selon la longueur du message (augmenté)
-                    wait_time = min(2 + (len(part) / 1500), 5)
-                    await asyncio.sleep(wait_time)
-                    
-                # Envoyer le message avec tous les paramètres fournis
-                last_message = await bot.send_message(text=part, **kwargs)
+                # Envoyer le message dès que le débit le permet (RetryAfter géré par le limiteur)
+                last_message = await rate_limiter.send(chat_id, bot.send_message, text=part, **send_kwargs)
                 break  # Sortir de la boucle si l'envoi a réussi
                 
             except telegram.error.TimedOut:
@@ -2215,12 +5559,12 @@ async def send_long_message(bot, text, **kwargs):
                     # Essayer d'envoyer un message plus court
                     try:
                         error_msg = f"[Une partie du message n'a pas pu être envoyée en raison d'un timeout. Partie {i+1}/{len(message_parts)}]"
-                        last_message = await bot.send_message(text=error_msg, **kwargs)
+                        last_message = await rate_limiter.send(chat_id, bot.send_message, text=error_msg, **send_kwargs)
                     except:
                         pass
                 else:
-                    # Attendre avant de réessayer (délai de plus en plus long, augmenté)
-                    await asyncio.sleep(3 * retry_count)
+                    # Attendre avant de réessayer (délai exponentiel : 1s, 2s, 4s...)
+                    await asyncio.sleep(min(2 ** (retry_count - 1), 30))
                     
             except Exception as e:
                 print(f"Erreur lors de l'envoi de la partie {i+1}: {e}")
@@ -2228,7 +5572,7 @@ async def send_long_message(bot, text, **kwargs):
                 # Essayer avec un message plus simple
                 try:
                     error_msg = f"[Impossible d'afficher une partie du message. Erreur: {str(e)}]"
-                    last_message = await bot.send_message(text=error_msg, **kwargs)
+                    last_message = await rate_limiter.send(chat_id, bot.send_message, text=error_msg, **send_kwargs)
                 except:
                     pass
                     
@@ -2246,9 +5590,16 @@ if __name__ == '__main__':
         print("❌ ERREUR: Token Telegram non défini dans le fichier .env")
         config_ok = False
     
-    if not LM_API_URL:
+    if not LLM_ROUTER.backends and BOT_ROLE != "front":
         print("❌ ERREUR: URL de l'API LM non définie dans le fichier .env")
         config_ok = False
+    elif not LLM_ROUTER.backends:
+        # Un front sans LM Studio ne fait que remplir la file : les résumés restent assurés par les workers
+        print("ℹ️ Mode front sans LM_API_URL : /question, /transcript et le mode chat seront indisponibles")
+    
+    if BOT_ROLE == "worker" and not os.getenv("WORKER_NAME"):
+        print("❌ ERREUR: WORKER_NAME doit être défini (et unique) pour chaque worker")
+        config_ok = False
         
     if not config_ok:
         print("\n⚠️ Le bot peut ne pas fonctionner correctement en raison de problèmes de configuration.")
@@ -2259,11 +5610,11 @@ if __name__ == '__main__':
     
     print("=== Fin de la vérification de configuration ===\n")
     
-    # Test de connexion à LM Studio
+    # Test de connexion à LM Studio (inutile pour un front sans serveur LLM)
     print("=== Test de connexion à LM Studio ===")
-    max_retries = 3
+    max_retries = 3 if LLM_ROUTER.backends else 0
     retry_count = 0
-    lm_available = False
+    lm_available = not LLM_ROUTER.backends
     
     while retry_count < max_retries and not lm_available:
         if retry_count > 0:
@@ -2286,6 +5637,21 @@ if __name__ == '__main__':
     else:
         print("=== Fin du test de connexion ===\n")
     
+    # Surveiller les serveurs LM Studio (réouverture des circuits, modèles rechargés)
+    LLM_ROUTER.start_health_checks()
+    
+    # Ouvrir la file des résumés (les liens en attente avant l'arrêt seront repris)
+    open_job_store()
+    
+    if BOT_ROLE == "worker":
+        # Pas de réception des messages : uniquement le traitement de la file partagée
+        print(f"=== DÉMARRAGE DU WORKER (base {DATABASE_FILE}) ===")
+        try:
+            asyncio.run(run_worker())
+        except KeyboardInterrupt:
+            print("Worker arrêté")
+        exit(0)
+    
     # Charger les abonnements existants
     load_subscriptions()
     
@@ -2308,6 +5674,10 @@ if __name__ == '__main__':
     # Commande pour traiter directement un lien YouTube
     app.add_handler(CommandHandler("yt", handle_yt))
     
+    # Transcription complète (traduite en français si nécessaire)
+    app.add_handler(CommandHandler("transcript", handle_transcript))
+    app.add_handler(CommandHandler("t", handle_transcript))  # Alias court pour transcript
+    
     # Commandes d'aide et de démarrage
     app.add_handler(CommandHandler("help", handle_help))
     app.add_handler(CommandHandler("h", handle_help))  # Alias court pour help
@@ -2320,6 +5690,7 @@ if __name__ == '__main__':
     app.add_handler(CommandHandler("mode", handle_chat_mode))  # Alias plus intuitif
     app.add_handler(CommandHandler("reset", handle_reset))
     app.add_handler(CommandHandler("r", handle_reset))  # Alias court pour reset
+    app.add_handler(CommandHandler("cancel", handle_cancel))
     
     # Commandes d'abonnement
     app.add_handler(CommandHandler("subscribe", handle_subscribe))
@@ -2330,6 +5701,12 @@ if __name__ == '__main__':
     app.add_handler(CommandHandler("list", handle_list_subscriptions))  # Alias court pour list_subscriptions
     app.add_handler(CommandHandler("subs", handle_list_subscriptions))  # Alias court pour list_subscriptions
     
+    # Reprise des résumés interrompus (en mode front, les workers s'en chargent)
+    if BOT_ROLE == "front":
+        print(f"ℹ️ Mode front : les liens sont placés dans la file de {DATABASE_FILE} et traités par les workers")
+    elif start_job_recovery(app):
+        print("✅ Reprise des résumés en attente planifiée")
+    
     # Démarrer le planificateur
     scheduler_status = start_video_check_scheduler(app)
     if scheduler_status: